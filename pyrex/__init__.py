@@ -6,14 +6,18 @@ import os.path
 from .__about__ import __version__, __long_description__
 __doc__ = __long_description__
 
-from .signals import (Signal, EmptySignal, FunctionSignal,
-                      AskaryanSignal, ThermalNoise)
+from .signals import (Signal, EmptySignal, FunctionSignal, UniformSignal,
+                      SpectralSignal, AskaryanSignal, AskaryanTemplateBank,
+                      ThermalNoise, NoiseBank)
 from .antenna import Antenna, DipoleAntenna
 from .detector import AntennaSystem, Detector
 from .ice_model import IceModel
-from .earth_model import prem_density, slant_depth
-from .particle import Particle, ShadowGenerator, ListGenerator, FileGenerator
-from .ray_tracing import RayTracer, RayTracePath
+from .earth_model import prem_density, slant_depth, SlantDepthTable
+from .particle import (Particle, ParticleBatch, ShadowGenerator,
+                       ListGenerator, FileGenerator, StreamingFileGenerator)
+from .ray_tracing import (RayTracer, RayTracePath, RayTraceTable,
+                          RayTracerCache, ShadowZoneTable)
+from .output import EventWriter, read_events
 from .kernel import EventKernel
 
 
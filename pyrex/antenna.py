@@ -16,7 +16,11 @@ class Antenna:
     allowable frequency range (Hz), total resistance (ohm) used for Johnson
     noise, and whether or not to include noise in the antenna's waveforms.
     Defines default trigger, frequency response, and signal reception functions
-    that can be overwritten in base classes to customize the antenna."""
+    that can be overwritten in base classes to customize the antenna.
+    If noise_bank is set to a NoiseBank, the antenna's noise is drawn from
+    the bank rather than generated by the antenna itself."""
+    noise_bank = None
+
     def __init__(self, position, z_axis=(0,0,1), x_axis=(1,0,0),
                  antenna_factor=1, efficiency=1, noisy=True,
                  unique_noise_waveforms=10, freq_range=None,
@@ -119,6 +123,13 @@ class Antenna:
                                  +" resistance) are required to generate"
                                  +" antenna noise")
 
+            if self.noise_bank is not None:
+                self._noise_master = self.noise_bank.noise(
+                    times, f_band=self.freq_range, rms_voltage=self.noise_rms,
+                    temperature=self.temperature, resistance=self.resistance
+                )
+                return self._noise_master.with_times(times)
+
             # Calculate recommended number of frequencies for longest
             # signal length stored
             duration = 1e-7 if len(self.signals)==0 else 0
@@ -191,19 +202,10 @@ class Antenna:
                      "pyrex.antenna.Antenna")
         return np.ones(len(frequencies))
 
-    def receive(self, signal, direction=None, polarization=None,
-                force_real=False):
-        """Process incoming signal according to the filter function and
-        store it to the signals list. Optionally applies directional gain if
-        direction is specified, applies polarization gain if polarization is
-        specified, and forces any frequency response filters to return real
-        signals if specified.
-        Subclasses may extend this fuction, but should likely end with
-        super().receive(signal)."""
-        copy = Signal(signal.times, signal.values,
-                      value_type=Signal.ValueTypes.voltage)
-        copy.filter_frequencies(self.response, force_real=force_real)
-
+    def _signal_gain(self, direction=None, polarization=None):
+        """Returns the combined directional, polarization, and efficiency
+        gain for a signal arriving from the given direction with the given
+        polarization."""
         if direction is None:
             d_gain = 1
         else:
@@ -217,7 +219,37 @@ class Antenna:
         else:
             p_gain = self.polarization_gain(normalize(polarization))
 
-        signal_factor = d_gain * p_gain * self.efficiency
+        return d_gain * p_gain * self.efficiency
+
+    def signal_bound(self, amplitude, direction=None, polarization=None):
+        """Returns an upper bound on the peak voltage (V) of the signal
+        received from an electric field whose peak value after the frequency
+        response of the antenna is no larger than the given amplitude (V/m),
+        arriving from the given direction with the given polarization.
+        Subclasses may process signals arbitrarily, so the bound is
+        infinite."""
+        return np.inf
+
+    def could_trigger(self, voltage):
+        """Test for whether a waveform with signal peak voltage no larger than
+        the given voltage (V) could possibly trigger the antenna, including
+        its noise. The base antenna can't rule out any waveform."""
+        return True
+
+    def receive(self, signal, direction=None, polarization=None,
+                force_real=False):
+        """Process incoming signal according to the filter function and
+        store it to the signals list. Optionally applies directional gain if
+        direction is specified, applies polarization gain if polarization is
+        specified, and forces any frequency response filters to return real
+        signals if specified.
+        Subclasses may extend this fuction, but should likely end with
+        super().receive(signal)."""
+        copy = signal.copy()
+        copy.value_type = Signal.ValueTypes.voltage
+        copy.filter_frequencies(self.response, force_real=force_real)
+
+        signal_factor = self._signal_gain(direction, polarization)
 
         if signal.value_type==Signal.ValueTypes.voltage:
             pass
@@ -227,7 +259,7 @@ class Antenna:
             raise ValueError("Signal's value type must be either "
                              +"voltage or field. Given "+str(signal.value_type))
 
-        copy.values *= signal_factor
+        copy *= signal_factor
         self.signals.append(copy)
 
 
@@ -236,6 +268,10 @@ class DipoleAntenna(Antenna):
     """Antenna with a given name, position (m), center frequency (Hz),
     bandwidth (Hz), resistance (ohm), effective height (m), polarization
     direction, and trigger threshold (V)."""
+    # Number of noise rms values assumed as the maximum noise contribution
+    # when estimating whether a waveform could trigger the antenna
+    noise_sigmas = 6
+
     def __init__(self, name, position, center_frequency, bandwidth, resistance,
                  orientation=(0,0,1), trigger_threshold=0,
                  effective_height=None, noisy=True,
@@ -277,6 +313,31 @@ class DipoleAntenna(Antenna):
         given threshold."""
         return max(np.abs(signal.values)) > self.threshold
 
+    def signal_bound(self, amplitude, direction=None, polarization=None):
+        """Returns an upper bound on the peak voltage (V) of the signal
+        received from an electric field whose peak value after the frequency
+        response of the antenna is no larger than the given amplitude (V/m),
+        arriving from the given direction with the given polarization.
+        The received voltage is the filtered field scaled by the gains, so
+        the bound is the amplitude scaled by the gains."""
+        return np.abs(amplitude * self._signal_gain(direction, polarization)
+                      / self.antenna_factor)
+
+    def could_trigger(self, voltage):
+        """Test for whether a waveform with signal peak voltage no larger than
+        the given voltage (V) could possibly trigger the antenna. If the
+        antenna is noisy, noise up to noise_sigmas times the noise rms is
+        added to the voltage."""
+        if self.noisy:
+            if self.noise_rms is None:
+                rms = np.sqrt(4 * 1.38e-23 * self.temperature
+                              * self.resistance
+                              * (self.freq_range[1] - self.freq_range[0]))
+            else:
+                rms = self.noise_rms
+            voltage += self.noise_sigmas * rms
+        return voltage > self.threshold
+
     def response(self, frequencies):
         """Butterworth filter response for the antenna's frequency range."""
         angular_freqs = np.array(frequencies) * 2*np.pi
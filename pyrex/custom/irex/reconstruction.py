@@ -21,7 +21,8 @@ def quick_vertex_reconstruction(detector, threshold=None,
 
 
 def full_vertex_reconstruction(detector, threshold=None,
-                               get_waveform=lambda ant: ant.all_waveforms[0]):
+                               get_waveform=lambda ant: ant.all_waveforms[0],
+                               ray_tracer=RayTracer):
     triggered_antennas = [ant for ant in detector
                           if ant.trigger(get_waveform(ant))]
     if threshold is None:
@@ -31,7 +32,8 @@ def full_vertex_reconstruction(detector, threshold=None,
                          if np.max(get_waveform(ant).values)>threshold]
     reco_positions = [np.array(ant.position) for ant in reco_antennas]
     reco_times = get_xcorr_times([get_waveform(ant) for ant in reco_antennas])
-    return minimizer_vertex_reconstruction(reco_positions, reco_times)
+    return minimizer_vertex_reconstruction(reco_positions, reco_times,
+                                           ray_tracer=ray_tracer)
 
 
 def get_xcorr_times(waveforms):
@@ -48,18 +50,23 @@ def get_xcorr_times(waveforms):
     return delays
 
 
-def minimizer_vertex_reconstruction(positions, times, guess=None):
+def minimizer_vertex_reconstruction(positions, times, guess=None,
+                                    ray_tracer=RayTracer):
+    # A RayTracerCache may be passed as the ray_tracer to avoid re-solving
+    # nearly identical geometries on each minimizer iteration
     if guess is None:
         guess = bancroft_scan_vertex(positions, times)[0]
-    reco = scipy.optimize.minimize(least_squares, guess, args=(positions, times),
+    reco = scipy.optimize.minimize(least_squares, guess,
+                                   args=(positions, times, 'trace', ray_tracer),
                                    method='Nelder-Mead')
     return reco.x, reco.fun, reco.success
 
 
-def least_squares(vertex, positions, times, method='trace'):
+def least_squares(vertex, positions, times, method='trace',
+                  ray_tracer=RayTracer):
     tofs = []
     for position in positions:
-        rt = RayTracer(vertex, position)
+        rt = ray_tracer(vertex, position)
         if vertex[2]<-3000:
             return np.nan
         if rt.exists:
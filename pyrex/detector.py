@@ -3,6 +3,7 @@
 import collections
 import inspect
 import logging
+import numpy as np
 from pyrex.internal_functions import flatten, mirror_func
 
 logger = logging.getLogger(__name__)
@@ -87,6 +88,17 @@ class AntennaSystem:
                                     polarization=polarization,
                                     force_real=force_real)
 
+    def signal_bound(self, amplitude, direction=None, polarization=None):
+        """Upper bound on the peak voltage of a received signal. The front
+        end may amplify the signal arbitrarily, so the bound is infinite."""
+        return np.inf
+
+    def could_trigger(self, voltage):
+        """Test for whether a waveform with the given signal peak voltage
+        could trigger the antenna system. By default no waveform is ruled
+        out."""
+        return True
+
     def clear(self, reset_noise=False):
         """Reset the antenna system to a state of having received no signals.
         Can optionally reset noise, which will reset the noise waveform so that
@@ -184,6 +196,15 @@ class Detector:
         for ant in self:
             ant.clear(reset_noise=reset_noise)
 
+    def set_noise_bank(self, noise_bank):
+        """Sets the NoiseBank from which all antennas in the detector draw
+        their noise, so that noise is generated once for the whole detector.
+        Passing None returns the antennas to generating their own noise."""
+        for ant in self:
+            if isinstance(ant, AntennaSystem):
+                ant = ant.antenna
+            ant.noise_bank = noise_bank
+
     @property
     def _is_base_subset(self):
         return (len(self.subsets)==0 or
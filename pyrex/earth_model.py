@@ -1,5 +1,5 @@
 """Module containing earth model. Uses PREM for density as a function of radius
-and a simple integrator for calculation of the slant depth as a function of
+and an exact integrator for calculation of the slant depth as a function of
 nadir angle."""
 
 import logging
@@ -10,66 +10,368 @@ logger = logging.getLogger(__name__)
 EARTH_RADIUS = 6371.0e3 # meters
 
 
+# Radii (m) of the boundaries between PREM shells
+PREM_RADII = np.array([0, 1221.5e3, 3480.0e3, 5701.0e3, 5771.0e3, 5971.0e3,
+                       6151.0e3, 6346.6e3, 6356.0e3, 6368.0e3, EARTH_RADIUS])
+
+# Coefficients of the PREM density (g/cm^3) polynomial in each shell, in
+# increasing powers of the normalized radius r/EARTH_RADIUS
+PREM_COEFFICIENTS = [
+    (13.0885, 0, -8.8381),
+    (12.5815, -1.2638, -3.6426, -5.5281),
+    (7.9565, -6.4761, 5.5283, -3.0807),
+    (5.3197, -1.4836),
+    (11.2494, -8.0298),
+    (7.1089, -3.8045),
+    (2.691, 0.6924),
+    (2.9,),
+    (2.6,),
+    (1.02,),
+]
+
+
 def prem_density(r):
     """Returns the earth's density (g/cm^3) for a given radius r (m).
     Calculated by the Preliminary Earth Model (PREM).
     Supports passing a list of radii."""
     r = np.array(r)
-    return np.piecewise(
-        r/EARTH_RADIUS,
-        (r < 1221.5e3,
-         (1221.5e3 <= r) & (r < 3480.0e3),
-         (3480.0e3 <= r) & (r < 5701.0e3),
-         (5701.0e3 <= r) & (r < 5771.0e3),
-         (5771.0e3 <= r) & (r < 5971.0e3),
-         (5971.0e3 <= r) & (r < 6151.0e3),
-         (6151.0e3 <= r) & (r < 6346.6e3),
-         (6346.6e3 <= r) & (r < 6356.0e3),
-         (6356.0e3 <= r) & (r < 6368.0e3),
-         (6368.0e3 <= r) & (r < EARTH_RADIUS)),
-        (lambda x: 13.0885 - 8.8381 * (x**2),
-         lambda x: 12.5815 - x * (1.2638 + x * (3.6426 + x * 5.5281)),
-         lambda x: 7.9565 - x * (6.4761 - x * (5.5283 - x * 3.0807)),
-         lambda x: 5.3197 - x * 1.4836,
-         lambda x: 11.2494 - x * 8.0298,
-         lambda x: 7.1089 - x * 3.8045,
-         lambda x: 2.691 + x * 0.6924,
-         2.9,
-         2.6,
-         1.02,
-         0) # Last value is used if no conditions are met (r >= EARTH_RADIUS)
-    )
-
-
-def slant_depth(angle, depth, step=500):
+    conditions = [r < PREM_RADII[1]]
+    conditions.extend((inner <= r) & (r < outer)
+                      for inner, outer in zip(PREM_RADII[1:-1],
+                                              PREM_RADII[2:]))
+    functions = [lambda x, c=c: np.polynomial.polynomial.polyval(x, c)
+                 for c in PREM_COEFFICIENTS]
+    # Last value is used if no conditions are met (r >= EARTH_RADIUS)
+    functions.append(0)
+    return np.piecewise(r/EARTH_RADIUS, conditions, functions)
+
+
+def slant_depth(angle, depth, step=None):
     """Returns the material thickness (g/cm^2) for a chord cutting through
     earth at Nadir angle and starting at (positive-valued) depth (m).
-    Can optionally specify the step size (m)."""
+    Calculated exactly by integrating the PREM density polynomials
+    analytically along the part of the chord in each shell. Can optionally
+    specify a step size (m) to instead integrate numerically.
+    Supports passing arrays of angles and/or depths."""
+    shape = np.broadcast(angle, depth).shape
+    angles = np.broadcast_to(angle, shape).astype(np.float_).ravel()
+    depths = np.broadcast_to(depth, shape).astype(np.float_).ravel()
+
+    if step is None:
+        depth_integral = _analytic_slant_depth(angles, depths)
+    else:
+        depth_integral = _numerical_slant_depth(angles, depths, step)
+
+    if shape==():
+        return depth_integral[0]
+    return depth_integral.reshape(shape)
+
+
+def _asinh_term(s, b):
+    """Returns b^2 * asinh(s/b), with the limiting value of zero for b=0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b>0, b**2 * np.arcsinh(s/b), 0)
+
+
+def _radius_power_integral(power, s, b):
+    """Returns the antiderivative of r^power with respect to distance s (m)
+    along a chord with impact radius b (m), where r=sqrt(s^2+b^2). Supports
+    powers up to 3."""
+    if power==0:
+        return s
+    elif power==1:
+        r = np.sqrt(s**2 + b**2)
+        return (s*r + _asinh_term(s, b)) / 2
+    elif power==2:
+        return s**3/3 + b**2*s
+    elif power==3:
+        r = np.sqrt(s**2 + b**2)
+        return s*r**3/4 + 3*b**2*s*r/8 + 3*b**2*_asinh_term(s, b)/8
+    else:
+        raise ValueError("Power "+str(power)+" not supported")
+
+
+def _analytic_slant_depth(angles, depths):
+    """Returns the material thickness (g/cm^2) for chords cutting through
+    earth at Nadir angles and starting at (positive-valued) depths (m), by
+    analytic integration in each PREM shell."""
+    # Parametrize the chord by the distance s along it from its closest
+    # approach to the earth's center (at the impact radius b)
+    r0 = EARTH_RADIUS - depths
+    s0 = -r0 * np.cos(angles)
+    b = np.abs(r0 * np.sin(angles))
+    # Distances from the closest approach to each shell boundary, with
+    # r^2 - b^2 = (r^2 - r0^2) + s0^2 for better precision near the surface
+    radii = PREM_RADII[:, np.newaxis]
+    boundaries = np.sqrt(np.clip((radii-r0)*(radii+r0) + s0**2, 0, None))
+    s1 = boundaries[-1]
+
+    depth_integral = np.zeros(len(angles))
+    for i, coefficients in enumerate(PREM_COEFFICIENTS):
+        # The chord is in the shell on both sides of its closest approach
+        for lower, upper in [(boundaries[i], boundaries[i+1]),
+                             (-boundaries[i+1], -boundaries[i])]:
+            start = np.maximum(lower, s0)
+            stop = np.minimum(upper, s1)
+            inside = stop>start
+            if not np.any(inside):
+                continue
+            for power, c in enumerate(coefficients):
+                if c==0:
+                    continue
+                integral = (_radius_power_integral(power, stop[inside],
+                                                   b[inside]) -
+                            _radius_power_integral(power, start[inside],
+                                                   b[inside]))
+                depth_integral[inside] += c * integral / EARTH_RADIUS**power
+    # Convert from meters to centimeters
+    return 100 * depth_integral
+
+
+def _numerical_slant_depth(angles, depths, step):
+    """Returns the material thickness (g/cm^2) for chords cutting through
+    earth at Nadir angles and starting at (positive-valued) depths (m), by
+    numerical integration with the given step size (m)."""
     # Starting point (x0, z0)
     x0 = 0
-    z0 = EARTH_RADIUS - depth
+    z0 = EARTH_RADIUS - depths
     # Find exit point (x1, z1)
-    if angle==0:
-        x1 = 0
-        z1 = -EARTH_RADIUS
-    else:
-        m = -np.cos(angle) / np.sin(angle)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = -np.cos(angles) / np.sin(angles)
         a = z0-m*x0
         b = 1+m**2
-        if angle<0:
-            x1 = -m*a/b - np.sqrt(m**2*a**2/b**2 - (a**2 - EARTH_RADIUS**2)/b)
-        else:
-            x1 = -m*a/b + np.sqrt(m**2*a**2/b**2 - (a**2 - EARTH_RADIUS**2)/b)
+        root = np.sqrt(m**2*a**2/b**2 - (a**2 - EARTH_RADIUS**2)/b)
+        x1 = np.where(angles<0, -m*a/b - root, -m*a/b + root)
         z1 = z0 + m*(x1-x0)
+    x1 = np.where(angles==0, 0, x1)
+    z1 = np.where(angles==0, -EARTH_RADIUS, z1)
 
     # Parametrize line integral with t from 0 to 1, with steps just under the
     # given step size (in meters)
     l = np.sqrt((x1-x0)**2 + (z1-z0)**2)
-    ts = np.linspace(0, 1, int(l/step)+2)
-    xs = x0 + (x1-x0)*ts
-    zs = z0 + (z1-z0)*ts
-    rs = np.sqrt(xs**2 + zs**2)
-    rhos = prem_density(rs)
-    x_int = np.trapz(rhos*(x1-x0), ts)
-    z_int = np.trapz(rhos*(z1-z0), ts)
-    return 100 * np.sqrt(x_int**2 + z_int**2)
+    n_ts = (l/step).astype(np.int_) + 2
+    # Integrate chords in blocks of similar length to limit the number of
+    # points in memory. Chords with fewer steps than the longest chord in the
+    # block have their extra t values fixed at 1, which don't contribute to
+    # the integral
+    depth_integral = np.zeros(len(l))
+    order = np.argsort(n_ts)
+    sorted_n_ts = n_ts[order]
+    start = 0
+    while start<len(l):
+        # Number of points in blocks ending at each later chord
+        block_points = (np.arange(1, len(l)-start+1) * sorted_n_ts[start:])
+        stop = start + max(1, np.searchsorted(block_points, 2**18,
+                                              side='right'))
+        block = order[start:stop]
+        start = stop
+        steps = np.arange(np.max(n_ts[block]))
+        ts = np.minimum(steps / (n_ts[block, np.newaxis]-1), 1)
+        dx = (x1[block]-x0)[:, np.newaxis]
+        dz = (z1[block]-z0[block])[:, np.newaxis]
+        xs = x0 + dx*ts
+        zs = z0[block, np.newaxis] + dz*ts
+        rs = np.sqrt(xs**2 + zs**2)
+        rhos = prem_density(rs)
+        x_int = np.trapz(rhos*dx, ts, axis=1)
+        z_int = np.trapz(rhos*dz, ts, axis=1)
+        depth_integral[block] = 100 * np.sqrt(x_int**2 + z_int**2)
+
+    return depth_integral
+
+
+class SlantDepthTable:
+    """Class for fast calculation of slant depths (g/cm^2) by interpolation of
+    precomputed values. Calling the table with a nadir angle and (positive-
+    valued) depth (m) returns the same quantity as slant_depth, and supports
+    arrays of angles and/or depths.
+    Within the constant-density crust, ocean, and ice shells of PREM the slant
+    depth of any chord is the column depth of the full chord through the earth
+    less the part above the starting depth, which is calculated analytically.
+    So only the full-chord column depth needs to be tabulated, which is done
+    as a function of the chord's impact radius (its closest approach to the
+    earth's center). Each PREM shell is tabulated separately on a grid of
+    points evenly spaced in the half-length of the chord inside the top of the
+    shell, so that the kinks where chords graze shell boundaries fall on grid
+    edges and the interpolated values are smooth within each grid cell.
+    The grid values are integrated by Gauss-Legendre quadrature of the given
+    order in each shell, and the interpolation is checked at the center of
+    each grid cell during building. The largest relative error found is
+    stored as the error attribute (~1e-6 with the default points). Since the
+    part of a downward chord above its starting depth is never more than half
+    of the full chord, slant depths have relative errors of at most about
+    twice this value.
+    Points deeper than the constant-density shells fall back to slant_depth.
+    If a cache_file is given, the table is loaded from the file if it exists
+    and was made with the same number of points and quadrature order,
+    otherwise it is built and saved to the file. As with numpy.savez, the
+    .npz extension is added to the cache_file name if missing."""
+    def __init__(self, points=1000, order=32, cache_file=None, build=True):
+        self.points = points
+        self.order = order
+        # Constant-density shells, for which the part of the chord above the
+        # starting depth is calculated analytically
+        inner_radii = PREM_RADII[:-1]
+        outer_radii = PREM_RADII[1:]
+        densities = prem_density((inner_radii+outer_radii)/2)
+        constant = inner_radii>=6346.6e3
+        self._shell_inner_radii = inner_radii[constant]
+        self._shell_outer_radii = outer_radii[constant]
+        self._shell_densities = densities[constant]
+        self.max_depth = EARTH_RADIUS - np.min(self._shell_inner_radii)
+        if cache_file is not None:
+            try:
+                loaded = self.load(cache_file)
+            except (IOError, KeyError):
+                loaded = None
+            if (loaded is not None and loaded.points==self.points and
+                    loaded.order==self.order):
+                self.chord_depths = loaded.chord_depths
+                self.error = loaded.error
+                return
+        if build:
+            self.build()
+            if cache_file is not None:
+                self.save(cache_file)
+
+    def __call__(self, angle, depth):
+        """Returns the material thickness (g/cm^2) for a chord cutting through
+        earth at Nadir angle and starting at (positive-valued) depth (m).
+        Supports passing arrays of angles and/or depths."""
+        shape = np.broadcast(angle, depth).shape
+        angles = np.broadcast_to(angle, shape).astype(np.float_).ravel()
+        depths = np.broadcast_to(depth, shape).astype(np.float_).ravel()
+
+        depth_integral = np.zeros(len(angles))
+        deep = (depths<0) | (depths>self.max_depth)
+        if np.any(deep):
+            depth_integral[deep] = slant_depth(angles[deep], depths[deep])
+
+        shallow = ~deep
+        r0 = EARTH_RADIUS - depths[shallow]
+        cos_angle = np.cos(angles[shallow])
+        # Squared half-length of the chord inside the starting radius
+        w0_sq = (r0 * cos_angle)**2
+        above = self._column_depth_above(r0, w0_sq)
+        downward = cos_angle>0
+        chord = self._interpolate(r0[downward], w0_sq[downward])
+        above[downward] = chord - above[downward]
+        depth_integral[shallow] = above
+
+        if shape==():
+            return depth_integral[0]
+        return depth_integral.reshape(shape)
+
+    def _column_depth_above(self, r0, w0_sq):
+        """Returns the column depth (g/cm^2) of the part of the chord above
+        radius r0 (m), for chords with squared half-length w0_sq (m^2) inside
+        radius r0."""
+        column_depth = np.zeros(len(r0))
+        for inner, outer, density in zip(self._shell_inner_radii,
+                                         self._shell_outer_radii,
+                                         self._shell_densities):
+            start = np.clip(r0, inner, outer)
+            # Half-lengths of the chord inside the shell boundaries, with
+            # r^2 - b^2 = (r^2 - r0^2) + w0^2 for impact radius b. Shells
+            # below r0 have start==outer, so don't contribute
+            s_start = np.sqrt(np.clip((start-r0)*(start+r0) + w0_sq, 0, None))
+            s_outer = np.sqrt(np.clip((outer-r0)*(outer+r0) + w0_sq, 0, None))
+            column_depth += 100 * density * (s_outer - s_start)
+        return column_depth
+
+    def _shell_half_lengths(self, i, w_sq):
+        """Returns the half-lengths (m) of the chords inside each PREM shell
+        boundary, for chords with squared half-lengths w_sq (m^2) inside the
+        top of shell i."""
+        top = PREM_RADII[i+1]
+        radii = PREM_RADII[:, np.newaxis]
+        # r^2 - b^2 = (r^2 - r_top^2) + w^2 for impact radius b
+        return np.sqrt(np.clip((radii-top)*(radii+top) + w_sq, 0, None))
+
+    def _exact_chord_depths(self, i, ws):
+        """Returns the column depths (g/cm^2) of full chords through the earth
+        with half-lengths ws (m) inside the top of PREM shell i, integrated by
+        Gauss-Legendre quadrature in each shell."""
+        ws = np.asarray(ws, dtype=np.float_)
+        top = PREM_RADII[i+1]
+        b_sq = (top-ws)*(top+ws)
+        half_lengths = self._shell_half_lengths(i, ws**2)
+        nodes, weights = np.polynomial.legendre.leggauss(self.order)
+        column_depth = np.zeros(len(ws))
+        for s_inner, s_outer in zip(half_lengths[:-1], half_lengths[1:]):
+            center = ((s_outer + s_inner) / 2)[:, np.newaxis]
+            half_width = ((s_outer - s_inner) / 2)[:, np.newaxis]
+            ss = center + half_width * nodes
+            rs = np.sqrt(ss**2 + b_sq[:, np.newaxis])
+            column_depth += np.sum(prem_density(rs)*weights*half_width, axis=1)
+        # Factor of 2 for both halves of the chord, 100 for m to cm
+        return 200 * column_depth
+
+    def _segment_widths(self):
+        """Returns the largest chord half-lengths (m) inside the top of each
+        PREM shell, for chords with impact radius in the shell."""
+        inner = PREM_RADII[:-1]
+        outer = PREM_RADII[1:]
+        return np.sqrt((outer-inner)*(outer+inner))
+
+    def build(self):
+        """Calculates the full-chord column depths on the grid of each PREM
+        shell and checks the interpolation accuracy at each grid cell
+        center."""
+        fractions = np.linspace(0, 1, self.points)
+        centers = (fractions[:-1] + fractions[1:]) / 2
+        self.chord_depths = np.zeros((len(PREM_RADII)-1, self.points))
+        self.error = 0
+        for i, width in enumerate(self._segment_widths()):
+            self.chord_depths[i] = self._exact_chord_depths(i, fractions*width)
+            exact = self._exact_chord_depths(i, centers*width)
+            interpolated = (self.chord_depths[i, :-1] +
+                            self.chord_depths[i, 1:]) / 2
+            self.error = max(self.error,
+                             np.max(np.abs(interpolated/exact - 1)))
+        logger.debug("Slant depth table built with relative error %g",
+                     self.error)
+
+    def _interpolate(self, r0, w0_sq):
+        """Returns the interpolated full-chord column depths (g/cm^2) for
+        chords through starting radius r0 (m) with squared half-length w0_sq
+        (m^2) inside radius r0."""
+        # Impact radius squared is r0^2 - w0^2
+        b = np.sqrt(np.clip(r0**2 - w0_sq, 0, None))
+        # Shell containing the impact radius, with boundaries belonging to the
+        # shell below them
+        shells = np.clip(np.searchsorted(PREM_RADII, b, side='left')-1,
+                         0, len(PREM_RADII)-2)
+        tops = PREM_RADII[shells+1]
+        w = np.sqrt(np.clip((tops-r0)*(tops+r0) + w0_sq, 0, None))
+        x = np.clip(w / self._segment_widths()[shells], 0, 1) * (self.points-1)
+        j = np.minimum(x.astype(np.int_), self.points-2)
+        u = x - j
+        return ((1-u) * self.chord_depths[shells, j] +
+                u * self.chord_depths[shells, j+1])
+
+    def save(self, filename):
+        """Saves the table to the given .npz file (adding the extension if
+        missing)."""
+        np.savez(self._npz_filename(filename), points=self.points,
+                 order=self.order, chord_depths=self.chord_depths,
+                 error=self.error)
+
+    @staticmethod
+    def _npz_filename(filename):
+        """Returns the filename with the .npz extension (which numpy.savez
+        adds to filenames without it)."""
+        if isinstance(filename, str) and not filename.endswith(".npz"):
+            return filename+".npz"
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a table from the given .npz file (adding the extension if
+        missing)."""
+        with np.load(cls._npz_filename(filename)) as data:
+            table = cls(points=int(data['points']), order=int(data['order']),
+                        build=False)
+            table.chord_depths = data['chord_depths']
+            table.error = float(data['error'])
+        return table
@@ -1,36 +1,72 @@
 """Module for the simulation kernel. Includes neutrino generation,
 ray tracking (no raytracing yet), and hit generation."""
 
+import collections
 import logging
+import multiprocessing
+import os
+import pickle
 import numpy as np
 from pyrex.internal_functions import normalize
-from pyrex.signals import AskaryanSignal
-from pyrex.ray_tracing import RayTracer
+from pyrex.signals import Signal, SpectralSignal, AskaryanSignal, _even_spacing
+from pyrex.ray_tracing import RayTracer, RayTracerCache
 from pyrex.ice_model import IceModel
+from pyrex.output import event_record
 
 logger = logging.getLogger(__name__)
 
 
 class EventKernel:
     """Kernel for generation of events with a given particle generator,
-    list of antennas, and optionally a non-default ice_model."""
+    list of antennas, and optionally a non-default ice_model. If an
+    EventWriter is given, a record of each event is added to it. If
+    pretrigger is True, events are first checked against upper bounds on
+    their peak signal amplitudes, and the waveforms of events which can't
+    trigger any antenna are skipped. The bounds are calculated from the
+    spectrum of the pulse and so are only approximate after discretization,
+    which the pretrigger_margin allows for."""
+    # Factor by which the bounds on the peak signal amplitudes are increased
+    # before they are compared to the antenna thresholds
+    pretrigger_margin = 1.2
+    # Number of neighboring frequencies sharing a single calculation of the
+    # path attenuation in the bounds on the peak signal amplitudes
+    attenuation_block = 32
     def __init__(self, generator, antennas,
                  ice_model=IceModel, ray_tracer=RayTracer,
-                 signal_times=np.linspace(-20e-9, 80e-9, 2000, endpoint=False)):
+                 signal_times=np.linspace(-20e-9, 80e-9, 2000, endpoint=False),
+                 writer=None, pretrigger=False):
         self.gen = generator
         self.antennas = antennas
         self.ice = ice_model
         self.ray_tracer = ray_tracer
         self.signal_times = signal_times
+        self.writer = writer
+        self.pretrigger = pretrigger
+        # Whether the last processed particle was found to be below the
+        # threshold of every antenna (so its waveforms were skipped)
+        self.below_threshold = False
 
     def event(self):
         """Generate particle, propagate signal through ice to antennas,
         process signal at antennas, and return the original particle."""
         p = self.gen.create_particle()
+        ray_tracers = self.process_particle(p)
+        if self.writer is not None:
+            self.writer.add(p, ray_tracers,
+                            below_threshold=self.below_threshold)
+        return p
+
+    def process_particle(self, p):
+        """Propagate signal from the given particle through ice to antennas
+        and process signal at antennas. Returns the ray tracer used for each
+        antenna."""
         logger.info("Processing event for %s", p)
         n = self.ice.index(p.vertex[2])
-        for ant in self.antennas:
+        ray_tracers = []
+        hits = []
+        for i, ant in enumerate(self.antennas):
             rt = self.ray_tracer(p.vertex, ant.position, ice_model=self.ice)
+            ray_tracers.append(rt)
 
             # If no path(s) between the points, skip ahead
             if not rt.exists:
@@ -54,17 +90,313 @@ class EventKernel:
                 if psi>np.pi/2:
                     continue
 
-                # FIXME: Use shower energy for AskaryanSignal
-                # Dependent on shower type / neutrino type
+                hits.append((i, ant, path, psi, epol))
 
-                pulse = AskaryanSignal(times=self.signal_times,
-                                       energy=p.energy, theta=psi, n=n)
+        self.below_threshold = (self.pretrigger and len(hits)>0 and
+                                not self.could_trigger(p, n, hits))
+        if self.below_threshold:
+            logger.debug("Signals can't trigger any antenna; "+
+                         "skipping waveforms")
+            return ray_tracers
 
-                path.propagate(pulse)
-                # Dividing by path length scales Askaryan pulse properly
-                pulse.values /= path.path_length
+        if len(hits)==0:
+            return ray_tracers
 
-                ant.receive(pulse, direction=path.received_direction,
-                            polarization=epol)
+        # FIXME: Use shower energy for AskaryanSignal
+        # Dependent on shower type / neutrino type
 
-        return p
+        # Calculate the pulses along all paths at once
+        pulses = AskaryanSignal.pulses(self.signal_times, energy=p.energy,
+                                       theta=[hit[3] for hit in hits], n=n)
+
+        # Filters along the path and at the antenna are accumulated in the
+        # frequency domain and only applied once the waveform is used, which
+        # requires evenly spaced signal times. Since the waveform isn't
+        # truncated to the signal times between filters, it differs slightly
+        # (by about 1e-3 of its peak) from applying each filter immediately
+        if _even_spacing(np.asarray(self.signal_times)) is None:
+            pulse_class = Signal
+            times = self.signal_times
+        else:
+            pulse_class = SpectralSignal
+            # Read-only times are shared by all of the pulses
+            times = np.array(self.signal_times, dtype=np.float_)
+            times.flags.writeable = False
+
+        for (i, ant, path, psi, epol), values in zip(hits, pulses):
+            pulse = pulse_class(times, values,
+                                value_type=Signal.ValueTypes.field)
+
+            path.propagate(pulse)
+            # Dividing by path length scales Askaryan pulse properly
+            pulse /= path.path_length
+
+            ant.receive(pulse, direction=path.received_direction,
+                        polarization=epol)
+
+        return ray_tracers
+
+    def could_trigger(self, p, n, hits):
+        """Test for whether the signals from particle p (in ice with index of
+        refraction n) along the paths of the given hits could trigger any
+        antenna, based on upper bounds of the peak signal amplitudes
+        (increased by the pretrigger_margin). Each hit is a tuple of the
+        antenna index, antenna, path, angle from the shower axis, and
+        polarization."""
+        voltages = {}
+        for i, ant, path, psi, epol in hits:
+            if not np.isfinite(ant.signal_bound(1)):
+                return True
+            amplitude = self.field_bound(p, n, ant, path, psi)
+            # Signals along multiple paths may overlap, so their bounds add
+            voltages[i] = voltages.get(i, 0) + ant.signal_bound(
+                amplitude * self.pretrigger_margin,
+                direction=path.received_direction, polarization=epol
+            )
+        for i, ant, path, psi, epol in hits:
+            if ant.could_trigger(voltages[i]):
+                return True
+        return False
+
+    def field_bound(self, p, n, ant, path, psi):
+        """Returns an upper bound on the peak electric field (V/m) of the
+        signal from particle p (in ice with index of refraction n) observed
+        at angle psi from the shower axis, after propagation along the path
+        and the frequency response of the antenna. Calculated by integrating
+        the bound on the pulse spectrum times the magnitudes of the filters
+        over the frequencies of the signal times."""
+        times = np.asarray(self.signal_times)
+        dt = (times[-1] - times[0]) / (len(times) - 1)
+        freqs = np.fft.rfftfreq(len(times), dt)
+        spectrum = (AskaryanSignal.spectrum_bound(p.energy, psi, freqs, n)
+                    * np.abs(ant.response(freqs)))
+        # Attenuation never increases with frequency, so the attenuation
+        # at the bottom of each block of frequencies bounds the whole block
+        block = self.attenuation_block
+        attenuation = np.abs(path.attenuation(freqs[::block]))
+        spectrum *= np.repeat(attenuation, block)[:len(freqs)]
+        return 2 * np.trapz(spectrum, freqs) / path.path_length
+
+    @staticmethod
+    def event_seed(seed, index, stage):
+        """Returns the random seed for the given stage of the event with the
+        given index in a run with the given master seed. Stage 0 is particle
+        generation and stage 1 is signal processing."""
+        return [seed, index, stage]
+
+    def run(self, n_events, workers=1, seed=None, checkpoint=None,
+            checkpoint_interval=1000, return_results=None):
+        """Runs n_events events, returning a list of the particle and the
+        (triggered) waveforms of each antenna for each event, in event order.
+        If return_results is False (the default if the kernel has a writer,
+        which records the events instead), no results are kept in memory and
+        None is returned.
+        Particles are generated in this process, while the signal processing
+        of events is spread across the given number of worker processes
+        (each with their own copy of the antennas). The global numpy random
+        state is seeded separately for each stage of each event based on the
+        master seed (drawn from the current random state if not given), and
+        antennas are cleared (including their noise) before each event, so
+        the results are identical for any number of workers. The global
+        random state is restored once the run finishes. Stateful ray tracers
+        like a RayTracerCache are the exception: each worker process fills
+        its own cache, so results may differ slightly between numbers of
+        workers (or from a resumed run).
+        If a checkpoint filename is given, the state of the run (generator
+        position, random state, event count, and writer offsets) is saved to
+        it at the start and after every checkpoint_interval events, so that
+        an interrupted run can be continued with the resume method."""
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+        return self._run(0, n_events, workers, seed, checkpoint,
+                         checkpoint_interval, return_results)
+
+    def resume(self, checkpoint, workers=1, return_results=None):
+        """Continues the run saved in the given checkpoint file, returning
+        the results of the remaining events as in the run method. The
+        results of the events before the checkpoint are not saved in the
+        checkpoint, so they are lost unless they were recorded by a writer.
+        The kernel should be set up as it was for the original run
+        (including the generator and writer), and is restored to its state
+        at the checkpoint, discarding any events written after it."""
+        with open(checkpoint, 'rb') as f:
+            state = pickle.load(f)
+        # The random state is seeded for each event, so only the generator
+        # state needs to be restored
+        self.gen.set_state(state['generator'])
+        if self.writer is not None:
+            self.writer.set_state(state['writer'])
+        logger.info("Resuming run at event %i of %i", state['next_event'],
+                    state['n_events'])
+        return self._run(state['next_event'], state['n_events'], workers,
+                         state['seed'], checkpoint,
+                         state['checkpoint_interval'], return_results)
+
+    def _run(self, start, n_events, workers, seed, checkpoint,
+             checkpoint_interval, return_results=None):
+        """Runs the events from index start up to n_events of a run with the
+        given master seed, saving checkpoints to the given file if it is not
+        None."""
+        if checkpoint is None:
+            after_event = None
+        else:
+            if not hasattr(self.gen, 'get_state'):
+                raise TypeError("Generator does not support checkpointing")
+            # Generator and random states after creating each event's
+            # particle, kept until the event is finished
+            states = {}
+
+            def save(next_event, generator_state, random_state):
+                state = {'seed': seed, 'n_events': n_events,
+                         'next_event': next_event,
+                         'checkpoint_interval': checkpoint_interval,
+                         'generator': generator_state,
+                         'random_state': random_state,
+                         'writer': None}
+                if self.writer is not None:
+                    self.writer.flush()
+                    state['writer'] = self.writer.get_state()
+                self.save_checkpoint(checkpoint, state)
+
+            def after_event(i):
+                generator_state, random_state = states.pop(i)
+                if (i+1)%checkpoint_interval==0 or i+1==n_events:
+                    save(i+1, generator_state, random_state)
+
+            save(start, self.gen.get_state(), np.random.get_state())
+
+        def particles():
+            for i in range(start, n_events):
+                np.random.seed(self.event_seed(seed, i, 0))
+                particle = self.gen.create_particle()
+                if checkpoint is not None:
+                    states[i] = (self.gen.get_state(), np.random.get_state())
+                yield i, particle
+
+        return self._run_particles(particles(), workers, seed, after_event,
+                                   return_results)
+
+    @staticmethod
+    def save_checkpoint(filename, state):
+        """Saves the given run state to the checkpoint file, replacing the
+        previous checkpoint only once the new one is completely written."""
+        temporary = filename+".tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(temporary, filename)
+
+    def run_particles(self, particles, workers=1, seed=None,
+                      return_results=None):
+        """Runs an event for each of the given particles (e.g. a
+        ParticleBatch), returning a list of the particle and the (triggered)
+        waveforms of each antenna for each event, in event order. Workers,
+        seeding, and return_results behave as in the run method, with the
+        index of each particle as its event index. If the kernel has a
+        writer, each event's record is added to it as the event finishes."""
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+        return self._run_particles(enumerate(particles), workers, seed,
+                                   return_results=return_results)
+
+    def _run_particles(self, indexed_particles, workers, seed,
+                       after_event=None, return_results=None):
+        """Runs an event for each of the given (index, particle) pairs,
+        calling after_event (if given) with the index of each event once it
+        is finished and written. Returns the list of results if
+        return_results is True (by default if there is no writer), otherwise
+        None."""
+        record = self.writer is not None
+        if return_results is None:
+            return_results = not record
+        waveforms = self.writer.waveforms if record else None
+        if workers>1 and isinstance(self.ray_tracer, RayTracerCache):
+            logger.warning("Each worker process fills its own ray tracer "+
+                           "cache, so results may differ slightly from "+
+                           "those with other numbers of workers")
+
+        def tasks():
+            for i, particle in indexed_particles:
+                yield i, particle, seed, record, waveforms, return_results
+
+        def collect(event_results):
+            results = []
+            for i, particle, waves, event in event_results:
+                if event is not None:
+                    self.writer.add_record(event, index=i)
+                if after_event is not None:
+                    after_event(i)
+                if return_results:
+                    results.append((particle, waves))
+            return results if return_results else None
+
+        # Events are seeded individually, so the caller's random state is
+        # restored afterwards
+        random_state = np.random.get_state()
+        if workers<=1:
+            try:
+                return collect(self._run_event(*task) for task in tasks())
+            finally:
+                np.random.set_state(random_state)
+
+        pool = multiprocessing.Pool(
+            workers, initializer=_init_worker,
+            initargs=(self.antennas, self.ice, self.ray_tracer,
+                      self.signal_times, self.pretrigger)
+        )
+
+        def event_results():
+            # Tasks (and so particles) are created in this thread as it
+            # submits them, keeping a limited number of events in flight,
+            # and results are returned in the order of the tasks
+            pending = collections.deque()
+            for task in tasks():
+                pending.append(pool.apply_async(_run_worker_event, (task,)))
+                if len(pending)>=2*workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+        try:
+            return collect(event_results())
+        finally:
+            pool.close()
+            pool.join()
+            np.random.set_state(random_state)
+
+    def _run_event(self, index, particle, seed, record=False, waveforms=None,
+                   return_waveforms=True):
+        """Processes the given particle as the event with the given index,
+        returning the index, the particle, the (triggered) waveforms of each
+        antenna (if requested, otherwise None), and the event record (if
+        requested, otherwise None) with the given waveforms option."""
+        np.random.seed(self.event_seed(seed, index, 1))
+        for ant in self.antennas:
+            ant.clear(reset_noise=True)
+        ray_tracers = self.process_particle(particle)
+        if record:
+            event = event_record(particle, self.antennas, ray_tracers,
+                                 waveforms=waveforms,
+                                 below_threshold=self.below_threshold)
+        else:
+            event = None
+        if return_waveforms:
+            waves = [list(ant.waveforms) for ant in self.antennas]
+        else:
+            waves = None
+        return index, particle, waves, event
+
+
+# Kernel used by each worker process of EventKernel.run
+_worker_kernel = None
+
+def _init_worker(antennas, ice_model, ray_tracer, signal_times, pretrigger):
+    """Sets up the kernel of a worker process."""
+    global _worker_kernel
+    _worker_kernel = EventKernel(generator=None, antennas=antennas,
+                                 ice_model=ice_model, ray_tracer=ray_tracer,
+                                 signal_times=signal_times,
+                                 pretrigger=pretrigger)
+
+def _run_worker_event(task):
+    """Runs an event in a worker process."""
+    return _worker_kernel._run_event(*task)
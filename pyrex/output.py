@@ -0,0 +1,354 @@
+"""Module for writing simulated events to disk. Events are stored in a
+columnar format, either as an HDF5 file (if h5py is available) or as a series
+of .npz shard files."""
+
+import glob
+import importlib.util
+import logging
+import os
+import os.path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Check if h5py can be imported on the current system
+# This variable can be checked before using the HDF5 backend
+__h5py_available__ = importlib.util.find_spec('h5py') is not None
+
+if __h5py_available__:
+    import h5py
+
+
+# Maximum number of ray solutions stored for each antenna
+MAX_SOLUTIONS = 2
+
+# Per-event columns and the shape of a single event's entry (excluding the
+# number of antennas, which is filled in by the writer)
+_PARTICLE_COLUMNS = {
+    'event': ((), np.int_),
+    'vertex': ((3,), np.float_),
+    'direction': ((3,), np.float_),
+    'energy': ((), np.float_),
+    'interaction': ((), np.int_),
+    'weight': ((), np.float_),
+    'below_threshold': ((), np.bool_),
+}
+_ANTENNA_COLUMNS = {
+    'triggered': ((), np.bool_),
+    'path_length': ((MAX_SOLUTIONS,), np.float_),
+    'tof': ((MAX_SOLUTIONS,), np.float_),
+    'emitted_direction': ((MAX_SOLUTIONS, 3), np.float_),
+    'received_direction': ((MAX_SOLUTIONS, 3), np.float_),
+}
+
+
+def _particle_record(particle, n_ant):
+    """Returns an event record for the given particle with no antenna
+    information, for n_ant antennas."""
+    return {
+        'vertex': np.array(particle.vertex, dtype=np.float_),
+        'direction': np.array(particle.direction, dtype=np.float_),
+        'energy': float(particle.energy),
+        'interaction': int(getattr(particle, 'interaction', -1)),
+        'weight': float(getattr(particle, 'weight', 1)),
+        'below_threshold': False,
+        'triggered': np.zeros(n_ant, dtype=np.bool_),
+        'path_length': np.full((n_ant, MAX_SOLUTIONS), np.nan),
+        'tof': np.full((n_ant, MAX_SOLUTIONS), np.nan),
+        'emitted_direction': np.full((n_ant, MAX_SOLUTIONS, 3), np.nan),
+        'received_direction': np.full((n_ant, MAX_SOLUTIONS, 3), np.nan),
+        'waveforms': [],
+    }
+
+
+def event_record(particle, antennas, ray_tracers=None, waveforms="all",
+                 below_threshold=False):
+    """Returns a record of an event as a dictionary of arrays, given the
+    event's particle, antennas (after processing the event), and optionally
+    the ray tracer used for each antenna. Waveforms may be "all" to record
+    all antenna waveforms, "triggered" to record waveforms only for events
+    where any antenna triggered, or None to record no waveforms.
+    Below_threshold marks events whose waveforms were skipped because they
+    couldn't trigger any antenna."""
+    if waveforms not in ["all", "triggered", None]:
+        raise ValueError("Invalid waveforms option "+str(waveforms))
+    antennas = list(antennas)
+    record = _particle_record(particle, len(antennas))
+    record['below_threshold'] = bool(below_threshold)
+    record['triggered'] = np.array([ant.is_hit for ant in antennas],
+                                   dtype=np.bool_)
+    if ray_tracers is not None:
+        for i, rt in enumerate(ray_tracers):
+            if rt is None or not rt.exists:
+                continue
+            for j, path in enumerate(rt.solutions[:MAX_SOLUTIONS]):
+                record['path_length'][i, j] = path.path_length
+                record['tof'][i, j] = path.tof
+                record['emitted_direction'][i, j] = path.emitted_direction
+                record['received_direction'][i, j] = path.received_direction
+
+    if waveforms=="all" or (waveforms=="triggered" and
+                            np.any(record['triggered'])):
+        for i, ant in enumerate(antennas):
+            for wave in ant.all_waveforms:
+                record['waveforms'].append((i, bool(ant.trigger(wave)),
+                                            wave.times[0], wave.dt,
+                                            np.array(wave.values)))
+    return record
+
+
+class EventWriter:
+    """Class for writing event records to disk in a columnar format.
+    Records are buffered in memory and written buffer_size events at a time.
+    The backend may be "hdf5", which appends to chunked datasets of a single
+    HDF5 file (requires h5py), or "npz", which writes each buffer as a new
+    .npz shard file named after the filename with a shard number suffix.
+    By default HDF5 is used if h5py is available. Compression may be None,
+    or for the HDF5 backend any h5py compression filter (e.g. "gzip"); any
+    compression compresses the .npz shards. Waveforms may be "all",
+    "triggered", or None, as in event_record.
+    Can be used as a context manager, which closes the writer on exit."""
+    def __init__(self, filename, antennas, backend=None, buffer_size=1000,
+                 compression=None, waveforms="triggered"):
+        if backend is None:
+            backend = "hdf5" if __h5py_available__ else "npz"
+        if backend=="hdf5" and not __h5py_available__:
+            raise ImportError("h5py could not be imported. "+
+                              "Use the npz backend instead")
+        if backend not in ["hdf5", "npz"]:
+            raise ValueError("Invalid backend "+str(backend))
+        if waveforms not in ["all", "triggered", None]:
+            raise ValueError("Invalid waveforms option "+str(waveforms))
+        self.filename = filename
+        self.antennas = antennas
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self.waveforms = waveforms
+        self.events_written = 0
+        self.waveforms_written = 0
+        self.values_written = 0
+        self.shards_written = 0
+        self._buffer = []
+        self._file = None
+        # HDF5 file is opened (and .npz shards of any earlier run with the
+        # same filename are removed) on the first write, so that resuming
+        # with set_state doesn't overwrite the existing data
+        self._file_mode = 'w'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def events_buffered(self):
+        """Number of events added to the writer (including those not yet
+        written to disk)."""
+        return self.events_written + len(self._buffer)
+
+    def add(self, particle, ray_tracers=None, index=None,
+            below_threshold=False):
+        """Adds an event record for the given particle, the current state of
+        the writer's antennas, and optionally the ray tracer used for each
+        antenna. The event index defaults to the number of events added
+        before it."""
+        self.add_record(event_record(particle, self.antennas, ray_tracers,
+                                     waveforms=self.waveforms,
+                                     below_threshold=below_threshold),
+                        index=index)
+
+    def add_record(self, record, index=None):
+        """Adds the given event record (from event_record)."""
+        record['event'] = self.events_buffered if index is None else index
+        self._buffer.append(record)
+        if len(self._buffer)>=self.buffer_size:
+            self.flush()
+
+    def add_particles(self, particles, indices=None):
+        """Adds event records containing only the particle information of
+        each of the given particles (e.g. a ParticleBatch)."""
+        n_ant = len(list(self.antennas))
+        for i, particle in enumerate(particles):
+            record = _particle_record(particle, n_ant)
+            if hasattr(particles, 'interactions'):
+                record['interaction'] = particles.interactions[i]
+                record['weight'] = particles.weights[i]
+            self.add_record(record,
+                            index=None if indices is None else indices[i])
+
+    def _columns(self):
+        """Converts the buffered records into a dictionary of column
+        arrays."""
+        n_ant = len(list(self.antennas))
+        columns = {}
+        for key, (shape, dtype) in _PARTICLE_COLUMNS.items():
+            columns[key] = np.array([record[key] for record in self._buffer],
+                                    dtype=dtype).reshape((-1,)+shape)
+        for key, (shape, dtype) in _ANTENNA_COLUMNS.items():
+            columns[key] = np.array([record[key] for record in self._buffer],
+                                    dtype=dtype).reshape((-1, n_ant)+shape)
+
+        waves = [(record['event'],)+wave for record in self._buffer
+                 for wave in record['waveforms']]
+        lengths = np.array([len(wave[5]) for wave in waves], dtype=np.int_)
+        offsets = self.values_written + np.cumsum(lengths) - lengths
+        wave_values = [np.array([wave[i] for wave in waves], dtype=dtype)
+                       for i, dtype in zip(range(5), [np.int_, np.int_,
+                                                      np.bool_, np.float_,
+                                                      np.float_])]
+        columns['waveform_event'] = wave_values[0]
+        columns['waveform_antenna'] = wave_values[1]
+        columns['waveform_triggered'] = wave_values[2]
+        columns['waveform_t0'] = wave_values[3]
+        columns['waveform_dt'] = wave_values[4]
+        columns['waveform_offset'] = offsets.astype(np.int_)
+        columns['waveform_length'] = lengths
+        if len(waves)>0:
+            columns['waveform_values'] = np.concatenate([wave[5]
+                                                         for wave in waves])
+        else:
+            columns['waveform_values'] = np.zeros(0)
+        return columns
+
+    def flush(self):
+        """Writes all buffered records to disk."""
+        if len(self._buffer)==0:
+            return
+        columns = self._columns()
+        if self.backend=="hdf5":
+            self._write_hdf5(columns)
+        else:
+            self._write_npz(columns)
+        logger.debug("Wrote %i events to %s", len(self._buffer),
+                     self.filename)
+        self.events_written += len(self._buffer)
+        self.waveforms_written += len(columns['waveform_event'])
+        self.values_written += len(columns['waveform_values'])
+        self._buffer = []
+
+    def _open_hdf5(self):
+        """Opens the HDF5 file if it isn't already open."""
+        if self._file is None:
+            self._file = h5py.File(self.filename, self._file_mode)
+            self._file_mode = 'a'
+
+    def _write_hdf5(self, columns):
+        """Appends the columns to the datasets of the HDF5 file."""
+        self._open_hdf5()
+        for key, values in columns.items():
+            if key not in self._file:
+                self._file.create_dataset(
+                    key, data=values, maxshape=(None,)+values.shape[1:],
+                    chunks=True, compression=self.compression
+                )
+            else:
+                dataset = self._file[key]
+                start = dataset.shape[0]
+                dataset.resize(start+len(values), axis=0)
+                dataset[start:] = values
+        self._file.flush()
+
+    def shard_filename(self, index):
+        """Returns the name of the .npz shard file with the given index."""
+        root = os.path.splitext(self.filename)[0]
+        return root+"_{:05d}.npz".format(index)
+
+    def _write_npz(self, columns):
+        """Writes the columns to a new .npz shard file."""
+        self._start_npz()
+        filename = self.shard_filename(self.shards_written)
+        if self.compression:
+            np.savez_compressed(filename, **columns)
+        else:
+            np.savez(filename, **columns)
+        self.shards_written += 1
+
+    def _start_npz(self):
+        """Removes the .npz shards of any earlier run with the same filename
+        if the writer is not resuming, as the HDF5 backend overwrites the
+        file."""
+        if self._file_mode=='w':
+            self._remove_shards(0)
+            self._file_mode = 'a'
+
+    def _remove_shards(self, start):
+        """Removes any .npz shard files with index start or higher."""
+        root = os.path.splitext(self.filename)[0]
+        for shard in glob.glob(glob.escape(root)+"_"+"[0-9]"*5+".npz"):
+            index = int(shard[-9:-4])
+            if index>=start:
+                os.remove(shard)
+
+    def get_state(self):
+        """Returns the amount of data written to disk, for resuming writing
+        with set_state. Buffered records are not included, so the writer
+        should be flushed first."""
+        return {'events_written': self.events_written,
+                'waveforms_written': self.waveforms_written,
+                'values_written': self.values_written,
+                'shards_written': self.shards_written}
+
+    def set_state(self, state):
+        """Restores the writer to the state given by get_state, discarding
+        any buffered records and any data written to disk after that
+        state."""
+        self._buffer = []
+        self.events_written = state['events_written']
+        self.waveforms_written = state['waveforms_written']
+        self.values_written = state['values_written']
+        self.shards_written = state['shards_written']
+        if self.backend=="hdf5":
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._file_mode = 'a'
+            self._open_hdf5()
+            for key, dataset in self._file.items():
+                if key=='waveform_values':
+                    length = self.values_written
+                elif key.startswith('waveform_'):
+                    length = self.waveforms_written
+                else:
+                    length = self.events_written
+                dataset.resize(length, axis=0)
+            self._file.flush()
+        else:
+            self._file_mode = 'a'
+            self._remove_shards(self.shards_written)
+
+    def close(self):
+        """Writes any buffered records and closes the file."""
+        self.flush()
+        if self.backend=="hdf5":
+            # Make sure the file exists even if no events were written
+            self._open_hdf5()
+        else:
+            self._start_npz()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_events(filename, backend=None):
+    """Reads the event columns written by an EventWriter with the given
+    filename into a dictionary of arrays. The backend is guessed from the
+    files present if not given."""
+    if backend is None:
+        backend = "hdf5" if os.path.isfile(filename) else "npz"
+    if backend=="hdf5":
+        if not __h5py_available__:
+            raise ImportError("h5py could not be imported")
+        with h5py.File(filename, 'r') as f:
+            return {key: f[key][...] for key in f.keys()}
+    root = os.path.splitext(filename)[0]
+    shards = sorted(glob.glob(glob.escape(root)+"_"+"[0-9]"*5+".npz"))
+    if len(shards)==0:
+        raise IOError("No event files found for "+str(filename))
+    columns = {}
+    for shard in shards:
+        with np.load(shard) as data:
+            for key in data.keys():
+                columns.setdefault(key, []).append(data[key])
+    return {key: np.concatenate(values) for key, values in columns.items()}
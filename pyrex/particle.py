@@ -2,6 +2,10 @@
 Interactions include Earth shadowing (absorption) effect."""
 
 import logging
+import queue
+import struct
+import threading
+import zipfile
 import numpy as np
 from pyrex.internal_functions import normalize
 import pyrex.earth_model as earth_model
@@ -46,6 +50,96 @@ class Particle:
             string += key+"="+repr(val)+", "
         return string[:-2]+")"
 
+class ParticleBatch:
+    """Class for storing the attributes of many particles as contiguous
+    arrays. Consists of an (N,3) array of vertices (m), an (N,3) array of
+    direction vectors (automatically normalized), and arrays of energies
+    (GeV), interaction types, and weights. Interaction types are indices into
+    the interaction_types attribute, or -1 if unspecified.
+    Indexing with an integer returns a Particle whose vertex and direction
+    are views into the batch arrays (with its interaction type and weight as
+    interaction and weight attributes), while indexing with a slice (or index
+    array or mask) returns a ParticleBatch."""
+    interaction_types = (CC_NU, NC_NU, CC_NUBAR, NC_NUBAR)
+
+    def __init__(self, vertices, directions, energies, interactions=None,
+                 weights=None, normalize=True):
+        self.vertices = np.array(vertices, dtype=np.float_, ndmin=2)
+        self.directions = np.array(directions, dtype=np.float_, ndmin=2)
+        self.energies = np.array(energies, dtype=np.float_, ndmin=1)
+        if interactions is None:
+            interactions = np.full(len(self.energies), -1)
+        self.interactions = np.array(interactions, dtype=np.int_, ndmin=1)
+        if weights is None:
+            weights = np.ones(len(self.energies))
+        self.weights = np.array(weights, dtype=np.float_, ndmin=1)
+        if (self.vertices.shape!=(len(self.energies), 3) or
+                self.directions.shape!=(len(self.energies), 3)):
+            raise ValueError("Vertices and directions must have shape (N,3)")
+        if (len(self.interactions)!=len(self.energies) or
+                len(self.weights)!=len(self.energies)):
+            raise ValueError("Vertex, direction, energy, interaction, and "+
+                             "weight lists must all be the same length")
+        if normalize:
+            mags = np.linalg.norm(self.directions, axis=1)
+            mags[mags==0] = 1
+            self.directions /= mags[:, np.newaxis]
+
+    @classmethod
+    def from_particles(cls, particles):
+        """Creates a batch from a list of Particle objects, keeping any
+        interaction and weight attributes they have."""
+        particles = list(particles)
+        if len(particles)==0:
+            return cls(np.zeros((0, 3)), np.zeros((0, 3)), [])
+        return cls(vertices=[p.vertex for p in particles],
+                   directions=[p.direction for p in particles],
+                   energies=[p.energy for p in particles],
+                   interactions=[getattr(p, 'interaction', -1)
+                                 for p in particles],
+                   weights=[getattr(p, 'weight', 1) for p in particles])
+
+    @classmethod
+    def concatenate(cls, batches):
+        """Creates a batch by joining a list of batches."""
+        batches = list(batches)
+        return cls(vertices=np.concatenate([b.vertices for b in batches]),
+                   directions=np.concatenate([b.directions for b in batches]),
+                   energies=np.concatenate([b.energies for b in batches]),
+                   interactions=np.concatenate([b.interactions
+                                                for b in batches]),
+                   weights=np.concatenate([b.weights for b in batches]),
+                   normalize=False)
+
+    def __len__(self):
+        return len(self.energies)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            # Bypass the Particle constructor to avoid copying and
+            # normalizing the vertex and direction
+            particle = Particle.__new__(Particle)
+            particle.vertex = self.vertices[key]
+            particle.direction = self.directions[key]
+            particle.energy = self.energies[key]
+            particle.interaction = int(self.interactions[key])
+            particle.weight = float(self.weights[key])
+            return particle
+        return ParticleBatch(vertices=self.vertices[key],
+                             directions=self.directions[key],
+                             energies=self.energies[key],
+                             interactions=self.interactions[key],
+                             weights=self.weights[key],
+                             normalize=False)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        return self.__class__.__name__+"(size="+str(len(self))+")"
+
+
 def random_direction():
     """Generate an arbitrary 3D unit vector."""
     cos_theta = np.random.random_sample()*2-1
@@ -61,13 +155,24 @@ def random_direction():
     #         s = 1.0/mag
     #         return u * s
 
+def random_directions(n):
+    """Generate n arbitrary 3D unit vectors as an array with shape (n, 3)."""
+    cos_theta = np.random.random_sample(n)*2-1
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = np.random.random_sample(n) * 2*np.pi
+    return np.column_stack((sin_theta * np.cos(phi), sin_theta * np.sin(phi),
+                            cos_theta))
+
 class ShadowGenerator:
     """Class to generate UHE neutrino vertices in (relatively) shallow
     detectors. Takes into accout Earth shadowing (sort of).
     energy should be either an energy in GeV or a function that returns an
     energy in GeV. Note that the x and y ranges in which particles are created
-    are (-dx/2, dx/2) and (-dy/2, dy/2) while the z range is (-dz, 0)."""
-    def __init__(self, dx, dy, dz, energy):
+    are (-dx/2, dx/2) and (-dy/2, dy/2) while the z range is (-dz, 0).
+    The slant depth function used for the shadowing can optionally be
+    replaced (e.g. by an earth_model.SlantDepthTable)."""
+    def __init__(self, dx, dy, dz, energy,
+                 slant_depth=earth_model.slant_depth):
         self.dx = dx
         self.dy = dy
         self.dz = dz
@@ -80,36 +185,98 @@ class ShadowGenerator:
             else:
                 energy = lambda: e
         self.energy_generator = energy
+        self.slant_depth = slant_depth
         self.count = 0
 
-    def create_particle(self):
-        """Creates a particle with random vertex in cube with a random
-        direction."""
-        vtx = np.random.uniform(low=(-self.dx/2, -self.dy/2, -self.dz),
-                                high=(self.dx/2, self.dy/2, 0))
-        u = random_direction()
-        nadir = np.arccos(u[2])
-        depth = -vtx[2]
-        t = earth_model.slant_depth(nadir, depth)
-        E = self.energy_generator()
+    @staticmethod
+    def interaction_length(E):
+        """Returns the interaction length (cm) in water equivalent at a given
+        energy E (GeV), averaged between neutrinos and antineutrinos.
+        Supports passing an array of energies."""
         # Interaction length is average of neutrino and antineutrino
         # interaction lengths. Each of those is the inverted-sum of the
         # CC and NC interaction lengths.
-        inter_length = 2/(1/CC_NU.interaction_length(E) +
-                          1/NC_NU.interaction_length(E) +
-                          1/CC_NUBAR.interaction_length(E) +
-                          1/NC_NUBAR.interaction_length(E))
-        x = t / inter_length
-        self.count += 1
-        rand_exponential = np.random.exponential()
-        if rand_exponential > x:
-            p = Particle(vtx, u, E)
-            logger.debug("Successfully created %s", p)
-            return p
-        else:
-            # Particle was shadowed by the earth. Try again
-            logger.debug("Particle creation shadowed by the Earth")
-            return self.create_particle()
+        return 2/(1/CC_NU.interaction_length(E) +
+                  1/NC_NU.interaction_length(E) +
+                  1/CC_NUBAR.interaction_length(E) +
+                  1/NC_NUBAR.interaction_length(E))
+
+    def create_particle(self):
+        """Creates a particle with random vertex in cube with a random
+        direction."""
+        while True:
+            vtx = np.random.uniform(low=(-self.dx/2, -self.dy/2, -self.dz),
+                                    high=(self.dx/2, self.dy/2, 0))
+            u = random_direction()
+            nadir = np.arccos(u[2])
+            depth = -vtx[2]
+            t = self.slant_depth(nadir, depth)
+            E = self.energy_generator()
+            x = t / self.interaction_length(E)
+            self.count += 1
+            rand_exponential = np.random.exponential()
+            if rand_exponential > x:
+                p = Particle(vtx, u, E)
+                logger.debug("Successfully created %s", p)
+                return p
+            else:
+                # Particle was shadowed by the earth. Try again
+                logger.debug("Particle creation shadowed by the Earth")
+
+    def get_state(self):
+        """Returns the count of the generator, for resuming generation with
+        set_state. Note that the random state is not included."""
+        return {'count': self.count}
+
+    def set_state(self, state):
+        """Sets the count of the generator to the value given by
+        get_state."""
+        self.count = state['count']
+
+    def create_particles(self, n):
+        """Creates n particles with random vertices in cube with random
+        directions, returned as a ParticleBatch. Particles are drawn in
+        batches and those shadowed by the earth are replaced by new draws.
+        The count is increased as if the particles were created one at a
+        time."""
+        vertices = np.zeros((n, 3))
+        directions = np.zeros((n, 3))
+        energies = np.zeros(n)
+        n_created = 0
+        n_tried = 0
+        while n_created<n:
+            n_needed = n - n_created
+            # Draw enough particles to (probably) get all that are needed,
+            # based on the fraction which have survived so far
+            if n_created>0:
+                n_draw = int(np.ceil(1.1 * n_needed * n_tried / n_created))
+            else:
+                n_draw = n_needed
+            vtxs = np.random.uniform(low=(-self.dx/2, -self.dy/2, -self.dz),
+                                     high=(self.dx/2, self.dy/2, 0),
+                                     size=(n_draw, 3))
+            us = random_directions(n_draw)
+            nadirs = np.arccos(us[:, 2])
+            depths = -vtxs[:, 2]
+            ts = self.slant_depth(nadirs, depths)
+            Es = np.array([self.energy_generator() for _ in range(n_draw)],
+                          dtype=np.float_)
+            xs = ts / self.interaction_length(Es)
+            rand_exponentials = np.random.exponential(size=n_draw)
+            survivors = np.flatnonzero(rand_exponentials > xs)[:n_needed]
+            if len(survivors)==n_needed:
+                # Only count particles up to the last one needed
+                n_draw = survivors[-1] + 1
+            self.count += n_draw
+            n_tried += n_draw
+            logger.debug("%i of %i particles shadowed by the Earth",
+                         n_draw-len(survivors), n_draw)
+            new = slice(n_created, n_created+len(survivors))
+            vertices[new] = vtxs[survivors]
+            directions[new] = us[survivors]
+            energies[new] = Es[survivors]
+            n_created += len(survivors)
+        return ParticleBatch(vertices, directions, energies, normalize=False)
 
 
 class ListGenerator:
@@ -131,6 +298,57 @@ class ListGenerator:
             raise StopIteration("No more particles to be generated")
         return self.particles[self._index%len(self.particles)]
 
+    def get_state(self):
+        """Returns the position of the generator, for resuming generation
+        with set_state."""
+        return {'index': self._index}
+
+    def set_state(self, state):
+        """Moves the generator to the position given by get_state."""
+        self._index = state['index']
+
+    def create_particles(self, n):
+        """Pulls the next n particles from the list as a ParticleBatch. If
+        not looping, the batch stops at the end of the list."""
+        if not self.loop:
+            n = min(n, len(self.particles)-self._index-1)
+            if n<=0:
+                raise StopIteration("No more particles to be generated")
+        indices = (self._index + 1 + np.arange(n)) % len(self.particles)
+        self._index += n
+        if isinstance(self.particles, ParticleBatch):
+            return self.particles[indices]
+        return ParticleBatch.from_particles(self.particles[i]
+                                            for i in indices)
+
+
+def _particle_array_keys(keys):
+    """Returns the keys of the vertex, direction, and energy arrays among the
+    given keys of a .npz file, based on their names (or None for any which
+    can't be found). If the arrays are unnamed, assumes they are in that
+    order."""
+    keys = list(keys)
+    if 'arr_0' in keys:
+        return 'arr_0', 'arr_1', 'arr_2'
+    vertex_key = None
+    direction_key = None
+    energy_key = None
+    for key in keys:
+        lower = key.lower()
+        if 'vert' in lower:
+            vertex_key = key
+        elif lower.startswith('v'):
+            vertex_key = key
+        if 'dir' in lower:
+            direction_key = key
+        elif lower.startswith('d'):
+            direction_key = key
+        if 'en' in lower:
+            energy_key = key
+        elif lower.startswith('e'):
+            energy_key = key
+    return vertex_key, direction_key, energy_key
+
 
 class FileGenerator:
     """Class to generate neutrinos by pulling their vertex, direction, and
@@ -158,29 +376,13 @@ class FileGenerator:
         if self._file_index>=len(self.files):
             raise StopIteration("No more particles to be generated")
         with np.load(self.files[self._file_index]) as data:
-            if 'arr_0' in data:
-                self.vertices = data['arr_0']
-                self.directions = data['arr_1']
-                self.energies = data['arr_2']
-            else:
-                for key, val in data.items():
-                    key = key.lower()
-                    if 'vert' in key:
-                        self.vertices = val
-                    elif key.startswith('v'):
-                        self.vertices = val
-                    if 'dir' in key:
-                        self.directions = val
-                    elif key.startswith('d'):
-                        self.directions = val
-                    if 'en' in key:
-                        self.energies = val
-                    elif key.startswith('e'):
-                        self.energies = val
-        if (self.vertices is None or self.directions is None
-                or self.energies is None):
-            raise KeyError("Could not interpret data keys of file "+
-                           str(self.files[self._file_index]))
+            keys = _particle_array_keys(data.keys())
+            if None in keys:
+                raise KeyError("Could not interpret data keys of file "+
+                               str(self.files[self._file_index]))
+            self.vertices = data[keys[0]]
+            self.directions = data[keys[1]]
+            self.energies = data[keys[2]]
         if (len(self.vertices)!=len(self.directions) or
                 len(self.vertices)!=len(self.energies)):
             raise ValueError("Vertex, direction, and energy lists must all be"+
@@ -195,3 +397,330 @@ class FileGenerator:
         return Particle(vertex=self.vertices[self._index],
                         direction=self.directions[self._index],
                         energy=self.energies[self._index])
+
+    def get_state(self):
+        """Returns the position of the generator, for resuming generation
+        with set_state."""
+        return {'file_index': self._file_index, 'index': self._index}
+
+    def set_state(self, state):
+        """Moves the generator to the position given by get_state."""
+        if state['file_index']>=len(self.files):
+            self._file_index = state['file_index']
+            self._index = state['index']
+            self.vertices = None
+            self.directions = None
+            self.energies = None
+            return
+        if state['file_index']!=self._file_index:
+            self._file_index = state['file_index'] - 1
+            self._next_file()
+        self._index = state['index']
+
+    def create_particles(self, n):
+        """Pulls the next n particles from the file(s) as a ParticleBatch.
+        The batch stops early if the last file runs out of particles."""
+        batches = []
+        while n>0:
+            if self.vertices is None or self._index+1>=len(self.vertices):
+                try:
+                    self._next_file()
+                except StopIteration:
+                    if len(batches)==0:
+                        raise
+                    break
+                continue
+            rows = slice(self._index+1, self._index+1+n)
+            batch = ParticleBatch(vertices=self.vertices[rows],
+                                  directions=self.directions[rows],
+                                  energies=self.energies[rows])
+            self._index += len(batch)
+            n -= len(batch)
+            batches.append(batch)
+        if len(batches)==1:
+            return batches[0]
+        return ParticleBatch.concatenate(batches)
+
+
+class _StreamedArray:
+    """Class for reading rows of an array stored in a compressed .npz file
+    sequentially, without loading the whole array into memory. Supports
+    slicing by (increasing) row ranges like an array."""
+    def __init__(self, filename, member):
+        self.filename = filename
+        self.member = member
+        self._zip = None
+        self._file = None
+        self._position = 0
+        self._open()
+        self.close()
+
+    def _open(self):
+        """Opens the array's member of the .npz file and reads its header."""
+        self._zip = zipfile.ZipFile(self.filename)
+        self._file = self._zip.open(self.member)
+        version = np.lib.format.read_magic(self._file)
+        if version==(1, 0):
+            header = np.lib.format.read_array_header_1_0(self._file)
+        else:
+            header = np.lib.format.read_array_header_2_0(self._file)
+        self.shape, fortran_order, self.dtype = header
+        if fortran_order and len(self.shape)>1:
+            raise ValueError("Can't stream Fortran-ordered array "+
+                             self.member+" of file "+str(self.filename))
+        self._row_size = self.dtype.itemsize * int(np.prod(self.shape[1:]))
+        self._position = 0
+
+    def close(self):
+        """Closes the .npz file."""
+        if self._file is not None:
+            self._file.close()
+            self._zip.close()
+        self._file = None
+        self._zip = None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read(self, n_rows):
+        """Reads the next n_rows rows of the array as bytes."""
+        n_bytes = n_rows * self._row_size
+        chunks = []
+        while n_bytes>0:
+            chunk = self._file.read(n_bytes)
+            if len(chunk)==0:
+                raise IOError("Unexpected end of array "+self.member+
+                              " in file "+str(self.filename))
+            chunks.append(chunk)
+            n_bytes -= len(chunk)
+        self._position += n_rows
+        return b"".join(chunks)
+
+    def __getitem__(self, rows):
+        start, stop, _ = rows.indices(len(self))
+        stop = max(start, stop)
+        if self._file is None or start<self._position:
+            self.close()
+            self._open()
+        # Skip forward to the start row without keeping the skipped rows
+        skip_rows = max(1, 2**24 // max(self._row_size, 1))
+        while self._position<start:
+            self._read(min(skip_rows, start-self._position))
+        data = self._read(stop-start)
+        return np.frombuffer(data, dtype=self.dtype).reshape(
+            (stop-start,)+tuple(self.shape[1:])
+        )
+
+
+def _memmap_member(filename, info):
+    """Returns a read-only memory map of an uncompressed array member of a
+    .npz file, given the member's ZipInfo."""
+    with open(filename, 'rb') as f:
+        # The member's data follows its local file header, which has the
+        # name and extra field lengths at bytes 26 to 30
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version==(1, 0):
+            header = np.lib.format.read_array_header_1_0(f)
+        else:
+            header = np.lib.format.read_array_header_2_0(f)
+        shape, fortran_order, dtype = header
+        offset = f.tell()
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order='F' if fortran_order else 'C')
+
+
+def _open_particle_arrays(filename):
+    """Returns array-like objects for the vertices, directions, and energies
+    stored in the given .npy or .npz file(s) without loading them into
+    memory. Uncompressed arrays are memory mapped, while compressed arrays
+    are streamed. The filename may be a .npz file, or a tuple of three .npy
+    files containing the vertices, directions, and energies."""
+    if not isinstance(filename, str):
+        return tuple(np.load(name, mmap_mode='r') for name in filename)
+    with zipfile.ZipFile(filename) as zf:
+        members = {info.filename[:-4]: info for info in zf.infolist()
+                   if info.filename.endswith('.npy')}
+    keys = _particle_array_keys(members.keys())
+    if None in keys:
+        raise KeyError("Could not interpret data keys of file "+str(filename))
+    arrays = []
+    for key in keys:
+        info = members[key]
+        if info.compress_type==zipfile.ZIP_STORED:
+            arrays.append(_memmap_member(filename, info))
+        else:
+            arrays.append(_StreamedArray(filename, info.filename))
+    return tuple(arrays)
+
+
+class StreamingFileGenerator:
+    """Class to generate neutrinos by streaming their vertex, direction, and
+    energy from a (list of) .npz file(s) in chunks, for particle lists too
+    large to load into memory. Files are interpreted as in FileGenerator,
+    and a file may also be given as a tuple of three .npy files containing
+    the vertices, directions, and energies respectively.
+    Uncompressed arrays are memory mapped and compressed arrays are read
+    sequentially, chunk_size rows at a time. If prefetch is True the next
+    chunk is read on a background thread while the current one is used.
+    The rows of all files can be split into the given number of shards
+    (contiguous row ranges of nearly equal size), of which only the shard
+    with the given index is generated, so that worker processes can share
+    a file list."""
+    def __init__(self, files, chunk_size=100000, prefetch=True, shard=0,
+                 shards=1):
+        if isinstance(files, str):
+            self.files = [files]
+        else:
+            self.files = files
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        if shard<0 or shard>=shards:
+            raise ValueError("Shard index must be in the range [0, shards)")
+        self.shard = shard
+        self.shards = shards
+
+        self._file_lengths = []
+        for filename in self.files:
+            arrays = _open_particle_arrays(filename)
+            lengths = [len(array) for array in arrays]
+            for array in arrays:
+                if isinstance(array, _StreamedArray):
+                    array.close()
+            if lengths[0]!=lengths[1] or lengths[0]!=lengths[2]:
+                raise ValueError("Vertex, direction, and energy lists must "+
+                                 "all be the same length")
+            self._file_lengths.append(lengths[0])
+        total = sum(self._file_lengths)
+        self.start_row = total * shard // shards
+        self.stop_row = total * (shard+1) // shards
+        self._thread = None
+        self._start(0)
+
+    def __len__(self):
+        return self.stop_row - self.start_row
+
+    def _start(self, position):
+        """Starts streaming chunks from the given number of rows into the
+        shard."""
+        self._position = position
+        self._chunks = self._iterate_chunks(self.start_row+position)
+        self._batch = None
+        self._index = -1
+        self._queue = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        if self.prefetch:
+            self._queue = queue.Queue(maxsize=1)
+            self._thread = threading.Thread(target=self._prefetch_chunks)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def get_state(self):
+        """Returns the position of the generator, for resuming generation
+        with set_state."""
+        return {'position': self._position}
+
+    def set_state(self, state):
+        """Moves the generator to the position given by get_state."""
+        self.close()
+        self._start(state['position'])
+
+    def _iterate_chunks(self, first_row):
+        """Yields ParticleBatch chunks of the rows in the shard, starting
+        from the given row."""
+        file_start = 0
+        for filename, length in zip(self.files, self._file_lengths):
+            file_stop = file_start + length
+            start = max(first_row, file_start) - file_start
+            stop = min(self.stop_row, file_stop) - file_start
+            file_start = file_stop
+            if stop<=start:
+                continue
+            arrays = _open_particle_arrays(filename)
+            try:
+                for i in range(start, stop, self.chunk_size):
+                    rows = slice(i, min(i+self.chunk_size, stop))
+                    yield ParticleBatch(vertices=arrays[0][rows],
+                                        directions=arrays[1][rows],
+                                        energies=arrays[2][rows])
+            finally:
+                for array in arrays:
+                    if isinstance(array, _StreamedArray):
+                        array.close()
+
+    def _prefetch_chunks(self):
+        """Reads chunks into the queue on the background thread. The end of
+        the chunks is marked by None, and any exception is passed through the
+        queue to be raised by the main thread."""
+        try:
+            for chunk in self._chunks:
+                while not self._stop_event.is_set():
+                    try:
+                        self._queue.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop_event.is_set():
+                    return
+            self._queue.put(None)
+        except Exception as e:
+            self._queue.put(e)
+
+    def _next_chunk(self):
+        """Pulls the next chunk into memory."""
+        self._index = -1
+        if self.prefetch:
+            chunk = self._queue.get() if self._thread is not None else None
+            if chunk is None or isinstance(chunk, Exception):
+                self._thread = None
+                self._batch = None
+                if isinstance(chunk, Exception):
+                    raise chunk
+                raise StopIteration("No more particles to be generated")
+        else:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._batch = None
+                raise StopIteration("No more particles to be generated")
+        self._batch = chunk
+
+    def create_particle(self):
+        """Pulls the next particle from the file(s)."""
+        self._index += 1
+        if self._batch is None or self._index>=len(self._batch):
+            self._next_chunk()
+            self._index = 0
+        self._position += 1
+        return self._batch[self._index]
+
+    def create_particles(self, n):
+        """Pulls the next n particles from the file(s) as a ParticleBatch.
+        The batch stops early if the shard runs out of particles."""
+        batches = []
+        while n>0:
+            if self._batch is None or self._index+1>=len(self._batch):
+                try:
+                    self._next_chunk()
+                except StopIteration:
+                    if len(batches)==0:
+                        raise
+                    break
+            batch = self._batch[self._index+1:self._index+1+n]
+            self._index += len(batch)
+            self._position += len(batch)
+            n -= len(batch)
+            batches.append(batch)
+        if len(batches)==1:
+            return batches[0]
+        return ParticleBatch.concatenate(batches)
+
+    def close(self):
+        """Stops the background thread from reading any further chunks."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
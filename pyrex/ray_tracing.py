@@ -1,5 +1,6 @@
 """Module containing class for ray tracing through the ice."""
 
+from collections import OrderedDict
 import logging
 import numpy as np
 import scipy.optimize
@@ -187,7 +188,7 @@ class BasicRayTracePath(LazyMutableClass):
     def propagate(self, signal):
         """Applies attenuation to the signal along the path."""
         signal.filter_frequencies(self.attenuation)
-        signal.times += self.tof
+        signal.times = signal.times + self.tof
 
     @lazy_property
     def coordinates(self):
@@ -243,6 +244,16 @@ class SpecializedRayTracePath(BasicRayTracePath):
     uniformity_factor = 0.99999
     # Beta value below which calculations may break down
     beta_tolerance = 0.005
+    # Method for calculating attenuation. "numerical" integrates the
+    # attenuation at every frequency requested, while "interpolated" only
+    # integrates at the attenuation_basis frequencies once per path and
+    # interpolates (log-log) between them, memoizing the results for each
+    # set of frequencies requested
+    attenuation_mode = "numerical"
+    # Frequencies (Hz) at which to integrate in "interpolated" mode.
+    # Includes 1 GHz where the attenuation length parametrization changes
+    attenuation_basis = np.concatenate((np.logspace(5, 9, 81),
+                                        np.logspace(9, 11, 41)[1:]))
 
     @lazy_property
     def valid_ice_model(self):
@@ -261,43 +272,50 @@ class SpecializedRayTracePath(BasicRayTracePath):
     def _z_int_uniform_correction(z0, z1, z_uniform, beta, ice, integrand,
                                   derivative_special_case=False):
         """Function for performing z-integration, taking into account the
-        effect of treating the ice as uniform beyond some depth."""
+        effect of treating the ice as uniform beyond some depth.
+        Supports passing numpy arrays of z0, z1, and beta."""
+        def int_z(z):
+            # Choose deep or shallow integrand based on depth z
+            if np.ndim(z)==0:
+                return integrand(z, beta, ice, deep=z<z_uniform)
+            else:
+                return np.where(z<z_uniform,
+                                integrand(z, beta, ice, deep=True),
+                                integrand(z, beta, ice, deep=False))
+
         # Suppress numpy RuntimeWarnings
         with np.errstate(divide='ignore', invalid='ignore'):
-            int_z0 = integrand(z0, beta, ice, deep=z0<z_uniform)
-            int_z1 = integrand(z1, beta, ice, deep=z1<z_uniform)
+            int_z0 = int_z(z0)
+            int_z1 = int_z(z1)
             if not derivative_special_case:
-                if (z0<z_uniform)==(z1<z_uniform):
-                    # z0 and z1 on same side of z_uniform
+                # z0 and z1 on same side of z_uniform
+                same_side = (z0<z_uniform)==(z1<z_uniform)
+                if np.all(same_side):
                     return int_z1 - int_z0
-                else:
-                    int_diff = (integrand(z_uniform, beta, ice, deep=True) -
-                                integrand(z_uniform, beta, ice, deep=False))
-                    if z0<z1:
-                        # z0 below z_uniform, z1 above z_uniform
-                        return int_z1 - int_z0 + int_diff
-                    else:
-                        # z0 above z_uniform, z1 below z_uniform
-                        return int_z1 - int_z0 - int_diff
+                int_diff = (integrand(z_uniform, beta, ice, deep=True) -
+                            integrand(z_uniform, beta, ice, deep=False))
+                # z0 below z_uniform, z1 above z_uniform: add int_diff
+                # z0 above z_uniform, z1 below z_uniform: subtract int_diff
+                return np.where(same_side, int_z1 - int_z0,
+                                np.where(z0<z1, int_z1 - int_z0 + int_diff,
+                                         int_z1 - int_z0 - int_diff))
             else:
                 # Deal with special case of doing distance integral beta derivative
                 # which includes two bounds instead of just giving indef. integral
                 # FIXME: Somewhat inaccurate, should probably be done differently
                 z_turn = np.log((ice.n0-beta)/ice.k)/ice.a
-                if (z0<z_uniform)==(z1<z_uniform)==(z_turn<z_uniform):
-                    # All on same side of z_uniform
+                same_side = (z0<z_uniform)==(z1<z_uniform)
+                # All on same side of z_uniform
+                all_same_side = same_side & ((z1<z_uniform)==(z_turn<z_uniform))
+                if np.all(all_same_side):
                     return int_z0 + int_z1
-                else:
-                    int_diff = (integrand(z_uniform, beta, ice, deep=True) -
-                                integrand(z_uniform, beta, ice, deep=False))
-                    if (z0<z_uniform)==(z1<z_uniform):
-                        # z0 and z1 below z_uniform, but z_turn above
-                        return int_z0 + int_z1 - 2*int_diff
-                    else:
-                        # z0 or z1 below z_uniform, others above
-                        return int_z0 + int_z1 - int_diff
-
-
+                int_diff = (integrand(z_uniform, beta, ice, deep=True) -
+                            integrand(z_uniform, beta, ice, deep=False))
+                # z0 and z1 below z_uniform, but z_turn above: subtract 2*diff
+                # z0 or z1 below z_uniform, others above: subtract int_diff
+                return np.where(all_same_side, int_z0 + int_z1,
+                                np.where(same_side, int_z0 + int_z1 - 2*int_diff,
+                                         int_z0 + int_z1 - int_diff))
 
     def z_integral(self, integrand, numerical=False, x_func=lambda x: x):
         """Function for integrating a given integrand along the depths of
@@ -379,26 +397,28 @@ class SpecializedRayTracePath(BasicRayTracePath):
         z_turn = np.log((ice.n0-beta)/ice.k)/ice.a
         # print("z_turn:", z_turn)
         if deep:
-            if z_turn<0:
-                return ((np.log((ice.n0-beta)/ice.k)/ice.a - z -
-                         beta/(ice.a*(ice.n0-beta))) / np.sqrt(alpha))
-            else:
-                return -z / np.sqrt(alpha)
+            return np.where(z_turn<0,
+                            ((np.log((ice.n0-beta)/ice.k)/ice.a - z -
+                              beta/(ice.a*(ice.n0-beta))) / np.sqrt(alpha)),
+                            -z / np.sqrt(alpha))
         else:
-            if z_turn<0:
-                term_1 = ((1+beta**2/alpha)/np.sqrt(alpha) * 
-                          (z + np.log(beta*ice.k/log_1) / ice.a))
-                term_2 = -(beta**2+ice.n0*n_z) / (ice.a*alpha*np.sqrt(gamma))
-            else:
-                term_1 = -(1+beta**2/alpha)/np.sqrt(alpha)*(-z + np.log(log_1) /
-                           ice.a)
-                term_2 = -((beta*(np.sqrt(alpha)-np.sqrt(gamma)))**2 /
-                           (ice.a*alpha*np.sqrt(gamma)*log_1))
-                alpha, n_z, gamma, log_1, log_2 = cls._int_terms(0, beta, ice)
-                term_1 += (1+beta**2/alpha)/np.sqrt(alpha)*(np.log(log_1) /
-                           ice.a)
-                term_2 += ((beta*(np.sqrt(alpha)-np.sqrt(gamma)))**2 /
-                           (ice.a*alpha*np.sqrt(gamma)*log_1))
+            # Terms for z_turn below the ice surface
+            term_1_below = ((1+beta**2/alpha)/np.sqrt(alpha) *
+                            (z + np.log(beta*ice.k/log_1) / ice.a))
+            term_2_below = (-(beta**2+ice.n0*n_z) /
+                            (ice.a*alpha*np.sqrt(gamma)))
+            # Terms for z_turn above the ice surface
+            term_1_above = -(1+beta**2/alpha)/np.sqrt(alpha)*(-z +
+                             np.log(log_1) / ice.a)
+            term_2_above = -((beta*(np.sqrt(alpha)-np.sqrt(gamma)))**2 /
+                             (ice.a*alpha*np.sqrt(gamma)*log_1))
+            alpha, n_z, gamma, log_1, log_2 = cls._int_terms(0, beta, ice)
+            term_1_above += (1+beta**2/alpha)/np.sqrt(alpha)*(np.log(log_1) /
+                             ice.a)
+            term_2_above += ((beta*(np.sqrt(alpha)-np.sqrt(gamma)))**2 /
+                             (ice.a*alpha*np.sqrt(gamma)*log_1))
+            term_1 = np.where(z_turn<0, term_1_below, term_1_above)
+            term_2 = np.where(z_turn<0, term_2_below, term_2_above)
         return np.where(np.isclose(beta, 0, atol=cls.beta_tolerance),
                         np.inf,
                         term_1+term_2)
@@ -458,7 +478,56 @@ class SpecializedRayTracePath(BasicRayTracePath):
 
     def attenuation(self, f):
         """Returns the attenuation factor for a signal of frequency f (Hz)
-        traveling along the path. Supports passing a list of frequencies."""
+        traveling along the path. Supports passing a list of frequencies.
+        In "interpolated" attenuation_mode, the (read-only) result is memoized
+        for each set of frequencies."""
+        if self.attenuation_mode=="interpolated":
+            fa = np.abs(np.array(f, dtype=np.float_))
+            key = (fa.shape, fa.tobytes())
+            if key not in self._attenuation_cache:
+                attenuation = (np.exp(-self.attenuation_integral(fa))
+                               * self.fresnel)
+                attenuation.flags.writeable = False
+                self._attenuation_cache[key] = attenuation
+            return self._attenuation_cache[key]
+        return np.exp(-self.attenuation_integral(f)) * self.fresnel
+
+    @lazy_property
+    def _attenuation_cache(self):
+        """Memoized attenuation factors for each set of frequencies."""
+        return {}
+
+    @lazy_property
+    def _basis_attenuation_integrals(self):
+        """Attenuation integrals at the attenuation_basis frequencies."""
+        return self._numerical_attenuation_integral(self.attenuation_basis)
+
+    def attenuation_integral(self, f):
+        """Returns the integral of the inverse attenuation length along the
+        path for a signal of frequency f (Hz), not including the Fresnel factor.
+        Calculated based on the attenuation_mode of the path.
+        Supports passing a list of frequencies."""
+        if self.attenuation_mode=="numerical":
+            return self._numerical_attenuation_integral(f)
+        elif self.attenuation_mode=="interpolated":
+            fa = np.atleast_1d(np.abs(f))
+            # Supress RuntimeWarnings when f==0 temporarily
+            with np.errstate(divide='ignore'):
+                integrals = np.exp(np.interp(
+                    np.log(fa), np.log(self.attenuation_basis),
+                    np.log(self._basis_attenuation_integrals)
+                ))
+            # Attenuation length is infinite at zero frequency
+            integrals[fa==0] = 0
+            return integrals
+        else:
+            raise ValueError("Invalid attenuation_mode '"+
+                             str(self.attenuation_mode)+"'")
+
+    def _numerical_attenuation_integral(self, f):
+        """Returns the attenuation integral for a signal of frequency f (Hz)
+        by numerical integration along the path at each frequency.
+        Supports passing a list of frequencies."""
         fa = np.abs(f)
 
         def xi(z):
@@ -484,22 +553,20 @@ class SpecializedRayTracePath(BasicRayTracePath):
 
         # If beta close to zero, just do the regular integral
         if np.isclose(self.beta, 0, atol=self.beta_tolerance):
-            return (np.exp(-np.abs(self.z_integral(z_integrand, numerical=True)))
-                    * self.fresnel)
+            return np.abs(self.z_integral(z_integrand, numerical=True))
         # Otherwise, do xi integral designed to avoid singularity at z_turn
         else:
-            return (np.exp(-np.abs(self.z_integral(xi_integrand, numerical=True, x_func=xi)))
-                    * self.fresnel)
+            return np.abs(self.z_integral(xi_integrand, numerical=True,
+                                          x_func=xi))
 
     @lazy_property
     def coordinates(self):
         """x, y, and z-coordinates along the path (using dz step)."""
         def r_int(z0, z1s):
-            return np.array([self._z_int_uniform_correction(
-                                z0, z, self.z_uniform, self.beta, self.ice,
-                                self._distance_integral
-                             )
-                             for z in z1s])
+            return self._z_int_uniform_correction(
+                z0, z1s, self.z_uniform, self.beta, self.ice,
+                self._distance_integral
+            )
 
         if self.direct:
             n_zs = int(np.abs(self.z1-self.z0)/self.dz)
@@ -508,7 +575,8 @@ class SpecializedRayTracePath(BasicRayTracePath):
             rs *= np.sign(np.cos(self.theta0))
 
         else:
-            n_zs_1 = int(np.abs(self.z_turn-self.z0)/self.dz)
+            # Include at least the launching point before the turning point
+            n_zs_1 = max(int(np.abs(self.z_turn-self.z0)/self.dz), 1)
             zs_1 = np.linspace(self.z0, self.z_turn, n_zs_1, endpoint=False)
             rs_1 = r_int(self.z0, zs_1)
 
@@ -852,6 +920,834 @@ RayTracePath = SpecializedRayTracePath
 
 
 
+class BatchRayTracer(LazyMutableClass):
+    """Class for ray tracing between many launching and receiving points at
+    once, specifically for ice model with index of refraction
+    n(z) = n0 - k*exp(a*z). Solutions for all pairs of the N from_points and
+    M to_points are found together by vectorized bisection of the same
+    integrals used by SpecializedRayTracer. Results are arrays with shape
+    (N, M, 3) (with an extra axis of length 3 for directions), where the third
+    axis is the solution type (0: direct path, 1: indirect path > peak,
+    2: indirect path < peak) and values are nan where no solution exists.
+    Ice model must use methods inherited from pyrex.AntarcticIce"""
+    solution_class = SpecializedRayTracePath
+
+    def __init__(self, from_points, to_points, ice_model=IceModel, dz=1):
+        self.from_points = np.array(from_points, dtype=np.float_, ndmin=2)
+        self.to_points = np.array(to_points, dtype=np.float_, ndmin=2)
+        self.ice = ice_model
+        self.dz = dz
+        super().__init__()
+
+    @property
+    def shape(self):
+        """Shape (N, M) of the arrays of launching and receiving point
+        pairs."""
+        return (len(self.from_points), len(self.to_points))
+
+    @lazy_property
+    def valid_ice_model(self):
+        """Whether the ice model being used supports this specialization."""
+        return ((isinstance(self.ice, type) and
+                 issubclass(self.ice, AntarcticIce))
+                or isinstance(self.ice, AntarcticIce))
+
+    @lazy_property
+    def z_uniform(self):
+        """Depth beyond which the ice should be treated as uniform.
+        Necessary due to numerical rounding issues."""
+        return self.ice.depth_with_index(self.ice.n0 *
+                                         self.solution_class.uniformity_factor)
+
+    # Calculations are performed on flattened arrays of all point pairs,
+    # since ice model methods only support one-dimensional arrays
+    def _reshape(self, values):
+        """Reshapes flattened pair values to the (N, M) shape of point pairs,
+        keeping any trailing dimensions."""
+        return np.reshape(values, self.shape+np.shape(values)[1:])
+
+    @lazy_property
+    def _from_z(self):
+        """Depths of the launching points for all pairs."""
+        return np.repeat(self.from_points[:, 2], self.shape[1])
+
+    @lazy_property
+    def _to_z(self):
+        """Depths of the receiving points for all pairs."""
+        return np.tile(self.to_points[:, 2], self.shape[0])
+
+    @lazy_property
+    def _z0(self):
+        """Depths of the lower points for all pairs. Ray tracing performed as
+        if launching from lower point to higher point."""
+        return np.minimum(self._from_z, self._to_z)
+
+    @lazy_property
+    def _z1(self):
+        """Depths of the higher points for all pairs. Ray tracing performed as
+        if launching from lower point to higher point."""
+        return np.maximum(self._from_z, self._to_z)
+
+    @lazy_property
+    def _n0(self):
+        """Indices of refraction of the ice at the lower points."""
+        return self.ice.index(self._z0)
+
+    @lazy_property
+    def _rho(self):
+        """Radial distances between the launching and receiving points."""
+        u = self.to_points[np.newaxis, :] - self.from_points[:, np.newaxis]
+        return np.sqrt(u[:, :, 0]**2 + u[:, :, 1]**2).ravel()
+
+    @lazy_property
+    def _phi(self):
+        """Azimuthal angles between the launching and receiving points."""
+        u = self.to_points[np.newaxis, :] - self.from_points[:, np.newaxis]
+        return np.arctan2(u[:, :, 1], u[:, :, 0]).ravel()
+
+    @lazy_property
+    def _max_angle(self):
+        """Maximum possible launch angles for rays between the points."""
+        return np.arcsin(self.ice.index(self._z1)/self._n0)
+
+    def _r_distance(self, theta, z0, z1):
+        """Returns the r distances between given depths for given launch
+        angles from the lower points."""
+        if not self.valid_ice_model:
+            raise TypeError("Ice model must inherit methods from "+
+                            "pyrex.AntarcticIce")
+        beta = np.sin(theta) * self._n0
+        return self.solution_class._z_int_uniform_correction(
+            z0, z1, self.z_uniform, beta, self.ice,
+            self.solution_class._distance_integral
+        )
+
+    def _r_distance_derivative(self, theta, z0, z1):
+        """Returns the derivatives of the r distances between given depths
+        for given launch angles from the lower points."""
+        if not self.valid_ice_model:
+            raise TypeError("Ice model must inherit methods from "+
+                            "pyrex.AntarcticIce")
+        beta = np.sin(theta) * self._n0
+        beta_prime = np.cos(theta) * self._n0
+        return beta_prime * self.solution_class._z_int_uniform_correction(
+            z0, z1, self.z_uniform, beta, self.ice,
+            self.solution_class._distance_integral_derivative,
+            derivative_special_case=True
+        )
+
+    def _direct_r(self, angle):
+        """Returns the r distances of the direct rays for the given launch
+        angles."""
+        return self._r_distance(angle, self._z0, self._z1)
+
+    def _indirect_r(self, angle):
+        """Returns the r distances of the indirect rays for the given launch
+        angles."""
+        z_turn = self.ice.depth_with_index(self._n0 * np.sin(angle))
+        return (self._r_distance(angle, self._z0, z_turn) +
+                self._r_distance(angle, self._z1, z_turn))
+
+    def _indirect_r_prime(self, angle):
+        """Returns the derivatives of the r distances of the indirect rays for
+        the given launch angles."""
+        return self._r_distance_derivative(angle, self._z0, self._z1)
+
+    @lazy_property
+    def _peak_angle(self):
+        """Angles at which indirect solution curves (in r vs angle) peak.
+        Separates angle intervals for indirect solution root-finding."""
+        peak_angle = self.angle_search(0, self._indirect_r_prime,
+                                       0, self._max_angle)
+        # No true peak angle where _indirect_r_prime(0) and
+        # _indirect_r_prime(max_angle) have the same sign
+        return np.where(np.isnan(peak_angle), self._max_angle, peak_angle)
+
+    @lazy_property
+    def _direct_r_max(self):
+        """Maximum r values of direct ray solutions."""
+        z_turn = self.ice.depth_with_index(self._n0 *
+                                           np.sin(self._max_angle))
+        return self._r_distance(self._max_angle, self._z0, z_turn)
+
+    @lazy_property
+    def _indirect_r_max(self):
+        """Maximum r values of indirect ray solutions."""
+        return self._indirect_r(self._peak_angle)
+
+    @lazy_property
+    def _expected_solutions(self):
+        """Which types of solutions are expected to exist for all pairs."""
+        in_ice = (self._from_z<=0) & (self._to_z<=0)
+        direct = in_ice & (self._rho<self._direct_r_max)
+        indirect = in_ice & ~direct & (self._rho<self._indirect_r_max)
+        return np.stack([direct, indirect, direct | indirect], axis=-1)
+
+    @lazy_property
+    def _lower_launch_angles(self):
+        """Launch angles of each solution type from the lower points, or nan
+        where the solution doesn't exist."""
+        expected = self._expected_solutions
+        angles = np.full(expected.shape, np.nan)
+        if np.any(expected[:, 0]):
+            angles[:, 0] = self.angle_search(self._rho, self._direct_r,
+                                             0, self._max_angle)
+        if np.any(expected[:, 1]):
+            angles[:, 1] = self.angle_search(self._rho, self._indirect_r,
+                                             self._peak_angle,
+                                             self._max_angle)
+        if np.any(expected[:, 2]):
+            max_angle = np.where(expected[:, 1],
+                                 self._peak_angle, self._max_angle)
+            angles[:, 2] = self.angle_search(self._rho, self._indirect_r,
+                                             0, max_angle)
+        angles[~expected] = np.nan
+        return angles
+
+    @lazy_property
+    def _launch_angles(self):
+        """Launch angles of each solution type from the launching points,
+        or nan where the solution doesn't exist."""
+        # Convert to true launch angle from the launching point
+        # rather than from lower point (z0)
+        with np.errstate(invalid='ignore'):
+            angles = np.arcsin(np.sin(self._lower_launch_angles) *
+                               (self._n0/self.ice.index(self._from_z))[:, None])
+        downward = self._from_z>self._to_z
+        angles[downward, 0] = np.pi - angles[downward, 0]
+        return angles
+
+    def _path_integral(self, integrand):
+        """Returns the absolute integral of the integrand along the paths of
+        each solution type, using the same integrals as solution_class."""
+        values = np.full(self._launch_angles.shape, np.nan)
+        n_launch = self.ice.index(self._from_z)
+        for i in range(3):
+            beta = n_launch * np.sin(self._launch_angles[:, i])
+            if i==0:
+                values[:, i] = self.solution_class._z_int_uniform_correction(
+                    self._from_z, self._to_z, self.z_uniform, beta, self.ice,
+                    integrand
+                )
+            else:
+                with np.errstate(invalid='ignore'):
+                    z_turn = self.ice.depth_with_index(beta)
+                int_1 = self.solution_class._z_int_uniform_correction(
+                    self._from_z, z_turn, self.z_uniform, beta, self.ice,
+                    integrand
+                )
+                int_2 = self.solution_class._z_int_uniform_correction(
+                    self._to_z, z_turn, self.z_uniform, beta, self.ice,
+                    integrand
+                )
+                values[:, i] = int_1 + int_2
+        values[~self._exists] = np.nan
+        return np.abs(values)
+
+    @lazy_property
+    def _exists(self):
+        """Which types of solutions exist for all pairs."""
+        return self._expected_solutions & ~np.isnan(self._launch_angles)
+
+    @lazy_property
+    def rho(self):
+        """Radial distances between the launching and receiving points."""
+        return self._reshape(self._rho)
+
+    @lazy_property
+    def phi(self):
+        """Azimuthal angles between the launching and receiving points."""
+        return self._reshape(self._phi)
+
+    @lazy_property
+    def direct_r_max(self):
+        """Maximum r values of direct ray solutions."""
+        return self._reshape(self._direct_r_max)
+
+    @lazy_property
+    def indirect_r_max(self):
+        """Maximum r values of indirect ray solutions."""
+        return self._reshape(self._indirect_r_max)
+
+    @lazy_property
+    def expected_solutions(self):
+        """Array of which types of solutions are expected to exist.
+        0: direct path, 1: indirect path > peak, 2: indirect path < peak."""
+        return self._reshape(self._expected_solutions)
+
+    @lazy_property
+    def solution_exists(self):
+        """Array of which types of solutions were found to exist.
+        0: direct path, 1: indirect path > peak, 2: indirect path < peak."""
+        return self._reshape(self._exists)
+
+    @lazy_property
+    def exists(self):
+        """Array of whether any paths exist between the point pairs."""
+        return np.any(self.expected_solutions, axis=-1)
+
+    @lazy_property
+    def launch_angles(self):
+        """Launch angles of the solutions."""
+        return self._reshape(self._launch_angles)
+
+    @lazy_property
+    def path_length(self):
+        """Lengths of the solution paths (m)."""
+        return self._reshape(
+            self._path_integral(self.solution_class._pathlen_integral)
+        )
+
+    @lazy_property
+    def tof(self):
+        """Times of flight (s) along the solution paths."""
+        return self._reshape(
+            self._path_integral(self.solution_class._tof_integral)
+        )
+
+    @lazy_property
+    def emitted_direction(self):
+        """Directions in which rays are emitted."""
+        theta = self._launch_angles
+        phi = self._phi[:, np.newaxis]
+        return self._reshape(np.stack([np.sin(theta) * np.cos(phi),
+                                       np.sin(theta) * np.sin(phi),
+                                       np.cos(theta)], axis=-1))
+
+    @lazy_property
+    def received_direction(self):
+        """Directions rays are travelling when they are received."""
+        theta0 = self._launch_angles
+        phi = self._phi[:, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            theta1 = np.arcsin(np.sin(theta0) *
+                               (self.ice.index(self._from_z) /
+                                self.ice.index(self._to_z))[:, np.newaxis])
+        # Direct rays keep their vertical direction,
+        # indirect rays are received travelling downward
+        sign = np.ones(theta0.shape)
+        sign[:, 0] = np.sign(np.cos(theta0[:, 0]))
+        sign[:, 1:] = -1
+        return self._reshape(np.stack([np.sin(theta1) * np.cos(phi),
+                                       np.sin(theta1) * np.sin(phi),
+                                       sign * np.cos(theta1)], axis=-1))
+
+    @staticmethod
+    def angle_search(true_r, r_function, min_angle, max_angle,
+                     tolerance=1e-12, max_iterations=100):
+        """Vectorized bisection root-finding algorithm. Returns nan where the
+        root is not bracketed by min_angle and max_angle."""
+        low, high, _ = np.broadcast_arrays(
+            np.array(min_angle, dtype=np.float_),
+            np.array(max_angle, dtype=np.float_),
+            true_r
+        )
+        with np.errstate(invalid='ignore'):
+            f_low = r_function(low) - true_r
+            f_high = r_function(high) - true_r
+            bracketed = np.sign(f_low)!=np.sign(f_high)
+            for _ in range(max_iterations):
+                if np.all(np.abs(high-low)[bracketed]<=tolerance):
+                    break
+                mid = (low + high) / 2
+                f_mid = r_function(mid) - true_r
+                upper_half = np.sign(f_mid)==np.sign(f_low)
+                low = np.where(upper_half, mid, low)
+                f_low = np.where(upper_half, f_mid, f_low)
+                high = np.where(upper_half, high, mid)
+        roots = np.where(f_low==0, low, (low + high) / 2)
+        return np.where(bracketed, roots, np.nan)
+
+
+class TabulatedRayTracePath(SpecializedRayTracePath):
+    """Class for storing a single ray-trace solution between points, with
+    path length, time of flight, and attenuation interpolated from a
+    RayTraceTable rather than integrated directly. Other properties are
+    calculated as in SpecializedRayTracePath."""
+    def __init__(self, parent_tracer, launch_angle, direct, path_length, tof,
+                 attenuation_integrals, frequencies):
+        super().__init__(parent_tracer, launch_angle, direct)
+        self._path_length = path_length
+        self._tof = tof
+        self._attenuation_integrals = attenuation_integrals
+        self._frequencies = frequencies
+
+    @property
+    def path_length(self):
+        """Length of the path (m)."""
+        return self._path_length
+
+    @property
+    def tof(self):
+        """Time of flight (s) along the path."""
+        return self._tof
+
+    def attenuation_integral(self, f):
+        """Returns the integral of the inverse attenuation length along the
+        path for a signal of frequency f (Hz), not including the Fresnel factor.
+        Interpolated (log-log) from the table frequencies, and clipped to the
+        values at the edges of the table frequencies.
+        Supports passing a list of frequencies."""
+        fa = np.atleast_1d(np.abs(f))
+        # Supress RuntimeWarnings when f==0 temporarily
+        with np.errstate(divide='ignore'):
+            log_f = np.log(fa)
+            log_integrals = np.log(self._attenuation_integrals)
+        return np.exp(np.interp(log_f, np.log(self._frequencies),
+                                log_integrals))
+
+
+class TabulatedRayTracer(SpecializedRayTracer):
+    """Ray tracer whose launch angles and path properties are interpolated
+    from a RayTraceTable. Should be created by calling a RayTraceTable object
+    rather than directly. Properties not stored in the table are calculated
+    as in SpecializedRayTracer."""
+    solution_class = TabulatedRayTracePath
+
+    def __init__(self, from_point, to_point, table_values, ice_model=IceModel,
+                 dz=1):
+        super().__init__(from_point, to_point, ice_model=ice_model, dz=dz)
+        self._table_values = table_values
+
+    @property
+    def expected_solutions(self):
+        """List of which types of solutions are expected to exist.
+        0: direct path, 1: indirect path > peak, 2: indirect path < peak."""
+        return [bool(exists) for exists in self._table_values['exists']]
+
+    @property
+    def direct_angle(self):
+        """Launch angle of the direct ray."""
+        return self._table_angle(0)
+
+    @property
+    def indirect_angle_1(self):
+        """Launch angle of the indirect ray (where the launch angle is greater
+        than the peak angle)."""
+        return self._table_angle(1)
+
+    @property
+    def indirect_angle_2(self):
+        """Launch angle of the indirect ray (where the launch angle is less
+        than the peak angle)."""
+        return self._table_angle(2)
+
+    def _table_angle(self, i):
+        """Launch angle of the given solution type from the table values."""
+        if self._table_values['exists'][i]:
+            return self._table_values['theta0'][i]
+        else:
+            return None
+
+    @lazy_property
+    def solutions(self):
+        """List of existing rays between the two points.
+        Should have zero or two elements."""
+        values = self._table_values
+        return [self.solution_class(self, values['theta0'][i], direct=(i==0),
+                                    path_length=values['path_length'][i],
+                                    tof=values['tof'][i],
+                                    attenuation_integrals=
+                                    values['attenuation'][i],
+                                    frequencies=values['frequencies'])
+                for i in range(3) if values['exists'][i]]
+
+
+class RayTraceTable:
+    """Class for precomputed ray-trace solutions between vertices and a set of
+    antenna depths, for use as a drop-in replacement of the ray tracer class
+    (e.g. the ray_tracer argument of EventKernel).
+    Launch angles, path lengths, times of flight, and attenuation integrals
+    (at the given frequencies) are calculated by the exact ray tracer on a grid
+    of radial distances rhos (m) and vertex depths (m) for each antenna depth.
+    Calling the table with from_point (vertex) and to_point (antenna) returns
+    a TabulatedRayTracer whose values are bilinearly interpolated from the
+    grid. During building, the interpolation is checked against the exact
+    ray tracer at the center of each grid cell. Cells where the solution types
+    change, or where any launch angle (radians), relative path length or time
+    of flight, or attenuation factor differs by more than the given accuracy,
+    are marked as invalid. Points in invalid cells, outside of the grid, or not
+    at one of the antenna depths are traced with the exact ray tracer."""
+    def __init__(self, antenna_depths, rhos, depths, ice_model=IceModel, dz=1,
+                 frequencies=np.logspace(6, 11, 51), accuracy=1e-3,
+                 exact_tracer=SpecializedRayTracer, build=True):
+        self.antenna_depths = np.array(antenna_depths, dtype=np.float_)
+        self.rhos = np.array(rhos, dtype=np.float_)
+        self.depths = np.array(depths, dtype=np.float_)
+        self.ice = ice_model
+        self.dz = dz
+        self.frequencies = np.array(frequencies, dtype=np.float_)
+        self.accuracy = accuracy
+        self.exact_tracer = exact_tracer
+        if len(self.rhos)<2 or len(self.depths)<2:
+            raise ValueError("Table requires at least two rho and depth values")
+        if np.any(np.diff(self.rhos)<=0) or np.any(np.diff(self.depths)<=0):
+            raise ValueError("Table rhos and depths must be strictly increasing")
+        if build:
+            self.build()
+
+    def __call__(self, from_point, to_point, ice_model=None, dz=None):
+        """Returns a ray tracer between the given points, either from the
+        table or from the exact ray tracer if the table can't be used."""
+        if ice_model is not None and ice_model is not self.ice:
+            raise ValueError("Ice model does not match the ice model of "+
+                             "the ray trace table")
+        values = self.lookup(from_point, to_point)
+        if values is None:
+            return self.exact_tracer(from_point, to_point,
+                                     ice_model=self.ice, dz=self.dz)
+        return TabulatedRayTracer(from_point, to_point, values,
+                                  ice_model=self.ice, dz=self.dz)
+
+    def _solve(self, rho, z0, z1):
+        """Calculates the table values with the exact ray tracer for a launch
+        point at depth z0 and receiving point at depth z1, separated by radial
+        distance rho."""
+        theta0 = np.full(3, np.nan)
+        path_length = np.full(3, np.nan)
+        tof = np.full(3, np.nan)
+        attenuation = np.full((3, len(self.frequencies)), np.nan)
+        exists = np.zeros(3, dtype=np.bool_)
+        rt = self.exact_tracer([0, 0, z0], [rho, 0, z1],
+                               ice_model=self.ice, dz=self.dz)
+        angles = [rt.direct_angle, rt.indirect_angle_1, rt.indirect_angle_2]
+        for i, angle in enumerate(angles):
+            if not rt.expected_solutions[i] or angle is None:
+                continue
+            path = rt.solution_class(rt, angle, direct=(i==0))
+            theta0[i] = angle
+            path_length[i] = path.path_length
+            tof[i] = path.tof
+            attenuation[i] = path.attenuation_integral(self.frequencies)
+            exists[i] = True
+        return theta0, path_length, tof, attenuation, exists
+
+    def build(self):
+        """Calculates the table values on the grid with the exact ray tracer
+        and checks the interpolation accuracy of each grid cell."""
+        shape = (len(self.antenna_depths), len(self.rhos), len(self.depths), 3)
+        self.theta0 = np.full(shape, np.nan)
+        self.path_length = np.full(shape, np.nan)
+        self.tof = np.full(shape, np.nan)
+        self.attenuation = np.full(shape+(len(self.frequencies),), np.nan)
+        self.exists = np.zeros(shape, dtype=np.bool_)
+        for i, z1 in enumerate(self.antenna_depths):
+            for j, rho in enumerate(self.rhos):
+                for k, z0 in enumerate(self.depths):
+                    (self.theta0[i,j,k], self.path_length[i,j,k],
+                     self.tof[i,j,k], self.attenuation[i,j,k],
+                     self.exists[i,j,k]) = self._solve(rho, z0, z1)
+
+        self.valid = np.zeros(shape[:1]+(shape[1]-1, shape[2]-1),
+                              dtype=np.bool_)
+        rho_centers = (self.rhos[:-1] + self.rhos[1:]) / 2
+        depth_centers = (self.depths[:-1] + self.depths[1:]) / 2
+        for i, z1 in enumerate(self.antenna_depths):
+            for j, rho in enumerate(rho_centers):
+                for k, z0 in enumerate(depth_centers):
+                    self.valid[i,j,k] = self._check_cell(i, j, k, rho, z0, z1)
+        logger.debug("%i of %i ray trace table cells valid",
+                     np.sum(self.valid), self.valid.size)
+
+    def _check_cell(self, i, j, k, rho, z0, z1):
+        """Tests whether interpolated values in a grid cell match the exact
+        ray tracer values to within the table accuracy."""
+        corners = self.exists[i, j:j+2, k:k+2]
+        if not np.all(corners==corners[0,0]):
+            return False
+        interpolated = self._interpolate(i, j, k, 0.5, 0.5)
+        theta0, path_length, tof, attenuation, exists = self._solve(rho, z0, z1)
+        if not np.array_equal(exists, interpolated['exists']):
+            return False
+        if not np.any(exists):
+            return True
+        with np.errstate(divide='ignore', invalid='ignore'):
+            errors = [
+                np.abs(interpolated['theta0']-theta0),
+                np.abs(interpolated['path_length']/path_length-1),
+                np.abs(interpolated['tof']/tof-1),
+                np.abs(np.exp(-interpolated['attenuation'])
+                       -np.exp(-attenuation)),
+            ]
+        return all(np.all(error[exists]<=self.accuracy) for error in errors)
+
+    def _interpolate(self, i, j, k, u, v):
+        """Bilinearly interpolates table values for antenna depth index i in
+        the grid cell with lower indices j (rho) and k (depth) at fractional
+        positions u (rho) and v (depth) in the cell."""
+        weights = np.array([[(1-u)*(1-v), (1-u)*v],
+                            [u*(1-v),     u*v]])
+        def interp(array):
+            corners = array[i, j:j+2, k:k+2]
+            return np.tensordot(weights, corners, axes=([0,1], [0,1]))
+        return {
+            'theta0': interp(self.theta0),
+            'path_length': interp(self.path_length),
+            'tof': interp(self.tof),
+            'attenuation': interp(self.attenuation),
+            'exists': self.exists[i, j, k],
+            'frequencies': self.frequencies,
+        }
+
+    def lookup(self, from_point, to_point):
+        """Returns a dictionary of interpolated table values between the given
+        points, or None if the points can't be interpolated from the table."""
+        if from_point[2]>0 or to_point[2]>0:
+            return None
+        depth_matches = np.isclose(self.antenna_depths, to_point[2])
+        if not np.any(depth_matches):
+            return None
+        i = np.argmax(depth_matches)
+        rho = np.sqrt((to_point[0]-from_point[0])**2 +
+                      (to_point[1]-from_point[1])**2)
+        z0 = from_point[2]
+        j = self._cell_index(self.rhos, rho)
+        k = self._cell_index(self.depths, z0)
+        if j is None or k is None or not self.valid[i, j, k]:
+            return None
+        u = (rho - self.rhos[j]) / (self.rhos[j+1] - self.rhos[j])
+        v = (z0 - self.depths[k]) / (self.depths[k+1] - self.depths[k])
+        return self._interpolate(i, j, k, u, v)
+
+    @staticmethod
+    def _cell_index(grid, value):
+        """Returns the index of the grid cell containing the value, or None if
+        the value is outside of the grid."""
+        if value<grid[0] or value>grid[-1]:
+            return None
+        return min(np.searchsorted(grid, value, side='right')-1, len(grid)-2)
+
+    def save(self, filename):
+        """Saves the table to the given .npz file."""
+        np.savez(filename, antenna_depths=self.antenna_depths,
+                 rhos=self.rhos, depths=self.depths,
+                 frequencies=self.frequencies, theta0=self.theta0,
+                 path_length=self.path_length, tof=self.tof,
+                 attenuation=self.attenuation, exists=self.exists,
+                 valid=self.valid, dz=self.dz, accuracy=self.accuracy,
+                 ice_parameters=self._ice_parameters(self.ice))
+
+    @classmethod
+    def load(cls, filename, ice_model=IceModel,
+             exact_tracer=SpecializedRayTracer):
+        """Loads a table from the given .npz file. The ice model must match
+        the ice model used to generate the table."""
+        with np.load(filename) as data:
+            if not np.allclose(data['ice_parameters'],
+                               cls._ice_parameters(ice_model)):
+                raise ValueError("Ice model does not match the ice model "+
+                                 "used to generate the ray trace table")
+            table = cls(antenna_depths=data['antenna_depths'],
+                        rhos=data['rhos'], depths=data['depths'],
+                        ice_model=ice_model, dz=float(data['dz']),
+                        frequencies=data['frequencies'],
+                        accuracy=float(data['accuracy']),
+                        exact_tracer=exact_tracer, build=False)
+            for key in ['theta0', 'path_length', 'tof', 'attenuation',
+                        'exists', 'valid']:
+                setattr(table, key, data[key])
+        return table
+
+    @staticmethod
+    def _ice_parameters(ice_model):
+        """Index of refraction parameters identifying the ice model."""
+        return np.array([ice_model.n0, ice_model.k, ice_model.a])
+
+
+
+class RayTracerCache:
+    """Bounded least-recently-used cache of ray tracers, for use as a drop-in
+    replacement of the ray tracer class (e.g. the ray_tracer argument of
+    EventKernel). Ray tracers are keyed on the radial distance between the
+    points, the depths of the points, the ice model, and dz, with distances
+    quantized by the given tolerance (m). When a ray tracer is requested for
+    points matching a cached key, a new ray tracer is created between the
+    requested points and given the launch angles and path properties already
+    calculated by the cached ray tracer. Keeps track of cache hits and misses.
+    """
+    # Lazy properties of ray tracers and paths which only depend on the
+    # quantities in the cache key
+    tracer_properties = ['valid_ice_model', 'z_uniform', 'n0', 'max_angle',
+                         'peak_angle', 'direct_r_max', 'indirect_r_max',
+                         'expected_solutions', 'direct_angle',
+                         'indirect_angle_1', 'indirect_angle_2']
+    path_properties = ['valid_ice_model', 'z_uniform', 'n0', 'beta', 'z_turn',
+                       'path_length', 'tof', 'fresnel', '_attenuation_cache',
+                       '_basis_attenuation_integrals']
+
+    def __init__(self, ray_tracer=RayTracer, max_size=1024, tolerance=0.01):
+        self.ray_tracer = ray_tracer
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Removes all cached ray tracers and resets the cache statistics."""
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """Fraction of ray tracer requests which were found in the cache."""
+        total = self.hits + self.misses
+        if total==0:
+            return 0
+        return self.hits / total
+
+    def key(self, from_point, to_point, ice_model, dz):
+        """Returns the cache key for a ray tracer between the given points."""
+        rho = np.sqrt((to_point[0]-from_point[0])**2 +
+                      (to_point[1]-from_point[1])**2)
+        return (int(np.round(rho/self.tolerance)),
+                int(np.round(from_point[2]/self.tolerance)),
+                int(np.round(to_point[2]/self.tolerance)),
+                ice_model, dz)
+
+    def __call__(self, from_point, to_point, ice_model=IceModel, dz=1):
+        """Returns a ray tracer between the given points, using cached
+        calculations where possible."""
+        key = self.key(from_point, to_point, ice_model, dz)
+        tracer = self.ray_tracer(from_point, to_point,
+                                 ice_model=ice_model, dz=dz)
+        if key not in self._cache:
+            self.misses += 1
+            self._cache[key] = tracer
+            if len(self._cache)>self.max_size:
+                self._cache.popitem(last=False)
+            return tracer
+
+        self.hits += 1
+        self._cache.move_to_end(key)
+        cached = self._cache[key]
+        self._copy_lazy_properties(cached, tracer, self.tracer_properties)
+        if "_lazy_solutions" in cached.__dict__:
+            for cached_path, path in zip(cached.solutions, tracer.solutions):
+                self._copy_lazy_properties(cached_path, path,
+                                           self.path_properties)
+        # Replace the cached ray tracer so that any properties calculated
+        # later by the new ray tracer are also available to the cache
+        self._cache[key] = tracer
+        return tracer
+
+    @staticmethod
+    def _copy_lazy_properties(source, destination, properties):
+        """Copies the already-calculated lazy properties of the source object
+        to the destination object."""
+        for prop in properties:
+            attr_name = '_lazy_' + prop
+            if attr_name in source.__dict__:
+                setattr(destination, attr_name, source.__dict__[attr_name])
+
+
+
+class UnreachableRayTracer:
+    """Class for ray tracers between points which are already known to have
+    no ray paths between them (e.g. those returned by ShadowZoneTable for
+    points in each other's shadow zone), so no root finding is needed."""
+    def __init__(self, from_point, to_point, ice_model=IceModel, dz=1):
+        self.from_point = np.array(from_point)
+        self.to_point = np.array(to_point)
+        self.ice = ice_model
+        self.dz = dz
+
+    @property
+    def exists(self):
+        """Boolean of whether any paths exist between the points."""
+        return False
+
+    @property
+    def expected_solutions(self):
+        """List of which types of solutions are expected to exist.
+        0: direct path, 1: indirect path > peak, 2: indirect path < peak."""
+        return [False, False, False]
+
+    @property
+    def solutions(self):
+        """Ray paths between the points, of which there are none."""
+        return []
+
+
+class ShadowZoneTable:
+    """Class for quickly screening out pairs of points between which no ray
+    paths can exist (e.g. vertices in the shadow zone of an antenna), for use
+    as a drop-in replacement of the ray tracer class (e.g. the ray_tracer
+    argument of EventKernel). For each antenna depth, the maximum radial
+    distance reachable by ray paths is calculated by a BatchRayTracer at
+    oversample points in each cell of the grid of vertex depths. The largest
+    value in each cell, increased by the relative tolerance, is stored as the
+    shadow zone boundary of that cell. Calling the table with points farther
+    apart than the boundary returns an UnreachableRayTracer, skipping any root
+    finding. All other points (including those outside of the grid or not at
+    one of the antenna depths) are passed to the given ray_tracer."""
+    def __init__(self, antenna_depths, depths, ice_model=IceModel,
+                 ray_tracer=RayTracer, tolerance=0.01, oversample=4):
+        self.antenna_depths = np.array(antenna_depths, dtype=np.float_)
+        self.depths = np.array(depths, dtype=np.float_)
+        self.ice = ice_model
+        self.ray_tracer = ray_tracer
+        self.tolerance = tolerance
+        self.oversample = oversample
+        if len(self.depths)<2 or np.any(np.diff(self.depths)<=0):
+            raise ValueError("Table depths must be strictly increasing")
+        self.build()
+
+    def build(self):
+        """Calculates the shadow zone boundaries for each antenna depth."""
+        # Depths at oversample points in each cell, sharing cell edges
+        fractions = np.linspace(0, 1, self.oversample+1)
+        cell_depths = (self.depths[:-1, np.newaxis] +
+                       np.diff(self.depths)[:, np.newaxis] * fractions)
+        launch_points = np.zeros((cell_depths.size, 3))
+        launch_points[:, 2] = cell_depths.ravel()
+        antenna_points = np.zeros((len(self.antenna_depths), 3))
+        antenna_points[:, 2] = self.antenna_depths
+        tracer = BatchRayTracer(launch_points, antenna_points,
+                                ice_model=self.ice)
+        with np.errstate(invalid='ignore'):
+            max_rho = np.fmax(tracer.direct_r_max, tracer.indirect_r_max)
+        # Any failed calculations shouldn't reject points
+        max_rho[np.isnan(max_rho)] = np.inf
+        max_rho = np.reshape(max_rho.T, (len(self.antenna_depths),)+
+                             cell_depths.shape)
+        self.max_rho = np.max(max_rho, axis=2) * (1 + self.tolerance)
+
+    def max_distance(self, from_point, to_point):
+        """Returns the maximum radial distance at which ray paths could exist
+        between the given points, or infinity if it is not known."""
+        depth_matches = np.isclose(self.antenna_depths, to_point[2])
+        z0 = from_point[2]
+        if (not np.any(depth_matches) or z0<self.depths[0]
+                or z0>self.depths[-1]):
+            return np.inf
+        i = np.argmax(depth_matches)
+        j = min(np.searchsorted(self.depths, z0, side='right')-1,
+                len(self.depths)-2)
+        return self.max_rho[i, j]
+
+    def reachable(self, from_point, to_point):
+        """Returns whether ray paths could exist between the given points."""
+        rho = np.sqrt((to_point[0]-from_point[0])**2 +
+                      (to_point[1]-from_point[1])**2)
+        return rho<=self.max_distance(from_point, to_point)
+
+    def __call__(self, from_point, to_point, ice_model=None, dz=1):
+        """Returns a ray tracer between the given points, which is an
+        UnreachableRayTracer if the points are in each other's shadow zone."""
+        if ice_model is not None and ice_model is not self.ice:
+            raise ValueError("Ice model does not match the ice model of "+
+                             "the shadow zone table")
+        if not self.reachable(from_point, to_point):
+            return UnreachableRayTracer(from_point, to_point,
+                                        ice_model=self.ice, dz=dz)
+        return self.ray_tracer(from_point, to_point,
+                               ice_model=self.ice, dz=dz)
+
+
+
 class PathFinder:
     """Class for pseudo ray tracing. Just uses straight-line paths."""
     def __init__(self, ice_model, from_point, to_point):
@@ -928,7 +1824,7 @@ class PathFinder:
             raise RuntimeError("Cannot propagate signal along a path that "+
                                "doesn't exist")
         signal.filter_frequencies(self.attenuation)
-        signal.times += self.tof
+        signal.times = signal.times + self.tof
 
 
 class ReflectedPathFinder:
@@ -2,6 +2,8 @@
 
 from enum import Enum
 import logging
+import os.path
+import zlib
 import numpy as np
 import scipy.signal
 import scipy.fftpack
@@ -9,6 +11,23 @@ import scipy.fftpack
 logger = logging.getLogger(__name__)
 
 
+def _even_spacing(ts):
+    """Returns the spacing of the given times if they are evenly spaced
+    (up to rounding errors), otherwise None."""
+    ts = np.asarray(ts)
+    if ts.ndim!=1 or len(ts)<2:
+        return None
+    dt = (ts[-1] - ts[0]) / (len(ts)-1)
+    if not dt>0:
+        return None
+    deviations = np.arange(len(ts)) * dt
+    deviations += ts[0]
+    deviations -= ts
+    if max(deviations.max(), -deviations.min())>1e-6*dt:
+        return None
+    return dt
+
+
 class Signal:
     """Base class for signals. Takes arrays of times and values
     (values array forced to size of times array by zero padding or slicing).
@@ -21,6 +40,9 @@ class Signal:
         field = 2
         power = 3
 
+    # Number of taps of the fractional delay filter used by with_times
+    delay_filter_taps = 16
+
     def __init__(self, times, values, value_type=ValueTypes.undefined):
         self.times = np.array(times)
         len_diff = len(times)-len(values)
@@ -59,6 +81,37 @@ class Signal:
 
         return self
 
+    def __mul__(self, other):
+        """Returns a copy of the signal with values scaled by a number."""
+        if isinstance(other, Signal):
+            return NotImplemented
+        copy = self.copy()
+        copy *= other
+        return copy
+
+    def __rmul__(self, other):
+        """Allows for scaling a signal from the left."""
+        return self.__mul__(other)
+
+    def __imul__(self, other):
+        """Scales the signal values by a number in place."""
+        if isinstance(other, Signal):
+            return NotImplemented
+        self.values = self.values * other
+        return self
+
+    def __truediv__(self, other):
+        """Returns a copy of the signal with values divided by a number."""
+        return self.__mul__(1/other)
+
+    def __itruediv__(self, other):
+        """Divides the signal values by a number in place."""
+        return self.__imul__(1/other)
+
+    def copy(self):
+        """Returns a copy of the signal."""
+        return Signal(self.times, self.values, value_type=self.value_type)
+
     @property
     def dt(self):
         """Returns the spacing of the time array, or None if invalid."""
@@ -83,11 +136,65 @@ class Signal:
 
     def with_times(self, new_times):
         """Returns a signal object representing this signal with a different
-        times array. Uses numpy.iterp on values by default."""
-        new_values = np.interp(new_times, self.times, self.values,
-                               left=0, right=0)
+        times array. Uses numpy.iterp on values by default. If both times
+        arrays are evenly spaced with the same spacing, the values are
+        instead shifted directly for shifts of a whole number of samples,
+        or shifted by a fractional delay filter otherwise."""
+        shift = self._sample_shift(new_times)
+        if shift is None:
+            new_values = np.interp(new_times, self.times, self.values,
+                                   left=0, right=0)
+        else:
+            new_values = self._shifted_values(shift, len(new_times))
         return Signal(new_times, new_values, value_type=self.value_type)
 
+    def _sample_shift(self, new_times):
+        """Returns the number of samples by which the given times are
+        shifted from the signal's times, if both are evenly spaced with the
+        same spacing. Otherwise returns None."""
+        new_dt = _even_spacing(new_times)
+        if new_dt is None:
+            return None
+        dt = self.dt if isinstance(self, UniformSignal) else _even_spacing(
+            self.times)
+        # Spacings must match well enough that the samples stay aligned
+        # over the length of either array
+        if (dt is None or
+                np.abs(new_dt-dt)*max(len(new_times), len(self.times)) >
+                1e-6*dt):
+            return None
+        return (new_times[0] - self.times[0]) / dt
+
+    def _shifted_values(self, shift, n):
+        """Returns n values of the signal starting the given (possibly
+        fractional) number of samples after the first time, with zeros
+        outside of the signal's times."""
+        values = np.asarray(self.values)
+        new_values = np.zeros(n)
+        whole = int(np.round(shift))
+        if np.abs(shift-whole)<1e-6:
+            start = max(0, -whole)
+            stop = min(n, len(values)-whole)
+            if stop>start:
+                new_values[start:stop] = values[start+whole:stop+whole]
+            return new_values
+
+        # Lanczos-windowed sinc fractional delay filter, where new value j is
+        # the sum over taps i of values[j+whole+i] * taps[i]
+        whole = int(np.floor(shift))
+        half_width = self.delay_filter_taps//2
+        offsets = shift - whole - np.arange(1-half_width, half_width+1)
+        taps = np.sinc(offsets) * np.sinc(offsets/half_width)
+        taps /= np.sum(taps)
+        filtered = np.convolve(values, taps[::-1])
+        # Zero values outside of the signal's times, as numpy.interp does
+        start = max(0, int(np.ceil(-shift)))
+        stop = min(n, int(np.floor(len(values)-1-shift))+1)
+        if stop>start:
+            new_values[start:stop] = filtered[start+whole+half_width:
+                                              stop+whole+half_width]
+        return new_values
+
 
     @property
     def spectrum(self):
@@ -105,46 +212,217 @@ class Signal:
         only specified in positive frequencies."""
         # Zero-pad the signal so the filter doesn't cause the resulting
         # signal to wrap around the end of the time array
-        vals = np.concatenate((self.values, np.zeros(len(self.values))))
-        spectrum = scipy.fftpack.fft(vals)
-        freqs = scipy.fftpack.fftfreq(n=2*len(self.values), d=self.dt)
-        if force_real:
-            true_freqs = np.array(freqs)
-            freqs = np.abs(freqs)
+        spectrum = _padded_spectrum(self.values)
+        responses, imag_responses = self._frequency_response(freq_response,
+                                                             force_real)
+
+        # Part of the signal which would be imaginary after filtering
+        if imag_responses is not None:
+            imag_vals = np.fft.irfft(-1j*imag_responses*spectrum,
+                                     2*len(self.times))[:len(self.times)]
+
+        spectrum *= responses
+        self.values = np.fft.irfft(spectrum, 2*len(self.times))[:len(self.times)]
+
+        # Issue a warning if there was significant signal in the (discarded)
+        # imaginary part of the filtered values
+        if (imag_responses is not None and
+                np.any(imag_vals > np.max(self.values) * 1e-5)):
+            msg = ("Significant signal amplitude was lost when forcing the "+
+                   "signal values to be real after applying the frequency "+
+                   "filter '%s'. This may be avoided by making sure the "+
+                   "filter being used is properly defined for negative "+
+                   "frequencies, or by passing force_real=True to the "+
+                   "Signal.filter_frequencies function.")
+            logger.warning(msg, freq_response.__name__)
+
+    def _frequency_response(self, freq_response, force_real=False):
+        """Evaluates the given frequency response function at the real FFT
+        frequencies of the zero-padded signal. Returns the response applied to
+        the (real) filtered signal and the response which would instead only
+        produce an imaginary filtered signal (None if there is none).
+        If force_real is True, the positive frequency response is mirrored
+        into the negative frequencies, making the real part even and the
+        imaginary part odd, so the filtered signal is entirely real."""
+        freqs = _padded_frequencies(2*len(self.times), self.dt)
+        if not force_real:
+            freqs = np.concatenate((freqs, -freqs))
+            # Nyquist frequency is treated as negative (as in fftfreq)
+            freqs[len(freqs)//2-1] *= -1
 
         # Attempt to evaluate all responses in one function call
         try:
             responses = np.array(freq_response(freqs), dtype=np.complex_)
+            if responses.shape!=freqs.shape:
+                responses = np.array(np.broadcast_to(responses, freqs.shape))
         # Otherwise evaluate responses one at a time
         except (TypeError, ValueError):
             logger.debug("Frequency response function %r could not be "+
                          "evaluated for multiple frequencies at once",
                          freq_response)
-            responses = np.zeros(len(spectrum), dtype=np.complex_)
+            responses = np.zeros(len(freqs), dtype=np.complex_)
             for i, f in enumerate(freqs):
                 responses[i] = freq_response(f)
 
-        # To make the filtered signal real, mirror the positive frequency
-        # response into the negative frequencies, making the real part even
-        # (done above) and the imaginary part odd (below)
         if force_real:
-            responses.imag[true_freqs<0] *= -1
+            return responses, None
+
+        # Split the response into the parts which are symmetric and
+        # antisymmetric under mirroring into the negative frequencies
+        # (conjugating), which give the real and imaginary parts of the
+        # filtered signal respectively
+        positive = responses[:len(responses)//2]
+        mirrored = np.conj(responses[len(responses)//2:])
+        if np.array_equal(positive, mirrored):
+            return positive, None
+        return (positive + mirrored) / 2, (positive - mirrored) / 2
+
+
+
+class UniformSignal(Signal):
+    """Class for signals with evenly spaced times. The times are stored as a
+    read-only array which is shared (rather than copied) by copies of the
+    signal and sums with other signals, so they can't be modified in place
+    (e.g. shift the times with "signal.times = signal.times + offset").
+    Values are stored with the given dtype (by default the default_dtype
+    class attribute), so float32 may be used to halve their memory."""
+    default_dtype = np.float64
+
+    def __init__(self, times, values, value_type=Signal.ValueTypes.undefined,
+                 dtype=None):
+        self.dtype = self.default_dtype if dtype is None else dtype
+        # Times are set directly (rather than by Signal.__init__, which
+        # copies them) so that read-only times arrays can be shared
+        self.times = times
+        len_diff = len(self._times)-len(values)
+        if len_diff>0:
+            self.values = np.concatenate((values, np.zeros(len_diff)))
+        else:
+            self.values = np.array(values[:len(self._times)])
+        self.value_type = value_type
+
+    @property
+    def times(self):
+        """Times of the signal (read-only)."""
+        return self._times
+
+    @times.setter
+    def times(self, times):
+        # Read-only times arrays (i.e. those of other uniform signals) are
+        # shared rather than copied
+        if not (isinstance(times, np.ndarray) and times.dtype==np.float_ and
+                not times.flags.writeable):
+            times = np.array(times, dtype=np.float_)
+            times.flags.writeable = False
+        dt = _even_spacing(times)
+        if dt is None and len(times)>1:
+            raise ValueError("Times of a UniformSignal must be evenly spaced")
+        self._times = times
+        self._dt = dt
 
-        filtered_vals = scipy.fftpack.ifft(responses*spectrum)
-        self.values = np.real(filtered_vals[:len(self.times)])
+    @property
+    def dt(self):
+        """Returns the spacing of the time array, or None if invalid."""
+        return self._dt
 
-        # Issue a warning if there was significant signal in the (discarded)
-        # imaginary part of the filtered values
-        if np.any(np.imag(filtered_vals[:len(self.times)]) >
-                  np.max(self.values) * 1e-5):
-            msg = ("Significant signal amplitude was lost when forcing the "+
-                   "signal values to be real after applying the frequency "+
-                   "filter '%s'. This may be avoided by making sure the "+
-                   "filter being used is properly defined for negative "+
-                   "frequencies, or by passing force_real=True to the "+
-                   "Signal.filter_frequencies function.")
+    def __setstate__(self, state):
+        """Restores the signal from a pickled state, keeping the times
+        read-only."""
+        self.__dict__.update(state)
+        self._times.flags.writeable = False
+
+    @property
+    def values(self):
+        """Values of the signal."""
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = np.asarray(values, dtype=self.dtype)
+
+    def __add__(self, other):
+        """Adds two signals by adding their values at each time."""
+        total = super().__add__(other)
+        return UniformSignal(self._times, total.values,
+                             value_type=total.value_type, dtype=self.dtype)
+
+    def copy(self):
+        """Returns a copy of the signal."""
+        return UniformSignal(self._times, self.values,
+                             value_type=self.value_type, dtype=self.dtype)
+
+
+class SpectralSignal(UniformSignal):
+    """Class for signals which apply frequency filters lazily. The frequency
+    responses of filters are accumulated on the (zero-padded) spectrum of the
+    signal, which is only transformed back to the time domain when the values
+    are needed, so any number of filters costs a single pair of FFTs.
+    Since the signal is not truncated between filters, the result may differ
+    very slightly from applying each filter to a Signal in turn.
+    Times and values are stored as in UniformSignal."""
+    def __init__(self, times, values, value_type=Signal.ValueTypes.undefined,
+                 dtype=None):
+        super().__init__(times, values, value_type=value_type, dtype=dtype)
+
+    @property
+    def values(self):
+        """Values of the signal, with any pending filters applied."""
+        if self._responses is not None:
+            self._apply_filters()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        UniformSignal.values.fset(self, values)
+        self._responses = None
+
+    def _apply_filters(self):
+        """Applies the accumulated frequency responses to the values."""
+        n = len(self._values)
+        spectrum = _padded_spectrum(self._values)
+        spectrum *= self._responses
+        self.values = np.fft.irfft(spectrum, 2*n)[:n]
+
+    def filter_frequencies(self, freq_response, force_real=False):
+        """Applies the given frequency response function to the signal (once
+        the values are needed). Optionally can attempt to force real results
+        manually if the filter is only specified in positive frequencies."""
+        responses, imag_responses = self._frequency_response(freq_response,
+                                                             force_real)
+        # Issue a warning if the filter would produce a significant imaginary
+        # signal, which is discarded. The Nyquist frequency is skipped since
+        # it is shared by the positive and negative frequencies
+        if (imag_responses is not None and
+                np.max(np.abs(imag_responses[:-1])) >
+                np.max(np.abs(responses)) * 1e-5):
+            msg = ("Significant signal amplitude will be lost when forcing "+
+                   "the signal values to be real after applying the "+
+                   "frequency filter '%s'. This may be avoided by making "+
+                   "sure the filter being used is properly defined for "+
+                   "negative frequencies, or by passing force_real=True to "+
+                   "the SpectralSignal.filter_frequencies function.")
             logger.warning(msg, freq_response.__name__)
 
+        if self._responses is None:
+            self._responses = responses
+        else:
+            self._responses *= responses
+
+    def __imul__(self, other):
+        """Scales the signal values by a number, without applying any pending
+        filters."""
+        if self._responses is None or isinstance(other, Signal):
+            return super().__imul__(other)
+        self._responses *= other
+        return self
+
+    def copy(self):
+        """Returns a copy of the signal, including any pending filters."""
+        copy = SpectralSignal(self._times, self._values,
+                              value_type=self.value_type, dtype=self.dtype)
+        if self._responses is not None:
+            copy._responses = np.array(self._responses)
+        return copy
 
 
 class EmptySignal(Signal):
@@ -163,23 +441,114 @@ class FunctionSignal(Signal):
     def __init__(self, times, function, value_type=Signal.ValueTypes.undefined):
         self.times = np.array(times)
         self.function = function
-        # Attempt to evaluate all values in one function call
-        try:
-            values = self.function(self.times)
-        # Otherwise evaluate values one at a time
-        except (ValueError, TypeError):
-            values = []
-            for t in self.times:
-                values.append(self.function(t))
-
+        values = self._evaluate(self.times)
         super().__init__(times, values, value_type=value_type)
+        self._pristine = True
+
+    @property
+    def values(self):
+        """Values of the signal. Assigning to the values (including by
+        in-place arithmetic or filtering) marks them as no longer given by
+        the function."""
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._pristine = False
 
     def with_times(self, new_times):
         """Returns a signal object representing this signal with a different
         times array. Leverages knowledge of the function to properly
-        interpolate and extrapolate."""
-        return FunctionSignal(new_times, self.function,
-                              value_type=self.value_type)
+        interpolate and extrapolate. If the new times are shifted by a whole
+        number of samples and the values haven't been modified, values at the
+        times shared with this signal are reused rather than evaluated
+        again."""
+        shift = self._sample_shift(new_times)
+        if (not self._pristine or shift is None or
+                np.abs(shift-np.round(shift))>=1e-6):
+            return FunctionSignal(new_times, self.function,
+                                  value_type=self.value_type)
+
+        new_times = np.array(new_times)
+        whole = int(np.round(shift))
+        shared = np.zeros(len(new_times), dtype=np.bool_)
+        shared[max(0, -whole):max(0, len(self.values)-whole)] = True
+        new_values = self._shifted_values(whole, len(new_times))
+        if not np.all(shared):
+            # Evaluate the function separately on each side of the shared
+            # times so that each block of times is evenly spaced
+            start = np.argmax(shared) if np.any(shared) else len(new_times)
+            stop = start + np.sum(shared)
+            for block in (slice(0, start), slice(stop, len(new_times))):
+                if block.stop>block.start:
+                    new_values[block] = self._evaluate(new_times[block])
+
+        signal = FunctionSignal.__new__(FunctionSignal)
+        signal.function = self.function
+        Signal.__init__(signal, new_times, new_values,
+                        value_type=self.value_type)
+        signal._pristine = True
+        return signal
+
+    def _evaluate(self, times):
+        """Evaluates the function at the given times."""
+        # Attempt to evaluate all values in one function call
+        try:
+            return self.function(times)
+        # Otherwise evaluate values one at a time
+        except (ValueError, TypeError):
+            return [self.function(t) for t in times]
+
+
+
+# Zero-padded work buffers for filtering, keyed by length
+_filter_buffers = {}
+# Real FFT frequencies of zero-padded signals, keyed by length and spacing
+_filter_frequencies = {}
+
+def _padded_spectrum(values):
+    """Returns the real FFT spectrum of the values zero-padded to twice their
+    length. The zero-padded buffer is kept and reused for later spectra of the
+    same length."""
+    n = 2*len(values)
+    if n not in _filter_buffers:
+        _filter_buffers[n] = np.zeros(n)
+    buffer = _filter_buffers[n]
+    buffer[:len(values)] = values
+    return np.fft.rfft(buffer)
+
+def _padded_frequencies(n, dt):
+    """Returns the real FFT frequencies of a signal of length n with spacing
+    dt. The (read-only) frequency array is kept and reused for later signals
+    with the same length and spacing."""
+    key = (n, dt)
+    if key not in _filter_frequencies:
+        freqs = np.fft.rfftfreq(n, dt)
+        freqs.flags.writeable = False
+        _filter_frequencies[key] = freqs
+    return _filter_frequencies[key]
+
+
+# Zero-padded work buffers for _fft_convolve, keyed by length
+_convolution_buffers = {}
+
+def _fft_convolve(a, b):
+    """Returns the full discrete linear convolution of arrays a and b,
+    calculated by FFT. The zero-padded input buffers are kept and reused for
+    later convolutions with the same padded length."""
+    n = len(a) + len(b) - 1
+    n_fft = scipy.fftpack.next_fast_len(n)
+    if n_fft not in _convolution_buffers:
+        _convolution_buffers[n_fft] = np.zeros(n_fft)
+    buffer = _convolution_buffers[n_fft]
+    buffer[:len(a)] = a
+    buffer[len(a):] = 0
+    spectrum = np.fft.rfft(buffer)
+    buffer[:len(b)] = b
+    buffer[len(b):] = 0
+    spectrum *= np.fft.rfft(buffer)
+    return np.fft.irfft(spectrum, n_fft)[:n]
 
 
 
@@ -291,8 +660,25 @@ class FastAskaryanSignal(Signal):
     to start time t0 (s). Returned signal values are electric fields (V/m).\n
     Note that the amplitude of the pulse goes as 1/R, where R is the distance
     from source to observer. R is assumed to be 1 meter so that dividing by a
-    different value produces the proper result."""
-    def __init__(self, times, energy, theta, n=1.78, t0=0):
+    different value produces the proper result.\n
+    The mode may be "exact" to calculate the pulse directly, or "template"
+    to interpolate it from an AskaryanTemplateBank for the given times (which
+    is built on first use, and cached in template_cache_dir if set). Pulses
+    outside of the template bank are calculated exactly. By default the mode
+    is given by the default_mode class attribute."""
+    default_mode = "exact"
+    # Directory in which template banks are cached (None for no caching)
+    template_cache_dir = None
+    # Template banks used in template mode, keyed by their times_key
+    template_banks = {}
+    # Method for convolving the charge profile with RAC: "auto", "direct",
+    # or "fft" (which reuses work buffers between pulses)
+    convolution_method = "auto"
+    # Magnitude of the spectrum of RAC for unit energy, used in the spectrum
+    # bound (calculated on first use)
+    _RAC_spectrum = None
+
+    def __init__(self, times, energy, theta, n=1.78, t0=0, mode=None):
         # Calculation of pulse based on https://arxiv.org/pdf/1106.6283v3.pdf
         # Vector potential is given by:
         #   A(theta,t) = convolution(Q(z(1-n*cos(theta))/c)),
@@ -309,6 +695,37 @@ class FastAskaryanSignal(Signal):
 
         self.energy = energy
 
+        if mode is None:
+            mode = self.default_mode
+        if mode=="template":
+            values = self.template_bank(times, t0)(energy, theta, n)
+            if values is not None:
+                super().__init__(times, values,
+                                 value_type=self.ValueTypes.field)
+                return
+            logger.debug("Pulse outside of template bank; calculating "+
+                         "exactly instead")
+        elif mode!="exact":
+            raise ValueError("Invalid mode "+str(mode))
+
+        values = self._exact_values(times, theta, n, t0)
+
+        # Fail gracefully if the energy is less than the critical energy for
+        # shower formation
+        if values is None:
+            super().__init__(times, np.zeros(len(times)))
+            return
+
+        # Note that although len(values) = len(times)-1 (because of np.diff),
+        # the Signal class is desinged to handle this by zero-padding the values
+        super().__init__(times, values, value_type=self.ValueTypes.field)
+
+    def _exact_values(self, times, theta, n=1.78, t0=0, rac_cache=None):
+        """Calculates the values of the pulse at the given times for angle
+        theta (radians) and index of refraction n, returning one fewer value
+        than the number of times (or None if no shower forms). If a
+        rac_cache dictionary is given, RAC values are reused from (and stored
+        in) it, since they don't depend on the angle."""
         # Conversion factor from z to t for RAC:
         # (1-n*cos(theta)) / c
         z_to_t = (1 - n*np.cos(theta))/3e8
@@ -322,6 +739,8 @@ class FastAskaryanSignal(Signal):
         # dz / max_length <= 0.1 (with dz=dt/z_to_t)
         dt_divider = int(np.abs(10*dt/self.max_length()/z_to_t)) + 1
         dz = dt / dt_divider / z_to_t
+        # Time step of RAC values (dz * z_to_t)
+        t_step = dt / dt_divider
         if dt_divider!=1:
             logger.debug("z-step of %g too large; dt_divider changed to %g",
                          dt / z_to_t, dt_divider)
@@ -331,15 +750,12 @@ class FastAskaryanSignal(Signal):
         z_max = 2.5*self.max_length()
         n_Q = int(np.abs(z_max/dz))
         z_Q_vals = np.arange(n_Q) * np.abs(dz)
-        Q = np.zeros(n_Q)
-        for i, z in enumerate(z_Q_vals):
-            Q[i] = self.charge_profile(z)
+        Q = self.charge_profile(z_Q_vals)
 
         # Fail gracefully if the energy is less than the critical energy for
         # shower formation (i.e. all Q values are zero)
         if np.all(Q==0) and len(Q)>0:
-            super().__init__(times, np.zeros(len(times)))
-            return
+            return None
 
         # Calculate RAC at a specific number of t values (n_RAC) determined so
         # that the full convolution will have the same size as the times array,
@@ -351,22 +767,33 @@ class FastAskaryanSignal(Signal):
         # In that case, points are removed from the beginning and/or end of RAC.
         t_tolerance = 10e-9
         t_start = times[0] - t0
-        n_extra_beginning = int((t_start+t_tolerance)/dz/z_to_t) + 1
-        n_extra_end = (int((t_tolerance-t_start)/dz/z_to_t) + 1
+        n_extra_beginning = int((t_start+t_tolerance)/t_step) + 1
+        n_extra_end = (int((t_tolerance-t_start)/t_step) + 1
                        + n_Q - len(times)*dt_divider)
         n_RAC = (len(times)*dt_divider + 1 - n_Q
                  + n_extra_beginning + n_extra_end)
-        t_RAC_vals = (np.arange(n_RAC) * dz * z_to_t
-                      + t_start - n_extra_beginning * dz * z_to_t)
-        RA_C = np.zeros(n_RAC)
-        for i, t in enumerate(t_RAC_vals):
-            RA_C[i] = self.RAC(t)
+        # The RAC times depend on the angle only through dt_divider and the
+        # number of values, so longer arrays of RAC values can be sliced
+        rac_key = (self.energy, t_step, t_start, n_extra_beginning)
+        if rac_cache is not None and len(rac_cache.get(rac_key, ()))>=n_RAC:
+            RA_C = rac_cache[rac_key][:n_RAC]
+        else:
+            t_RAC_vals = (np.arange(n_RAC) * t_step
+                          + t_start - n_extra_beginning * t_step)
+            RA_C = self.RAC(t_RAC_vals)
+            if rac_cache is not None:
+                rac_cache[rac_key] = RA_C
 
         # Convolve Q and RAC to get unnormalized vector potential
         if n_Q*n_RAC>1e6:
             logger.debug("convolving %i Q points with %i RA_C points",
                          n_Q, n_RAC)
-        convolution = scipy.signal.convolve(Q, RA_C, mode='full')
+        if self.convolution_method=="fft":
+            convolution = _fft_convolve(Q, RA_C)
+        else:
+            convolution = scipy.signal.convolve(
+                Q, RA_C, mode='full', method=self.convolution_method
+            )
 
         # Adjust convolution by zero-padding or removing values according to
         # the values added/removed at the beginning and end of RA_C
@@ -411,10 +838,129 @@ class FastAskaryanSignal(Signal):
         # Calculate electric field by taking derivative of vector potential
         values = np.diff(A)
 
-        # Note that although len(values) = len(times)-1 (because of np.diff),
-        # the Signal class is desinged to handle this by zero-padding the values
-        super().__init__(times, values, value_type=self.ValueTypes.field)
+        return values
+
+
+    @classmethod
+    def pulses(cls, times, energy, theta, n=1.78, t0=0, mode=None):
+        """Returns a (K, len(times)) array of the values (V/m) of K pulses at
+        the given times with offset t0, for K energies (GeV), angles theta
+        (radians) from the shower axis, and indices of refraction n
+        (broadcast against each other). The values match those of the
+        corresponding signal objects. In template mode the pulses are
+        interpolated at once. In exact mode each pulse is still calculated
+        separately (since the charge profile is stretched in time by the
+        angle), with only the RAC values shared between pulses of the same
+        energy, so it takes about as long as creating each signal object."""
+        energies, thetas, ns = np.broadcast_arrays(np.atleast_1d(energy),
+                                                   np.atleast_1d(theta),
+                                                   np.atleast_1d(n))
+        thetas = np.abs(thetas)
+        if np.any(thetas>np.pi):
+            raise ValueError("Angles greater than 180 degrees not supported")
 
+        if mode is None:
+            mode = cls.default_mode
+        if mode=="template":
+            values = cls.template_bank(times, t0).pulses(energies, thetas, ns)
+        elif mode=="exact":
+            values = np.full((len(energies), len(times)), np.nan)
+        else:
+            raise ValueError("Invalid mode "+str(mode))
+
+        # Calculate any pulses outside of the template bank exactly, with
+        # RAC values shared between the pulses
+        pulse = None
+        rac_cache = {}
+        for k in np.where(np.isnan(values[:, 0]))[0]:
+            if pulse is None or pulse.energy!=energies[k]:
+                # Only the energy is needed to calculate the pulse values
+                pulse = cls.__new__(cls)
+                pulse.energy = energies[k]
+            row = pulse._exact_values(times, thetas[k], ns[k], t0,
+                                      rac_cache=rac_cache)
+            values[k] = 0
+            if row is not None:
+                row = row[:len(times)]
+                values[k, :len(row)] = row
+        return values
+
+    @classmethod
+    def template_bank(cls, times, t0=0):
+        """Returns the template bank for pulses with the given times and
+        offset t0, building it (or loading it from the template_cache_dir)
+        if necessary."""
+        key = AskaryanTemplateBank.times_key(times, t0)
+        if key not in cls.template_banks:
+            cache_file = None
+            if cls.template_cache_dir is not None:
+                cache_file = os.path.join(
+                    cls.template_cache_dir,
+                    "askaryan_templates_{}_{:.6g}_{:.6g}.npz".format(*key)
+                )
+            cls.template_banks[key] = AskaryanTemplateBank(
+                times, t0=t0, cache_file=cache_file
+            )
+        return cls.template_banks[key]
+
+    @classmethod
+    def spectrum_bound(cls, energy, theta, frequencies, n=1.78):
+        """Returns an upper bound on the magnitude of the spectrum (V/m/Hz at
+        1 meter) of the pulse from a shower with given energy (GeV) observed
+        at angle theta (radians) from the shower axis with index of
+        refraction n, at the given frequencies (Hz), without calculating the
+        pulse itself. Twice the integral of the bound (times any filters)
+        over positive frequencies bounds the peak of the (filtered) pulse, up
+        to the discretization of the pulse and the integral."""
+        theta = np.abs(theta)
+        frequencies = np.abs(np.asarray(frequencies, dtype=np.float_))
+        # Only the energy is needed to calculate the charge profile
+        pulse = cls.__new__(cls)
+        pulse.energy = energy
+        z_vals = np.linspace(0, 2.5*pulse.max_length(), 201)
+        Q = pulse.charge_profile(z_vals)
+        LQ_tot = np.trapz(Q, z_vals)
+        if LQ_tot<=0:
+            return np.zeros(frequencies.shape)
+
+        # The field is the time derivative of the convolution of RAC with
+        # the normalized charge profile in time, so its spectrum is 2*pi*f
+        # times the spectrum of RAC (which scales with energy) times the
+        # spectrum of the charge profile (which is no larger than one)
+        rac_freqs, rac_spectrum = cls._unit_RAC_spectrum()
+        bound = (2*np.pi * frequencies * energy
+                 * np.interp(frequencies, rac_freqs, rac_spectrum))
+        z_to_t = np.abs(1 - n*np.cos(theta))/3e8
+        if z_to_t>0:
+            # Off the Cherenkov angle the charge profile is stretched in time,
+            # so its spectrum falls off at frequencies above about 1/(length
+            # of shower in time). Zero-padding the profile samples its
+            # spectrum finely enough to be interpolated
+            dz = z_vals[1] - z_vals[0]
+            n_pad = 64 * len(z_vals)
+            profile_spectrum = np.abs(np.fft.rfft(Q, n_pad)) * dz / LQ_tot
+            bound *= np.minimum(1, np.interp(frequencies*z_to_t,
+                                             np.fft.rfftfreq(n_pad, dz),
+                                             profile_spectrum, right=0))
+
+        sin_theta_c = np.sqrt(1 - 1/n**2)
+        return bound * np.sin(theta) / sin_theta_c
+
+    @classmethod
+    def _unit_RAC_spectrum(cls):
+        """Returns frequencies (Hz) and the magnitude of the spectrum of RAC
+        (Vs/Hz) for a shower of unit energy. Calculated finely enough to be
+        interpolated on first use and then cached."""
+        if FastAskaryanSignal._RAC_spectrum is None:
+            pulse = cls.__new__(cls)
+            pulse.energy = 1
+            dt = 1e-12
+            times = np.arange(-100e-9, 100e-9, dt)
+            FastAskaryanSignal._RAC_spectrum = (
+                np.fft.rfftfreq(len(times), dt),
+                np.abs(np.fft.rfft(pulse.RAC(times))) * dt
+            )
+        return FastAskaryanSignal._RAC_spectrum
 
     @property
     def vector_potential(self):
@@ -425,27 +971,30 @@ class FastAskaryanSignal(Signal):
 
     def RAC(self, time):
         """Calculates R * vector potential (A) at the Cherenkov angle in Vs
-        at the given time (s)."""
+        at the given time (s). Supports passing an array of times."""
+        time = np.asarray(time)
         # Get absolute value of time in nanoseconds
         ta = np.abs(time) * 1e9
-        if time>=0:
-            return (-4.5e-17 * self.energy
-                    * (np.exp(-ta/0.057) + (1+2.87*ta)**-3))
-        else:
-            return (-4.5e-17 * self.energy
-                    * (np.exp(-ta/0.030) + (1+3.05*ta)**-3.5))
+        values = np.where(time>=0,
+                          np.exp(-ta/0.057) + (1+2.87*ta)**-3,
+                          np.exp(-ta/0.030) + (1+3.05*ta)**-3.5)
+        return (-4.5e-17 * self.energy * values)[()]
 
     def charge_profile(self, z, density=0.92, crit_energy=7.86e-2,
                        rad_length=36.08):
         """Calculates the longitudinal charge profile in the EM shower at
         distance z (m) with parameters for the density (g/cm^3),
-        critical energy (GeV), and electron radiation length (g/cm^2) in ice."""
-        if z<=0 or self.energy<=crit_energy:
-            return 0
+        critical energy (GeV), and electron radiation length (g/cm^2) in ice.
+        Supports passing an array of distances."""
+        z = np.asarray(z, dtype=np.float_)
+        profile = np.zeros(z.shape)
+        if self.energy<=crit_energy:
+            return profile[()]
+        shower = z>0
 
         # Depth calculated by "integrating" the density along the shower path
         # (in g/cm^2)
-        x = 100 * z * density
+        x = 100 * z[shower] * density
         x_ratio = x / rad_length
         e_ratio = self.energy / crit_energy
 
@@ -456,7 +1005,8 @@ class FastAskaryanSignal(Signal):
         N = (0.31 * np.exp(x_ratio * (1 - 1.5*np.log(s)))
              / np.sqrt(np.log(e_ratio)))
 
-        return N * 1.602e-19
+        profile[shower] = N * 1.602e-19
+        return profile[()]
 
     def max_length(self, density=0.92, crit_energy=7.86e-2, rad_length=36.08):
         """Calculates the maximum length (m) of an EM shower
@@ -477,6 +1027,203 @@ AskaryanSignal = FastAskaryanSignal
 
 
 
+class AskaryanTemplateBank:
+    """Bank of Askaryan pulse templates for the given times array and pulse
+    offset t0, from which pulses can be interpolated much faster than they
+    can be calculated. Calling the bank with an energy (GeV), angle theta
+    (radians) from the shower axis, and index of refraction n returns the
+    values of the pulse, or None if the pulse is outside of the bank.\n
+    The pulse depends on theta and n only through the offset 1-n*cos(theta)
+    from the Cherenkov cone (besides an amplitude factor), so templates are
+    calculated for a grid of energies and cone offsets and scaled to unit
+    energy, since the amplitude scales linearly with energy. Off the cone,
+    pulses stretch in time with the length of the shower times the cone
+    offset, so each neighboring template is stretched to the width of the
+    requested pulse (with amplitude scaled to match) before they are
+    interpolated. Peak values are typically accurate to about 1% (up to
+    about 10% in the transition from the cone to the stretched regime).
+    If a cache_file is given, the bank is loaded from the file if it exists
+    and was made with the same times and grid, otherwise it is built and
+    saved to the file."""
+    energies = np.logspace(5, 13, 17)
+    cone_offsets = 1e-3 * np.sinh(np.linspace(-7.33, 7.6, 121))
+    # Width (s) of the pulse on the Cherenkov cone, below which stretching
+    # of the shower doesn't affect the width of the pulse
+    cone_width = 1e-10
+    # Index of refraction used to calculate the templates
+    template_index = 1.78
+
+    def __init__(self, times, t0=0, energies=None, cone_offsets=None,
+                 cache_file=None, build=True):
+        self.times = np.array(times)
+        self.t0 = t0
+        if energies is not None:
+            self.energies = np.array(energies)
+        if cone_offsets is not None:
+            self.cone_offsets = np.array(cone_offsets)
+        if np.any(self.cone_offsets==0):
+            raise ValueError("Templates can't be calculated exactly on the "+
+                             "Cherenkov cone")
+        self._log_energies = np.log10(self.energies)
+        self._times = self.times - self.t0
+        self._shower_lengths = np.array([self.shower_length(energy)
+                                         for energy in self.energies])
+        if cache_file is not None:
+            try:
+                loaded = self.load(cache_file)
+            except (IOError, KeyError):
+                loaded = None
+            if (loaded is not None and loaded.key==self.key and
+                    np.array_equal(loaded.energies, self.energies) and
+                    np.array_equal(loaded.cone_offsets, self.cone_offsets)):
+                self.templates = loaded.templates
+                return
+        if build:
+            self.build()
+            if cache_file is not None:
+                self.save(cache_file)
+
+    @staticmethod
+    def times_key(times, t0=0):
+        """Returns the key identifying pulses with the given times and offset
+        t0: the number of times, the time step, and the start time relative
+        to t0."""
+        return (len(times), float(np.round(times[1]-times[0], 18)),
+                float(np.round(times[0]-t0, 18)))
+
+    @property
+    def key(self):
+        """Key identifying the times of pulses in the bank."""
+        return self.times_key(self.times, self.t0)
+
+    @staticmethod
+    def shower_length(energy):
+        """Returns the maximum length (m) of an EM shower with the given
+        energy (GeV), as in FastAskaryanSignal."""
+        # Only the energy is needed to calculate the shower length
+        pulse = FastAskaryanSignal.__new__(FastAskaryanSignal)
+        pulse.energy = energy
+        return pulse.max_length()
+
+    def build(self):
+        """Calculates the templates for each energy and cone offset."""
+        sin_theta_c = np.sqrt(1 - 1/self.template_index**2)
+        self.templates = np.zeros((len(self.energies), len(self.cone_offsets),
+                                   len(self.times)))
+        for i, energy in enumerate(self.energies):
+            for j, offset in enumerate(self.cone_offsets):
+                theta = np.arccos((1-offset)/self.template_index)
+                pulse = FastAskaryanSignal(times=self.times, energy=energy,
+                                           theta=theta, n=self.template_index,
+                                           t0=self.t0, mode="exact")
+                self.templates[i, j] = (pulse.values / energy
+                                        / (np.sin(theta) / sin_theta_c))
+        logger.debug("Built %i Askaryan pulse templates",
+                     self.templates.shape[0]*self.templates.shape[1])
+
+    def _width(self, offset, length):
+        """Approximate width (s) of a pulse with the given cone offset and
+        shower length (m)."""
+        return np.sqrt(self.cone_width**2 + (offset*length/3e8)**2)
+
+    def __call__(self, energy, theta, n=1.78):
+        """Returns the values of the pulse with the given energy (GeV) at
+        angle theta (radians) from the shower axis with index of refraction
+        n, or None if the pulse is outside of the bank."""
+        values = self.pulses(energy, theta, n)[0]
+        if np.isnan(values[0]):
+            return None
+        return values
+
+    def pulses(self, energy, theta, n=1.78):
+        """Returns a (K, len(times)) array of the values of the pulses with
+        the K given energies (GeV), angles theta (radians) from the shower
+        axis, and indices of refraction n (broadcast against each other).
+        Rows of pulses outside of the bank are nan."""
+        energies, thetas, ns = np.broadcast_arrays(np.atleast_1d(energy),
+                                                   np.atleast_1d(theta),
+                                                   np.atleast_1d(n))
+        thetas = np.abs(thetas)
+        offsets = 1 - ns*np.cos(thetas)
+        values = np.zeros((len(energies), len(self.times)))
+        outside = ((offsets<self.cone_offsets[0]) |
+                   (offsets>self.cone_offsets[-1]))
+        showers = (energies>7.86e-2) & ~outside
+        values[outside] = np.nan
+        if not np.any(showers):
+            return values
+        energies = energies[showers]
+        thetas = thetas[showers]
+        ns = ns[showers]
+        offsets = offsets[showers]
+
+        # Energies outside of the grid use the shape of the nearest templates
+        log_energies = np.clip(np.log10(energies), self._log_energies[0],
+                               self._log_energies[-1])
+        i = np.minimum(np.searchsorted(self._log_energies, log_energies,
+                                       side='right'),
+                       len(self.energies)-1) - 1
+        j = np.minimum(np.searchsorted(self.cone_offsets, offsets,
+                                       side='right'),
+                       len(self.cone_offsets)-1) - 1
+        w_i = ((log_energies - self._log_energies[i])
+               / (self._log_energies[i+1] - self._log_energies[i]))
+        w_j = ((offsets - self.cone_offsets[j])
+               / (self.cone_offsets[j+1] - self.cone_offsets[j]))
+
+        widths = self._width(offsets, self.shower_length(energies))
+        pulses = np.zeros((len(energies), len(self.times)))
+        for ii, weight_i in [(i, 1-w_i), (i+1, w_i)]:
+            for jj, weight_j in [(j, 1-w_j), (j+1, w_j)]:
+                # Stretch the template in time about t0 to the width of the
+                # pulse. The vector potential keeps the same integral, so the
+                # field scales as the inverse square of the stretch
+                stretches = widths / self._width(self.cone_offsets[jj],
+                                                 self._shower_lengths[ii])
+                weights = weight_i * weight_j / stretches**2
+                pulses += (weights[:, np.newaxis]
+                           * self._stretched(ii, jj, stretches))
+
+        sin_theta_c = np.sqrt(1 - 1/ns**2)
+        values[showers] = (pulses * (energies * np.sin(thetas)
+                                     / sin_theta_c)[:, np.newaxis])
+        return values
+
+    def _stretched(self, i, j, stretches):
+        """Returns the templates with the given energy and cone offset
+        indices, stretched in time about t0 by the given factors (by linear
+        interpolation, with zeros outside of the templates)."""
+        n_times = len(self.times)
+        positions = ((self._times/stretches[:, np.newaxis] - self._times[0])
+                     / (self._times[1] - self._times[0]))
+        inside = (positions>=0) & (positions<=n_times-1)
+        index = np.clip(np.floor(positions).astype(np.int_), 0, n_times-2)
+        fraction = positions - index
+        rows = np.arange(len(stretches))[:, np.newaxis]
+        templates = self.templates[i, j]
+        values = (templates[rows, index] * (1-fraction)
+                  + templates[rows, index+1] * fraction)
+        values[~inside] = 0
+        return values
+
+    def save(self, filename):
+        """Saves the bank to the given .npz file."""
+        np.savez(filename, times=self.times, t0=self.t0,
+                 energies=self.energies, cone_offsets=self.cone_offsets,
+                 templates=self.templates)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a bank from the given .npz file."""
+        with np.load(filename) as data:
+            bank = cls(times=data['times'], t0=float(data['t0']),
+                       energies=data['energies'],
+                       cone_offsets=data['cone_offsets'], build=False)
+            bank.templates = data['templates']
+        return bank
+
+
+
 class GaussianNoise(Signal):
     """Gaussian noise signal with standard deviation sigma"""
     def __init__(self, times, sigma):
@@ -492,9 +1239,23 @@ class ThermalNoise(FunctionSignal):
     a number or a function designating the amplitudes at each frequency,
     and n_freqs which is the number of frequencies to use (in f_band)
     for the calculation (default is based on the FFT bin size of the given
-    times array). Returned signal values are voltages (V)."""
+    times array). Returned signal values are voltages (V).
+    The mode may be "sum" to add the sinusoids of each frequency directly, or
+    "fft" to evaluate the same sum on evenly spaced times by FFT (chirp-z
+    transform), falling back to the direct sum for uneven times. Both modes
+    give the same noise for any times array, including shifted or overlapping
+    ones. By default the mode is given by the default_mode class attribute.
+    The direct sum is calculated in blocks of time_block times and
+    freq_block frequencies (by default the square root of the number of
+    frequencies), which bound its memory use. Values are calculated with the
+    precision of the dtype class attribute (float64 or float32)."""
+    default_mode = "fft"
+    time_block = 1024
+    freq_block = None
+    dtype = np.float64
+
     def __init__(self, times, f_band, f_amplitude=1, rms_voltage=None,
-                 temperature=None, resistance=None, n_freqs=0):
+                 temperature=None, resistance=None, n_freqs=0, mode=None):
         # Calculation based on Rician (Rayleigh) noise model for ANITA:
         # https://www.phys.hawaii.edu/elog/anita_notes/060228_110754/noise_simulation.ps
 
@@ -541,17 +1302,24 @@ class ThermalNoise(FunctionSignal):
             raise ValueError("Either RMS voltage or temperature and resistance"+
                              " must be provided to calculate noise amplitude")
 
+        if mode is None:
+            mode = self.default_mode
+        if mode not in ("sum", "fft"):
+            raise ValueError("Invalid mode "+str(mode))
+        self.mode = mode
+
         def f(ts):
             """Set the time-domain signal by adding sinusoidal signals of each
             frequency with the corresponding phase."""
-            # This method is nicer than an inverse fourier transform because
-            # results are consistant for differing ranges of ts around the same
-            # time. The price payed is that the fft would be an order of
-            # magnitude faster, but not reproducible for a slightly different
-            # time array.
-            values = sum(amp * np.cos(2*np.pi*freq * ts + phase)
-                         for freq, amp, phase
-                         in zip(self.freqs, self.amps, self.phases))
+            # This method is nicer than a plain inverse fourier transform
+            # because results are consistant for differing ranges of ts around
+            # the same time. The fft mode keeps this by evaluating the same
+            # sum of sinusoids exactly at the given times.
+            values = None
+            if self.mode=="fft":
+                values = self._transformed_values(ts)
+            if values is None:
+                values = self._summed_values(ts)
 
             # Normalization calculated by guess-and-check,
             # but seems to work fine
@@ -562,6 +1330,232 @@ class ThermalNoise(FunctionSignal):
             # rms voltage:
             values *= self.rms
 
-            return values
+            return values.astype(self.dtype)
 
         super().__init__(times, function=f, value_type=self.ValueTypes.voltage)
+
+    def _summed_values(self, ts):
+        """Returns the sum of the sinusoids of each frequency at the given
+        times. With the frequencies split into blocks, the sum is calculated
+        for blocks of times as matrix products of the complex phasors of the
+        frequency offsets within a block with the complex amplitudes, which
+        are then rotated by the phasors of the block start frequencies."""
+        ts = np.asarray(ts, dtype=np.float_)
+        shape = ts.shape
+        ts = ts.ravel()
+        if np.dtype(self.dtype)==np.float32:
+            real_type, complex_type = np.float32, np.complex64
+        else:
+            real_type, complex_type = np.float_, np.complex_
+
+        def phasors(cycles):
+            # Reduce the number of cycles to the nearest integer in double
+            # precision so the phases keep their precision in single precision
+            cycles -= np.round(cycles)
+            return np.exp(2j*np.pi * cycles.astype(real_type))
+
+        # The frequencies are f_min + k*df, with k split into
+        # k = a*block_size + b
+        n_freqs = len(self.freqs)
+        df = (self.f_max - self.f_min) / n_freqs
+        if self.freq_block is None:
+            block_size = int(np.ceil(np.sqrt(n_freqs)))
+        else:
+            block_size = self.freq_block
+        n_blocks = int(np.ceil(n_freqs/block_size))
+        amplitudes = np.zeros(n_blocks*block_size, dtype=complex_type)
+        amplitudes[:n_freqs] = (np.asarray(self.amps) *
+                                np.exp(1j*np.asarray(self.phases)))
+        amplitudes = amplitudes.reshape((n_blocks, block_size)).T
+        offsets = np.arange(block_size) * df
+        starts = np.arange(n_blocks) * block_size * df
+
+        values = np.zeros(len(ts))
+        for i in range(0, len(ts), self.time_block):
+            block_times = ts[i:i+self.time_block]
+            sums = np.sum(np.dot(phasors(np.outer(block_times, offsets)),
+                                 amplitudes)
+                          * phasors(np.outer(block_times, starts)), axis=1)
+            values[i:i+self.time_block] = np.real(
+                phasors(block_times*self.f_min) * sums
+            )
+        return values.reshape(shape)
+
+    def _transformed_values(self, ts):
+        """Returns the sum of the sinusoids of each frequency at the given
+        evenly spaced times, calculated by chirp-z transform. Returns None if
+        the times are not evenly spaced."""
+        ts = np.asarray(ts, dtype=np.float_)
+        if ts.ndim!=1 or len(ts)<2:
+            return None
+        n_times = len(ts)
+        dt = (ts[-1] - ts[0]) / (n_times-1)
+        # Allow for the rounding errors of np.linspace and the like, which
+        # shift the sinusoid phases by a negligible amount
+        if not np.allclose(ts, ts[0] + dt*np.arange(n_times),
+                           rtol=0,
+                           atol=1e-6/max(abs(self.f_min), abs(self.f_max))):
+            return None
+
+        # The frequencies are f_min + k*df, so at times t0 + j*dt the sum is
+        # the real part of exp(2*pi*i*f_min*t) times the sum over k of
+        # c_k * w**(k*j), where w=exp(2*pi*i*df*dt). Using k*j =
+        # (k**2 + j**2 - (j-k)**2) / 2, the sum over k is a convolution with
+        # a chirp, which is calculated by FFT
+        n_freqs = len(self.freqs)
+        df = (self.f_max - self.f_min) / n_freqs
+        a = df * dt
+        k = np.arange(n_freqs)
+        j = np.arange(n_times)
+        coeffs = (np.asarray(self.amps) *
+                  np.exp(1j*(np.asarray(self.phases) + 2*np.pi*df*ts[0]*k)))
+        chirp = np.exp(-1j*np.pi*a * np.arange(1-n_freqs, n_times)**2)
+        n_fft = scipy.fftpack.next_fast_len(n_freqs+n_times-1)
+        convolution = np.fft.ifft(
+            np.fft.fft(coeffs*np.exp(1j*np.pi*a * k**2), n_fft) *
+            np.fft.fft(chirp, n_fft)
+        )[n_freqs-1:n_freqs+n_times-1]
+        sums = np.exp(1j*np.pi*a * j**2) * convolution
+        return np.real(np.exp(2j*np.pi*self.f_min*ts) * sums)
+
+
+
+class NoiseBank:
+    """Bank of thermal noise shared between antennas. For each frequency band
+    and noise level a noise waveform of the given duration (s) is generated
+    once, and split into slots as long as the first times drawn. The noise of
+    each antenna is drawn from one of the slots in a random order, so the
+    noise of different draws never overlaps. Noise on evenly spaced times
+    aligned with the sampling of the first times drawn is copied directly from
+    a pre-calculated array, and noise on any other times is evaluated from the
+    same waveform, so an antenna's noise stays consistent between different
+    times arrays.
+    The noise waveforms are regenerated after every refresh_interval draws
+    (only once their slots run out if None), or whenever a draw doesn't fit in
+    the remaining slots. They are generated from the given seed (drawn from
+    the current random state if not given), while the order of the slots is
+    drawn from the global random state. Note that refreshing and the slots
+    make the noise depend on the earlier draws, which differ between worker
+    processes."""
+    duration = 1e-5
+
+    def __init__(self, duration=None, refresh_interval=None, seed=None):
+        if duration is not None:
+            self.duration = duration
+        self.refresh_interval = refresh_interval
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+        self.seed = seed
+        self.generation = 0
+        self._draws = 0
+        # Noise waveforms with their pre-calculated arrays and unused slots,
+        # keyed by the arguments of the noise
+        self._waveforms = {}
+
+    def __getstate__(self):
+        # The generated noise waveforms are dropped when pickling (e.g. for
+        # worker processes), since they are regenerated identically as needed
+        state = self.__dict__.copy()
+        state['_waveforms'] = {}
+        return state
+
+    def noise(self, times, f_band, rms_voltage=None, temperature=None,
+              resistance=None):
+        """Returns a thermal noise signal over the given times array, drawn
+        from an unused slot of the bank. The noise parameters are as in
+        ThermalNoise. The with_times method of the returned signal gives the
+        noise from the same draw at other times."""
+        if (self.refresh_interval is not None and
+                self._draws>=self.refresh_interval):
+            self._refresh()
+
+        key = (tuple(f_band), rms_voltage, temperature, resistance)
+        times = np.asarray(times, dtype=np.float_)
+        dt = _even_spacing(times)
+        if dt is not None:
+            length = len(times) * dt
+        elif len(times)>1:
+            length = times[-1] - times[0]
+        else:
+            length = 0
+        waveform = self._waveform(key)
+        if (waveform['slot_length'] is not None and
+                (len(waveform['slots'])==0 or
+                 length>waveform['slot_length'])):
+            self._refresh()
+            waveform = self._waveform(key)
+        if waveform['slot_length'] is None:
+            # Slots are as long as the first times drawn (but no more than
+            # one million fill the bank)
+            slot_length = max(length, self.duration*1e-6)
+            n_slots = max(int(self.duration/slot_length), 1)
+            waveform['slot_length'] = slot_length
+            waveform['slots'] = list(np.random.permutation(n_slots)
+                                     * slot_length)
+        self._draws += 1
+
+        start = waveform['slots'].pop()
+        if dt is None:
+            offset = start - (times[0] if len(times)>0 else 0)
+        else:
+            dt, values = self._sampled(waveform, dt)
+            offset = np.round(start/dt)*dt - times[0]
+
+        def function(ts):
+            """Noise from the bank waveform at the times shifted by the
+            offset of the draw."""
+            ts = np.asarray(ts, dtype=np.float_)
+            dt = _even_spacing(ts)
+            if dt is not None:
+                dt, values = self._sampled(waveform, dt)
+                start = (ts[0] + offset) / dt
+                i = int(np.round(start))
+                if (np.abs(start-i)<1e-6 and i>=0 and
+                        i+len(ts)<=len(values)):
+                    return values[i:i+len(ts)]
+            return waveform['noise'].with_times(ts + offset).values
+
+        return FunctionSignal(times, function,
+                              value_type=Signal.ValueTypes.voltage)
+
+    def _refresh(self):
+        """Moves on to the next generation of noise waveforms."""
+        self.generation += 1
+        self._draws = 0
+        self._waveforms.clear()
+
+    def _waveform(self, key):
+        """Returns the noise waveform for the given noise arguments,
+        generating it if necessary."""
+        if key not in self._waveforms:
+            f_band, rms_voltage, temperature, resistance = key
+            n_freqs = (f_band[1] - f_band[0]) * self.duration
+            # Generate the noise phases from the bank's seed, independent
+            # of the order in which the waveforms are generated
+            key_seed = zlib.crc32(repr(key).encode())
+            random_state = np.random.get_state()
+            np.random.seed([self.seed, self.generation, key_seed])
+            try:
+                noise = ThermalNoise([0], f_band=f_band,
+                                     rms_voltage=rms_voltage,
+                                     temperature=temperature,
+                                     resistance=resistance,
+                                     n_freqs=n_freqs)
+            finally:
+                np.random.set_state(random_state)
+            self._waveforms[key] = {'noise': noise, 'sampled': [],
+                                    'slot_length': None, 'slots': []}
+        return self._waveforms[key]
+
+    def _sampled(self, waveform, dt):
+        """Returns the sample spacing and the (read-only) values of the
+        given noise waveform sampled over the bank duration with a spacing
+        matching dt, calculating them if necessary."""
+        for sample_dt, values in waveform['sampled']:
+            if np.abs(sample_dt-dt)<=1e-9*dt:
+                return sample_dt, values
+        n = max(int(self.duration/dt), 1)
+        values = waveform['noise'].with_times(np.arange(n)*dt).values
+        values.flags.writeable = False
+        waveform['sampled'].append((dt, values))
+        return dt, values
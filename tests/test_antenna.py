@@ -2,8 +2,10 @@
 
 import pytest
 
+from config import SEED
+
 from pyrex.antenna import Antenna, DipoleAntenna
-from pyrex.signals import Signal
+from pyrex.signals import Signal, SpectralSignal, NoiseBank
 from pyrex.ice_model import IceModel
 
 import numpy as np
@@ -78,6 +80,21 @@ class TestAntenna:
         antenna.clear()
         assert antenna.signals == []
 
+    def test_noise_bank(self, antenna):
+        """Test that noise is drawn from the noise bank if one is set"""
+        np.random.seed(SEED)
+        antenna.noise_bank = NoiseBank(duration=1e-6)
+        times = np.linspace(0, 100e-9, 1001)
+        noise = antenna.make_noise(times)
+        assert np.array_equal(noise.values,
+                              antenna._noise_master.with_times(times).values)
+        assert (np.sqrt(np.mean(noise.values**2)) ==
+                pytest.approx(np.sqrt(4*1.38e-23*300*100*250e6), rel=0.2))
+        assert np.array_equal(antenna.make_noise(times).values, noise.values)
+        antenna.clear(reset_noise=True)
+        assert not np.array_equal(antenna.make_noise(times).values,
+                                  noise.values)
+
     def test_default_trigger(self, antenna):
         """Test that the antenna triggers on empty signal"""
         assert antenna.trigger(Signal([0],[0]))
@@ -108,11 +125,28 @@ class TestAntenna:
                     gains.append(antenna.polarization_gain((x,y,z)))
         assert np.array_equal(gains, np.ones(3**3))
 
+    def test_default_trigger_bounds(self, antenna):
+        """Test that the default antenna can't rule out any signal"""
+        assert antenna.signal_bound(1e-9) == np.inf
+        assert antenna.could_trigger(0)
+
     def test_receive(self, antenna):
         """Test that the antenna properly receives signals"""
         antenna.receive(Signal([0,1e-9,2e-9], [0,1,0], Signal.ValueTypes.voltage))
         assert len(antenna.signals) > 0
 
+    def test_receive_spectral(self, antenna):
+        """Test that received spectral signals keep their pending filters and
+        match received regular signals"""
+        times = np.linspace(0, 100e-9, 1001)
+        values = np.exp(-((times-30e-9)/1e-9)**2)
+        antenna.receive(Signal(times, values, Signal.ValueTypes.field))
+        antenna.receive(SpectralSignal(times, values, Signal.ValueTypes.field))
+        assert isinstance(antenna.signals[1], SpectralSignal)
+        assert antenna.signals[1]._responses is not None
+        assert antenna.signals[1].value_type == Signal.ValueTypes.voltage
+        assert np.allclose(antenna.signals[1].values, antenna.signals[0].values)
+
     def test_no_waveforms(self, antenna):
         """Test that waveforms returns an empty list if there are no signals"""
         assert antenna.waveforms == []
@@ -251,3 +285,23 @@ class TestDipoleAntenna:
         dipole.signals.append(Signal([0], [dipole.threshold*1.01]))
         assert dipole.is_hit
 
+    def test_signal_bound(self, dipole):
+        """Test that the signal bound includes the antenna gains"""
+        bound = dipole.signal_bound(1, direction=[1, 0, 0],
+                                    polarization=[0, 0, 1])
+        assert bound == pytest.approx(1/dipole.antenna_factor)
+        assert dipole.signal_bound(1, direction=[0, 0, 1],
+                                   polarization=[0, 0, 1]) < 1e-15
+        assert dipole.signal_bound(1, direction=[1, 0, 0],
+                                   polarization=[1, 0, 0]) == 0
+
+    def test_could_trigger(self, dipole):
+        """Test that could_trigger compares the bound to the threshold,
+        including noise if the antenna is noisy"""
+        dipole.noisy = False
+        assert not dipole.could_trigger(dipole.threshold*0.99)
+        assert dipole.could_trigger(dipole.threshold*1.01)
+        dipole.noisy = True
+        assert dipole.could_trigger(dipole.threshold*0.99)
+        dipole.threshold = 1
+        assert not dipole.could_trigger(0.99)
@@ -3,7 +3,7 @@
 import pytest
 
 from pyrex.detector import AntennaSystem, Detector
-from pyrex.signals import Signal
+from pyrex.signals import Signal, NoiseBank
 from pyrex.antenna import Antenna
 
 import numpy as np
@@ -232,3 +232,20 @@ class TestDetector:
         dummy_str.clear()
         for i in range(5):
             assert dummy_str.subsets[i].signals == []
+
+    def test_set_noise_bank(self, dummy_det):
+        """Test that set_noise_bank shares a noise bank with all antennas"""
+        dummy_det.build_antennas(antenna_class=Antenna)
+        dummy_det.subsets[0].subsets[0] = AntennaSystem(
+            dummy_det.subsets[0].subsets[0]
+        )
+        bank = NoiseBank()
+        dummy_det.set_noise_bank(bank)
+        assert dummy_det[0].antenna.noise_bank is bank
+        for ant in dummy_det[1:]:
+            assert ant.noise_bank is bank
+        dummy_det.set_noise_bank(None)
+        assert dummy_det[0].antenna.noise_bank is None
+        for ant in dummy_det[1:]:
+            assert ant.noise_bank is None
+
@@ -2,7 +2,8 @@
 
 import pytest
 
-from pyrex.earth_model import prem_density, slant_depth
+from pyrex.earth_model import (EARTH_RADIUS, prem_density, slant_depth,
+                               SlantDepthTable)
 
 import numpy as np
 
@@ -96,4 +97,123 @@ def test_prem_mutliple():
     assert np.array_equal(prem_density(radii), expected)
 
 
-# TODO: Add tests for slant depth
+def test_slant_depth_multiple():
+    """Test slant_depth for multiple values at once"""
+    angles = np.radians([0, 30, 60, 89, 91, 120, 180])
+    depths = np.array([0, 100, 500, 1000, 2000, 2500, 3000])
+    expected = [slant_depth(a, d) for a, d in zip(angles, depths)]
+    assert np.allclose(slant_depth(angles, depths), expected,
+                       rtol=1e-12, atol=0)
+    grid = slant_depth(angles[:, np.newaxis], depths)
+    assert grid.shape == (7, 7)
+    assert np.allclose(grid[3], [slant_depth(angles[3], d) for d in depths],
+                       rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("angle", np.radians([0, 10, 45, 80, 89.9]))
+@pytest.mark.parametrize("depth", [0, 1000, 3000, 50000, 2000000])
+def test_slant_depth_numerical(angle, depth):
+    """Test that the analytic slant_depth matches numerical integration.
+    The trapezoidal integration is off by up to half a step of material at
+    the ends of the chord and at each density jump, so that much absolute
+    error is allowed"""
+    step = 10
+    expected = slant_depth(angle, depth, step=step)
+    assert slant_depth(angle, depth) == pytest.approx(expected, rel=1e-5,
+                                                      abs=100*13*step)
+
+@pytest.mark.parametrize("angle", np.radians([90, 95, 120, 150, 180]))
+@pytest.mark.parametrize("depth", [0, 100, 1500, 2999])
+def test_slant_depth_upward(angle, depth):
+    """Test that slant_depth matches the column depth of water above the
+    starting depth for upward chords"""
+    r0 = EARTH_RADIUS - depth
+    cos_angle = np.cos(angle)
+    length = (np.sqrt(EARTH_RADIUS**2 - r0**2 * (1-cos_angle**2))
+              + r0*cos_angle)
+    expected = 100 * 1.02 * length
+    assert slant_depth(angle, depth) == pytest.approx(expected, rel=1e-9,
+                                                      abs=1e-3)
+
+def test_slant_depth_symmetric():
+    """Test that slant_depth is symmetric in the sign of the nadir angle"""
+    angles = np.radians([0, 10, 45, 80, 89.9, 120])
+    assert np.allclose(slant_depth(angles, 1000), slant_depth(-angles, 1000),
+                       rtol=1e-12, atol=0)
+
+
+
+@pytest.fixture(scope="module")
+def slant_depth_table():
+    """Fixture for forming a SlantDepthTable object"""
+    return SlantDepthTable()
+
+class TestSlantDepthTable:
+    """Tests for SlantDepthTable class"""
+    def test_error(self, slant_depth_table):
+        """Test that the interpolation error found in building is small"""
+        assert slant_depth_table.error < 1e-5
+
+    @pytest.mark.parametrize("angle", np.radians([0, 10, 30, 60, 80, 89]))
+    @pytest.mark.parametrize("depth", [0, 100, 1500, 2999, 3001, 10000])
+    def test_downward_values(self, slant_depth_table, angle, depth):
+        """Test that the table matches the slant_depth function for downward
+        chords to within twice the table error"""
+        expected = slant_depth(angle, depth)
+        assert slant_depth_table(angle, depth) == pytest.approx(
+            expected, rel=2*slant_depth_table.error
+        )
+
+    @pytest.mark.parametrize("angle", np.radians([90, 95, 120, 150, 180]))
+    @pytest.mark.parametrize("depth", [0, 100, 1500, 2999])
+    def test_upward_values(self, slant_depth_table, angle, depth):
+        """Test that the table matches the column depth of water above the
+        starting depth for upward chords"""
+        r0 = EARTH_RADIUS - depth
+        cos_angle = np.cos(angle)
+        length = (np.sqrt(EARTH_RADIUS**2 - r0**2 * (1-cos_angle**2))
+                  + r0*cos_angle)
+        expected = 100 * 1.02 * length
+        assert slant_depth_table(angle, depth) == pytest.approx(expected,
+                                                                rel=1e-9,
+                                                                abs=1e-3)
+
+    def test_deep_values(self, slant_depth_table):
+        """Test that the table falls back to slant_depth below the
+        constant-density shells"""
+        assert (slant_depth_table(0.5, 30000) ==
+                slant_depth(0.5, 30000))
+
+    def test_multiple(self, slant_depth_table):
+        """Test the table for multiple values at once"""
+        angles = np.radians([0, 30, 60, 89, 91, 120, 180])
+        depths = np.array([0, 100, 500, 1000, 2000, 2500, 30000])
+        expected = [slant_depth_table(a, d) for a, d in zip(angles, depths)]
+        assert np.array_equal(slant_depth_table(angles, depths), expected)
+        assert slant_depth_table(angles[:, np.newaxis], depths).shape == (7, 7)
+
+    def test_cache_file(self, slant_depth_table, tmpdir):
+        """Test that the table is saved to and loaded from a cache file"""
+        filename = str(tmpdir.join("slant_depth.npz"))
+        table = SlantDepthTable(cache_file=filename)
+        assert tmpdir.join("slant_depth.npz").check()
+        loaded = SlantDepthTable(cache_file=filename, build=False)
+        assert np.array_equal(loaded.chord_depths, table.chord_depths)
+        assert loaded.error == table.error
+        assert loaded(0.3, 1000) == slant_depth_table(0.3, 1000)
+
+    def test_cache_file_extension(self, tmpdir, monkeypatch):
+        """Test that cache files without the .npz extension are reloaded
+        rather than rebuilt, and only for the same points and order"""
+        filename = str(tmpdir.join("slant_depth"))
+        table = SlantDepthTable(points=50, order=8, cache_file=filename)
+        assert tmpdir.join("slant_depth.npz").check()
+        builds = []
+        monkeypatch.setattr(SlantDepthTable, "build",
+                            lambda self: builds.append(self.order))
+        monkeypatch.setattr(SlantDepthTable, "save", lambda self, name: None)
+        loaded = SlantDepthTable(points=50, order=8, cache_file=filename)
+        assert builds == []
+        assert np.array_equal(loaded.chord_depths, table.chord_depths)
+        SlantDepthTable(points=50, order=16, cache_file=filename)
+        assert builds == [16]
@@ -2,9 +2,16 @@
 
 import pytest
 
-from pyrex.antenna import Antenna
+from config import SEED
+
+from pyrex.internal_functions import normalize
+from pyrex.signals import Signal
+from pyrex.antenna import Antenna, DipoleAntenna
 from pyrex.ice_model import IceModel
-from pyrex.particle import Particle, ListGenerator
+from pyrex.particle import (Particle, ParticleBatch, ShadowGenerator,
+                            ListGenerator)
+from pyrex.ray_tracing import (RayTraceTable, RayTracerCache,
+                               ShadowZoneTable)
 from pyrex.kernel import EventKernel
 
 import numpy as np
@@ -20,6 +27,21 @@ def kernel():
     return EventKernel(generator=gen, antennas=[Antenna(position=(0, 0, -100),
                                                         noisy=False)])
 
+@pytest.fixture
+def noisy_kernel():
+    """Fixture for forming EventKernel object with noisy antennas"""
+    gen = ListGenerator([Particle(vertex=[100, 200, -500],
+                                  direction=[0, 0, 1], energy=1e9),
+                         Particle(vertex=[-200, 0, -300],
+                                  direction=[1, 0, 0], energy=1e8),
+                         Particle(vertex=[0, 300, -800],
+                                  direction=[0, 1, 0], energy=1e10)])
+    antennas = [Antenna(position=(0, 0, -100), freq_range=(1e8, 1e9),
+                        noise_rms=1e-5),
+                Antenna(position=(0, 0, -150), freq_range=(1e8, 1e9),
+                        noise_rms=1e-5)]
+    return EventKernel(generator=gen, antennas=antennas)
+
 
 class TestEventKernel:
     """Tests for EventKernel class"""
@@ -38,3 +60,298 @@ class TestEventKernel:
         assert particle.energy == 1e9
         for ant in kernel.antennas:
             assert len(ant.signals) == 2
+
+    def test_event_uneven_times(self, kernel):
+        """Test that the event method runs smoothly with unevenly spaced
+        signal times"""
+        kernel.signal_times = np.concatenate((np.linspace(-20e-9, 0, 200,
+                                                          endpoint=False),
+                                              np.linspace(0, 80e-9, 1000)))
+        kernel.event()
+        for ant in kernel.antennas:
+            assert len(ant.signals) == 2
+            for signal in ant.signals:
+                assert len(signal.times) == len(kernel.signal_times)
+
+    def test_event_lazy_filtering(self, monkeypatch):
+        """Test that the received signals with filters applied lazily in the
+        frequency domain match those with the filters applied immediately,
+        up to a small fraction of their peaks"""
+        antenna = DipoleAntenna(name="ant", position=(0, 0, -200),
+                                center_frequency=250e6, bandwidth=300e6,
+                                resistance=100, trigger_threshold=1e-4,
+                                noisy=False)
+        kernel = EventKernel(generator=None, antennas=[antenna])
+        particles = [Particle(vertex=[100, 200, -500], direction=[0, 0, 1],
+                              energy=1e9),
+                     Particle(vertex=[-600, 300, -1200],
+                              direction=normalize([1, -1, 0.5]),
+                              energy=1e10),
+                     Particle(vertex=[1000, 0, -300], direction=[-1, 0, 0],
+                              energy=1e8)]
+        lazy_signals = []
+        for particle in particles:
+            antenna.clear()
+            kernel.process_particle(particle)
+            lazy_signals.extend(signal.values for signal in antenna.signals)
+        monkeypatch.setattr("pyrex.kernel.SpectralSignal", Signal)
+        eager_signals = []
+        for particle in particles:
+            antenna.clear()
+            kernel.process_particle(particle)
+            for signal in antenna.signals:
+                assert type(signal) is Signal
+                eager_signals.append(signal.values)
+        assert len(lazy_signals) == len(eager_signals) > 0
+        for lazy, eager in zip(lazy_signals, eager_signals):
+            assert (np.max(np.abs(lazy-eager))
+                    <= 1e-2 * np.max(np.abs(eager)))
+
+    def test_run(self, kernel):
+        """Test that the run method returns results for each event"""
+        results = kernel.run(2, seed=SEED)
+        assert len(results) == 2
+        for particle, waveforms in results:
+            assert np.array_equal(particle.vertex, [100, 200, -500])
+            assert len(waveforms) == 1
+            assert len(waveforms[0]) == 2
+
+    def test_run_unseeded(self, kernel):
+        """Test that the run method works without a given seed"""
+        results = kernel.run(2)
+        assert len(results) == 2
+
+    def test_run_reproducible(self, noisy_kernel):
+        """Test that the run method gives identical results for the same
+        seed"""
+        results_1 = noisy_kernel.run(3, seed=SEED)
+        results_2 = noisy_kernel.run(3, seed=SEED)
+        for (p_1, waves_1), (p_2, waves_2) in zip(results_1, results_2):
+            assert np.array_equal(p_1.vertex, p_2.vertex)
+            for ant_waves_1, ant_waves_2 in zip(waves_1, waves_2):
+                assert len(ant_waves_1) == len(ant_waves_2)
+                for wave_1, wave_2 in zip(ant_waves_1, ant_waves_2):
+                    assert np.array_equal(wave_1.values, wave_2.values)
+
+    def test_run_workers(self, noisy_kernel):
+        """Test that the run method gives identical results in event order
+        regardless of the number of workers"""
+        serial = noisy_kernel.run(3, seed=SEED)
+        parallel = noisy_kernel.run(3, workers=2, seed=SEED)
+        assert len(parallel) == 3
+        for (p_1, waves_1), (p_2, waves_2) in zip(serial, parallel):
+            assert np.array_equal(p_1.vertex, p_2.vertex)
+            for ant_waves_1, ant_waves_2 in zip(waves_1, waves_2):
+                assert len(ant_waves_1) == len(ant_waves_2)
+                for wave_1, wave_2 in zip(ant_waves_1, ant_waves_2):
+                    assert np.array_equal(wave_1.times, wave_2.times)
+                    assert np.array_equal(wave_1.values, wave_2.values)
+
+    def test_run_random_state(self, noisy_kernel):
+        """Test that the run method restores the global random state"""
+        np.random.seed(SEED)
+        expected = np.random.rand(3)
+        np.random.seed(SEED)
+        noisy_kernel.run(2, seed=SEED)
+        assert np.array_equal(np.random.rand(3), expected)
+        np.random.seed(SEED)
+        noisy_kernel.gen = ListGenerator(noisy_kernel.gen.particles)
+        noisy_kernel.run(2, workers=2, seed=SEED)
+        assert np.array_equal(np.random.rand(3), expected)
+
+    def test_run_workers_generator(self, noisy_kernel):
+        """Test that randomly generated particles are identical regardless of
+        the number of workers, even with other random draws in between"""
+        noisy_kernel.gen = ShadowGenerator(dx=1000, dy=1000, dz=1000,
+                                           energy=1e9)
+        serial = noisy_kernel.run(5, seed=SEED)
+        np.random.rand(10)
+        parallel = noisy_kernel.run(5, workers=3, seed=SEED)
+        for (p_1, waves_1), (p_2, waves_2) in zip(serial, parallel):
+            assert np.array_equal(p_1.vertex, p_2.vertex)
+            assert np.array_equal(p_1.direction, p_2.direction)
+
+    def test_run_particles(self, noisy_kernel):
+        """Test that the run_particles method processes each particle of a
+        particle batch, matching the run method"""
+        batch = ParticleBatch.from_particles(noisy_kernel.gen.particles)
+        results = noisy_kernel.run_particles(batch, seed=SEED)
+        expected = noisy_kernel.run(3, seed=SEED)
+        assert len(results) == 3
+        for (p_1, waves_1), (p_2, waves_2) in zip(results, expected):
+            assert np.array_equal(p_1.vertex, p_2.vertex)
+            for ant_waves_1, ant_waves_2 in zip(waves_1, waves_2):
+                assert len(ant_waves_1) == len(ant_waves_2)
+                for wave_1, wave_2 in zip(ant_waves_1, ant_waves_2):
+                    assert np.array_equal(wave_1.values, wave_2.values)
+
+    def test_resume(self, noisy_kernel, tmpdir):
+        """Test that an interrupted run resumed from its checkpoint gives the
+        same results as an uninterrupted run"""
+        checkpoint = str(tmpdir.join("run.ckpt"))
+        expected = noisy_kernel.run(5, seed=SEED)
+        gen = ListGenerator(noisy_kernel.gen.particles)
+        create_particle = gen.create_particle
+        def interrupted_create_particle():
+            if gen.get_state()['index']>=2:
+                raise KeyboardInterrupt
+            return create_particle()
+        gen.create_particle = interrupted_create_particle
+        noisy_kernel.gen = gen
+        with pytest.raises(KeyboardInterrupt):
+            noisy_kernel.run(5, seed=SEED, checkpoint=checkpoint,
+                             checkpoint_interval=2)
+        noisy_kernel.gen = ListGenerator(noisy_kernel.gen.particles)
+        results = noisy_kernel.resume(checkpoint)
+        assert len(results) == 3
+        for (p_1, waves_1), (p_2, waves_2) in zip(results, expected[2:]):
+            assert np.array_equal(p_1.vertex, p_2.vertex)
+            for ant_waves_1, ant_waves_2 in zip(waves_1, waves_2):
+                assert len(ant_waves_1) == len(ant_waves_2)
+                for wave_1, wave_2 in zip(ant_waves_1, ant_waves_2):
+                    assert np.array_equal(wave_1.values, wave_2.values)
+        assert noisy_kernel.resume(checkpoint) == []
+
+    def test_pretrigger(self):
+        """Test that events which can't trigger are skipped by the
+        pretrigger estimate without changing the triggered antennas"""
+        antenna = DipoleAntenna(name="ant", position=(0, 0, -200),
+                                center_frequency=250e6, bandwidth=300e6,
+                                resistance=100, trigger_threshold=1e-4,
+                                noisy=False)
+        kernel = EventKernel(generator=None, antennas=[antenna])
+        lazy_kernel = EventKernel(generator=None, antennas=[antenna],
+                                  pretrigger=True)
+        skipped = []
+        for energy in [1e6, 1e8, 1e10, 1e12]:
+            particle = Particle(vertex=[100, 200, -500], direction=[0, 0, 1],
+                                energy=energy)
+            antenna.clear()
+            kernel.process_particle(particle)
+            assert not kernel.below_threshold
+            expected = antenna.is_hit
+            antenna.clear()
+            lazy_kernel.process_particle(particle)
+            assert antenna.is_hit == expected
+            if lazy_kernel.below_threshold:
+                assert len(antenna.signals) == 0
+            skipped.append(lazy_kernel.below_threshold)
+        assert skipped == [True, True, False, False]
+
+    def test_pretrigger_bounds(self):
+        """Test that the pretrigger estimates of the peak voltages are no
+        smaller than the peak voltages of the received signals, over random
+        geometries"""
+        antenna = DipoleAntenna(name="ant", position=(0, 0, -200),
+                                center_frequency=250e6, bandwidth=300e6,
+                                resistance=100, trigger_threshold=1e-4,
+                                noisy=False)
+        kernel = EventKernel(generator=None, antennas=[antenna])
+        np.random.seed(SEED)
+        n_checked = 0
+        for _ in range(30):
+            rho = np.random.uniform(0, 1500)
+            phi = np.random.uniform(0, 2*np.pi)
+            vertex = [rho*np.cos(phi), rho*np.sin(phi),
+                      -np.random.uniform(100, 1500)]
+            direction = np.random.normal(size=3)
+            direction /= np.linalg.norm(direction)
+            particle = Particle(vertex=vertex, direction=direction,
+                                energy=10**np.random.uniform(7, 11))
+            antenna.clear()
+            ray_tracer = kernel.process_particle(particle)[0]
+            n = kernel.ice.index(particle.vertex[2])
+            paths = ray_tracer.solutions if ray_tracer.exists else []
+            signals = iter(antenna.signals)
+            for path in paths:
+                psi = np.arccos(np.vdot(particle.direction,
+                                        path.emitted_direction))
+                if psi>np.pi/2:
+                    continue
+                epol = normalize(np.vdot(path.received_direction,
+                                         particle.direction)
+                                 * path.received_direction
+                                 - particle.direction)
+                amplitude = kernel.field_bound(particle, n, antenna, path,
+                                               psi)
+                bound = antenna.signal_bound(
+                    amplitude, direction=path.received_direction,
+                    polarization=epol
+                )
+                assert np.max(np.abs(next(signals).values)) <= bound
+                n_checked += 1
+        assert n_checked > 10
+
+    def test_pretrigger_rejections(self):
+        """Test that the pretrigger never skips an event which triggers under
+        the full simulation, while still skipping some events, over random
+        geometries"""
+        antenna = DipoleAntenna(name="ant", position=(0, 0, -200),
+                                center_frequency=250e6, bandwidth=300e6,
+                                resistance=100, trigger_threshold=3e-5,
+                                noisy=False)
+        kernel = EventKernel(generator=None, antennas=[antenna])
+        lazy_kernel = EventKernel(generator=None, antennas=[antenna],
+                                  pretrigger=True)
+        np.random.seed(SEED)
+        n_triggered = 0
+        n_skipped = 0
+        for _ in range(40):
+            rho = np.random.uniform(0, 3000)
+            phi = np.random.uniform(0, 2*np.pi)
+            vertex = [rho*np.cos(phi), rho*np.sin(phi),
+                      -np.random.uniform(100, 2500)]
+            direction = np.random.normal(size=3)
+            direction /= np.linalg.norm(direction)
+            particle = Particle(vertex=vertex, direction=direction,
+                                energy=10**np.random.uniform(7, 11))
+            antenna.clear()
+            kernel.process_particle(particle)
+            triggered = antenna.is_hit
+            antenna.clear()
+            lazy_kernel.process_particle(particle)
+            if triggered:
+                assert not lazy_kernel.below_threshold
+            n_triggered += triggered
+            n_skipped += lazy_kernel.below_threshold
+        assert n_triggered > 0
+        assert n_skipped > 0
+
+    def test_event_ray_trace_table(self, kernel):
+        """Test that the event method runs smoothly with a ray trace table
+        as the ray tracer"""
+        kernel.ray_tracer = RayTraceTable(antenna_depths=[-100],
+                                          rhos=np.linspace(0, 400, 5),
+                                          depths=np.linspace(-600, -400, 3),
+                                          ice_model=kernel.ice,
+                                          accuracy=1e-2)
+        kernel.event()
+        for ant in kernel.antennas:
+            assert len(ant.signals) == 2
+
+    def test_event_ray_tracer_cache(self, kernel):
+        """Test that the event method runs smoothly with a ray tracer cache
+        as the ray tracer"""
+        kernel.ray_tracer = RayTracerCache()
+        kernel.event()
+        kernel.event()
+        assert kernel.ray_tracer.misses == 1
+        assert kernel.ray_tracer.hits == 1
+        for ant in kernel.antennas:
+            assert len(ant.signals) == 4
+
+    def test_event_shadow_zone_table(self, kernel):
+        """Test that the event method runs smoothly with a shadow zone table
+        as the ray tracer, and skips unreachable antennas"""
+        kernel.ray_tracer = ShadowZoneTable(antenna_depths=[-100],
+                                            depths=np.linspace(-1000, 0, 11),
+                                            ice_model=kernel.ice)
+        kernel.event()
+        for ant in kernel.antennas:
+            assert len(ant.signals) == 2
+        kernel.gen = ListGenerator(Particle(vertex=[5000, 0, -500],
+                                            direction=[0, 0, 1],
+                                            energy=1e9))
+        kernel.event()
+        for ant in kernel.antennas:
+            assert len(ant.signals) == 2
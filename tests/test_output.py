@@ -0,0 +1,320 @@
+"""File containing tests of pyrex output module"""
+
+import pytest
+
+from config import SEED
+
+from pyrex.antenna import Antenna
+from pyrex.particle import Particle, ParticleBatch, ListGenerator
+from pyrex.kernel import EventKernel
+import pyrex.output
+from pyrex.output import EventWriter, event_record, read_events
+
+import numpy as np
+
+
+
+@pytest.fixture
+def antennas():
+    """Fixture for forming a list of antennas, one of which can't trigger"""
+    ants = [Antenna(position=(0, 0, -100), noisy=False),
+            Antenna(position=(0, 0, -150), noisy=False)]
+    ants[1].trigger = lambda signal: False
+    return ants
+
+@pytest.fixture
+def kernel(antennas):
+    """Fixture for forming an EventKernel with two particles"""
+    gen = ListGenerator([Particle(vertex=[100, 200, -500],
+                                  direction=[0, 0, 1], energy=1e9),
+                         Particle(vertex=[5000, 0, -500],
+                                  direction=[0, 0, 1], energy=1e9)])
+    return EventKernel(generator=gen, antennas=antennas)
+
+
+class Test_event_record:
+    """Tests for event_record function"""
+    def test_record(self, kernel):
+        """Test that the event record contains the particle, ray solution,
+        trigger, and waveform information"""
+        particle = kernel.gen.create_particle()
+        ray_tracers = kernel.process_particle(particle)
+        record = event_record(particle, kernel.antennas, ray_tracers)
+        assert np.array_equal(record['vertex'], [100, 200, -500])
+        assert record['energy'] == 1e9
+        assert record['interaction'] == -1
+        assert record['weight'] == 1
+        assert np.array_equal(record['triggered'], [True, False])
+        assert record['path_length'].shape == (2, 2)
+        assert np.all(record['path_length'] > 0)
+        assert (record['path_length'][0, 0] ==
+                ray_tracers[0].solutions[0].path_length)
+        assert record['emitted_direction'].shape == (2, 2, 3)
+        assert len(record['waveforms']) == 4
+        antenna, triggered, t0, dt, values = record['waveforms'][2]
+        assert antenna == 1
+        assert not triggered
+        assert t0 == kernel.antennas[1].all_waveforms[0].times[0]
+        assert np.array_equal(values,
+                              kernel.antennas[1].all_waveforms[0].values)
+
+    def test_no_solutions(self, kernel):
+        """Test that missing ray solutions are recorded as nan"""
+        kernel.gen.create_particle()
+        particle = kernel.gen.create_particle()
+        ray_tracers = kernel.process_particle(particle)
+        record = event_record(particle, kernel.antennas, ray_tracers)
+        assert np.all(np.isnan(record['path_length']))
+        assert not np.any(record['triggered'])
+        assert len(record['waveforms']) == 0
+
+    def test_waveform_options(self, kernel):
+        """Test that waveforms are only recorded when requested"""
+        particle = kernel.gen.create_particle()
+        ray_tracers = kernel.process_particle(particle)
+        record = event_record(particle, kernel.antennas, ray_tracers,
+                              waveforms=None)
+        assert len(record['waveforms']) == 0
+        record = event_record(particle, kernel.antennas, ray_tracers,
+                              waveforms="triggered")
+        assert len(record['waveforms']) == 4
+        for ant in kernel.antennas:
+            ant.clear()
+            ant.trigger = lambda signal: False
+        ray_tracers = kernel.process_particle(particle)
+        record = event_record(particle, kernel.antennas, ray_tracers,
+                              waveforms="triggered")
+        assert len(record['waveforms']) == 0
+        record = event_record(particle, kernel.antennas, ray_tracers,
+                              waveforms="all")
+        assert len(record['waveforms']) == 4
+        with pytest.raises(ValueError):
+            event_record(particle, kernel.antennas, ray_tracers,
+                         waveforms="some")
+
+
+class TestEventWriter:
+    """Tests for EventWriter class"""
+    def test_creation(self, antennas, tmpdir):
+        """Test initialization of the writer"""
+        writer = EventWriter(str(tmpdir.join("events.h5")), antennas,
+                             backend="npz")
+        assert writer.backend == "npz"
+        assert writer.buffer_size == 1000
+        assert writer.waveforms == "triggered"
+        assert writer.events_written == 0
+        with pytest.raises(ValueError):
+            EventWriter(str(tmpdir.join("events.h5")), antennas,
+                        backend="csv")
+        with pytest.raises(ValueError):
+            EventWriter(str(tmpdir.join("events.h5")), antennas,
+                        backend="npz", waveforms="some")
+
+    @pytest.mark.skipif(pyrex.output.__h5py_available__,
+                        reason="h5py is available")
+    def test_hdf5_unavailable(self, antennas, tmpdir):
+        """Test that the HDF5 backend requires h5py"""
+        with pytest.raises(ImportError):
+            EventWriter(str(tmpdir.join("events.h5")), antennas,
+                        backend="hdf5")
+
+    @pytest.mark.parametrize("backend", [
+        "npz",
+        pytest.param("hdf5", marks=pytest.mark.skipif(
+            not pyrex.output.__h5py_available__,
+            reason="h5py is not available"
+        )),
+    ])
+    @pytest.mark.parametrize("compression", [None, "gzip"])
+    def test_kernel_events(self, kernel, tmpdir, backend, compression):
+        """Test that events written by the kernel are read back"""
+        filename = str(tmpdir.join("events.h5"))
+        writer = EventWriter(filename, kernel.antennas, backend=backend,
+                             buffer_size=2, compression=compression,
+                             waveforms="all")
+        kernel.writer = writer
+        for _ in range(3):
+            for ant in kernel.antennas:
+                ant.clear()
+            kernel.event()
+        assert writer.events_written == 2
+        assert writer.events_buffered == 3
+        writer.close()
+        assert writer.events_written == 3
+        if backend=="npz":
+            assert writer.shards_written == 2
+        events = read_events(filename)
+        assert np.array_equal(events['event'], [0, 1, 2])
+        assert np.array_equal(events['vertex'][1], [5000, 0, -500])
+        assert events['triggered'].shape == (3, 2)
+        assert np.array_equal(events['triggered'][:, 0], [True, False, True])
+        assert np.all(np.isnan(events['path_length'][1]))
+        assert np.array_equal(events['waveform_event'], [0]*4 + [2]*4)
+        assert np.array_equal(events['waveform_antenna'], [0, 0, 1, 1]*2)
+        assert (len(events['waveform_values']) ==
+                np.sum(events['waveform_length']))
+        i = 6
+        offset = events['waveform_offset'][i]
+        length = events['waveform_length'][i]
+        expected = kernel.antennas[1].all_waveforms[0]
+        assert np.array_equal(events['waveform_values'][offset:offset+length],
+                              expected.values)
+        assert events['waveform_t0'][i] == expected.times[0]
+        assert events['waveform_dt'][i] == pytest.approx(expected.dt)
+
+    def test_triggered_waveforms(self, kernel, tmpdir):
+        """Test that only waveforms of triggered events are written by
+        default"""
+        filename = str(tmpdir.join("events.h5"))
+        with EventWriter(filename, kernel.antennas, backend="npz") as writer:
+            kernel.writer = writer
+            kernel.run(3, seed=SEED)
+        events = read_events(filename, backend="npz")
+        assert np.array_equal(events['event'], [0, 1, 2])
+        assert np.array_equal(events['waveform_event'], [0]*4 + [2]*4)
+
+    def test_run_workers(self, kernel, tmpdir):
+        """Test that events written during a run with multiple workers match
+        those of a serial run"""
+        serial = str(tmpdir.join("serial.h5"))
+        with EventWriter(serial, kernel.antennas, backend="npz",
+                         waveforms="all") as writer:
+            kernel.writer = writer
+            kernel.run(3, seed=SEED)
+        kernel.gen = ListGenerator(kernel.gen.particles)
+        parallel = str(tmpdir.join("parallel.h5"))
+        with EventWriter(parallel, kernel.antennas, backend="npz",
+                         waveforms="all") as writer:
+            kernel.writer = writer
+            kernel.run(3, workers=2, seed=SEED)
+        serial_events = read_events(serial, backend="npz")
+        parallel_events = read_events(parallel, backend="npz")
+        assert set(serial_events.keys()) == set(parallel_events.keys())
+        for key in serial_events:
+            np.testing.assert_array_equal(serial_events[key],
+                                          parallel_events[key])
+
+    def test_run_particle_batch(self, kernel, tmpdir):
+        """Test that the interactions and weights of a particle batch run by
+        the kernel are written"""
+        batch = ParticleBatch.from_particles(kernel.gen.particles)
+        batch.interactions[:] = [1, 2]
+        batch.weights[:] = [0.5, 0.25]
+        filename = str(tmpdir.join("events.h5"))
+        with EventWriter(filename, kernel.antennas, backend="npz") as writer:
+            kernel.writer = writer
+            kernel.run_particles(batch, seed=SEED)
+        events = read_events(filename, backend="npz")
+        assert np.array_equal(events['interaction'], [1, 2])
+        assert np.array_equal(events['weight'], [0.5, 0.25])
+
+    def test_run_results(self, kernel, tmpdir):
+        """Test that runs with a writer only return their results in memory
+        if requested"""
+        filename = str(tmpdir.join("events.h5"))
+        with EventWriter(filename, kernel.antennas, backend="npz") as writer:
+            kernel.writer = writer
+            assert kernel.run(2, seed=SEED) is None
+            kernel.gen = ListGenerator(kernel.gen.particles)
+            assert kernel.run(2, workers=2, seed=SEED) is None
+            kernel.gen = ListGenerator(kernel.gen.particles)
+            results = kernel.run(2, seed=SEED, return_results=True)
+            assert len(results) == 2
+        kernel.writer = None
+        kernel.gen = ListGenerator(kernel.gen.particles)
+        assert kernel.run(2, seed=SEED, return_results=False) is None
+
+    def test_resume(self, kernel, tmpdir):
+        """Test that events written by an interrupted and resumed run match
+        those of an uninterrupted run, without duplicated or skipped
+        events"""
+        full = str(tmpdir.join("full.h5"))
+        with EventWriter(full, kernel.antennas, backend="npz",
+                         buffer_size=1, waveforms="all") as writer:
+            kernel.writer = writer
+            kernel.run(5, seed=SEED)
+        gen = ListGenerator(kernel.gen.particles)
+        create_particle = gen.create_particle
+        def interrupted_create_particle():
+            if gen.get_state()['index']>=2:
+                raise KeyboardInterrupt
+            return create_particle()
+        gen.create_particle = interrupted_create_particle
+        kernel.gen = gen
+        resumed = str(tmpdir.join("resumed.h5"))
+        checkpoint = str(tmpdir.join("run.ckpt"))
+        kernel.writer = EventWriter(resumed, kernel.antennas, backend="npz",
+                                    buffer_size=1, waveforms="all")
+        with pytest.raises(KeyboardInterrupt):
+            kernel.run(5, seed=SEED, checkpoint=checkpoint,
+                       checkpoint_interval=2)
+        assert np.array_equal(read_events(resumed)['event'], [0, 1, 2])
+        kernel.gen = ListGenerator(kernel.gen.particles)
+        with EventWriter(resumed, kernel.antennas, backend="npz",
+                         buffer_size=1, waveforms="all") as writer:
+            kernel.writer = writer
+            assert kernel.resume(checkpoint) is None
+        full_events = read_events(full, backend="npz")
+        resumed_events = read_events(resumed, backend="npz")
+        assert np.array_equal(resumed_events['event'], [0, 1, 2, 3, 4])
+        assert set(full_events.keys()) == set(resumed_events.keys())
+        for key in full_events:
+            np.testing.assert_array_equal(full_events[key],
+                                          resumed_events[key])
+
+    def test_overwrite(self, kernel, tmpdir):
+        """Test that a new writer replaces the shards of an earlier run with
+        the same filename"""
+        filename = str(tmpdir.join("events.h5"))
+        with EventWriter(filename, kernel.antennas, backend="npz",
+                         buffer_size=1) as writer:
+            kernel.writer = writer
+            kernel.event()
+            kernel.event()
+        assert len(read_events(filename, backend="npz")['event']) == 2
+        kernel.gen = ListGenerator(kernel.gen.particles)
+        with EventWriter(filename, kernel.antennas, backend="npz",
+                         buffer_size=1) as writer:
+            kernel.writer = writer
+            kernel.event()
+        assert len(read_events(filename, backend="npz")['event']) == 1
+        assert not tmpdir.join("events_00001.npz").check()
+        EventWriter(filename, kernel.antennas, backend="npz").close()
+        assert not tmpdir.join("events_00000.npz").check()
+
+    def test_state(self, kernel, tmpdir):
+        """Test that setting the writer state discards later shards"""
+        filename = str(tmpdir.join("events.h5"))
+        writer = EventWriter(filename, kernel.antennas, backend="npz",
+                             buffer_size=1)
+        kernel.writer = writer
+        kernel.event()
+        state = writer.get_state()
+        assert state['events_written'] == 1
+        assert state['shards_written'] == 1
+        kernel.event()
+        kernel.event()
+        writer.set_state(state)
+        assert writer.events_written == 1
+        assert np.array_equal(read_events(filename)['event'], [0])
+
+    def test_add_particles(self, antennas, tmpdir):
+        """Test that a particle batch can be written without antenna
+        information"""
+        filename = str(tmpdir.join("particles.h5"))
+        batch = ParticleBatch(vertices=[[0, 0, -100], [0, 0, -200]],
+                              directions=[[0, 0, 1], [1, 0, 0]],
+                              energies=[1e8, 1e9], weights=[0.5, 0.25])
+        with EventWriter(filename, antennas, backend="npz") as writer:
+            writer.add_particles(batch, indices=[10, 11])
+        events = read_events(filename, backend="npz")
+        assert np.array_equal(events['event'], [10, 11])
+        assert np.array_equal(events['vertex'], batch.vertices)
+        assert np.array_equal(events['weight'], [0.5, 0.25])
+        assert not np.any(events['triggered'])
+        assert len(events['waveform_values']) == 0
+
+    def test_missing_files(self, tmpdir):
+        """Test that reading events without any files raises an error"""
+        with pytest.raises(IOError):
+            read_events(str(tmpdir.join("events.h5")), backend="npz")
@@ -4,8 +4,10 @@ import pytest
 
 from config import SEED
 
-from pyrex.particle import (CC_NU, Particle, random_direction,
-                            ShadowGenerator, ListGenerator, FileGenerator)
+from pyrex.earth_model import SlantDepthTable
+from pyrex.particle import (CC_NU, Particle, ParticleBatch, random_direction,
+                            random_directions, ShadowGenerator, ListGenerator,
+                            FileGenerator, StreamingFileGenerator)
 
 import numpy as np
 
@@ -62,6 +64,89 @@ class TestParticle:
 
 
 
+@pytest.fixture
+def particle_batch():
+    """Fixture for forming basic ParticleBatch object"""
+    return ParticleBatch(vertices=[[100, 200, -500], [0, 0, -100],
+                                   [-100, -100, -300]],
+                         directions=[[0, 0, 1], [0, 1, 1], [1, 0, 0]],
+                         energies=[1e9, 1e8, 1e10])
+
+class TestParticleBatch:
+    """Tests for ParticleBatch class"""
+    def test_creation(self, particle_batch):
+        """Test initialization of particle batch"""
+        assert len(particle_batch) == 3
+        assert particle_batch.vertices.shape == (3, 3)
+        assert particle_batch.directions.shape == (3, 3)
+        assert np.array_equal(particle_batch.vertices[0], [100, 200, -500])
+        assert np.array_equal(particle_batch.energies, [1e9, 1e8, 1e10])
+        assert np.array_equal(particle_batch.interactions, [-1, -1, -1])
+        assert np.array_equal(particle_batch.weights, [1, 1, 1])
+
+    def test_direction_normalization(self, particle_batch):
+        """Test that the particle directions are automatically normalized"""
+        assert np.allclose(particle_batch.directions[1],
+                           [0, 1/np.sqrt(2), 1/np.sqrt(2)])
+
+    def test_bad_lengths(self):
+        """Test that mismatched array lengths raise an error"""
+        with pytest.raises(ValueError):
+            ParticleBatch(vertices=[[0, 0, 0], [0, 0, -100]],
+                          directions=[[0, 0, 1]], energies=[1e9, 1e9])
+        with pytest.raises(ValueError):
+            ParticleBatch(vertices=[[0, 0, 0]], directions=[[0, 0, 1]],
+                          energies=[1e9], weights=[1, 2])
+
+    def test_row_view(self, particle_batch):
+        """Test that indexing a batch by an integer gives a particle which
+        views the batch arrays"""
+        particle = particle_batch[1]
+        assert isinstance(particle, Particle)
+        assert np.array_equal(particle.vertex, [0, 0, -100])
+        assert particle.energy == 1e8
+        assert particle.interaction == -1
+        assert particle.weight == 1
+        particle.vertex[2] = -200
+        assert particle_batch.vertices[1, 2] == -200
+        batch = ParticleBatch(vertices=[[0, 0, -100]], directions=[[0, 0, 1]],
+                              energies=[1e9], interactions=[2], weights=[0.5])
+        assert batch[0].interaction == 2
+        assert batch[0].weight == 0.5
+        roundtrip = ParticleBatch.from_particles(batch)
+        assert np.array_equal(roundtrip.interactions, [2])
+        assert np.array_equal(roundtrip.weights, [0.5])
+
+    def test_slicing(self, particle_batch):
+        """Test that slicing a batch gives a batch"""
+        sliced = particle_batch[1:]
+        assert isinstance(sliced, ParticleBatch)
+        assert len(sliced) == 2
+        assert np.array_equal(sliced.energies, [1e8, 1e10])
+        masked = particle_batch[particle_batch.energies>1e8]
+        assert np.array_equal(masked.energies, [1e9, 1e10])
+
+    def test_iteration(self, particle_batch):
+        """Test iterating over the particles of a batch"""
+        energies = [p.energy for p in particle_batch]
+        assert energies == [1e9, 1e8, 1e10]
+
+    def test_from_particles(self, particle):
+        """Test creating a batch from Particle objects"""
+        batch = ParticleBatch.from_particles([particle, particle])
+        assert len(batch) == 2
+        assert np.array_equal(batch.vertices[1], particle.vertex)
+        assert np.array_equal(batch.directions[1], particle.direction)
+        assert len(ParticleBatch.from_particles([])) == 0
+
+    def test_concatenate(self, particle_batch):
+        """Test joining batches"""
+        batch = ParticleBatch.concatenate([particle_batch, particle_batch[:1]])
+        assert len(batch) == 4
+        assert np.array_equal(batch.energies, [1e9, 1e8, 1e10, 1e9])
+
+
+
 class Test_random_direction:
     """Tests for random_direction function"""
     def test_unit_vector(self):
@@ -91,6 +176,25 @@ class Test_random_direction:
 
 
 
+class Test_random_directions:
+    """Tests for random_directions function"""
+    def test_unit_vectors(self):
+        """Test that the directions are unit vectors"""
+        np.random.seed(SEED)
+        vs = random_directions(10)
+        assert vs.shape == (10, 3)
+        assert np.allclose(np.linalg.norm(vs, axis=1), 1)
+
+    def test_uniform(self):
+        """Test that the random directions are uniform on the unit sphere"""
+        np.random.seed(SEED)
+        vs = random_directions(10000)
+        for i in range(3):
+            assert np.mean(vs[:, i]) == pytest.approx(0, abs=0.01)
+            assert np.std(vs[:, i]) == pytest.approx(2/np.sqrt(12), rel=0.01)
+
+
+
 class TestShadowGenerator:
     """Tests for ShadowGenerator class"""
     def test_creation(self):
@@ -122,6 +226,57 @@ class TestShadowGenerator:
         particle = generator.create_particle()
         assert isinstance(particle, Particle)
 
+    def test_create_particles(self):
+        """Test that create_particles method returns an array of particles
+        within the generation volume"""
+        np.random.seed(SEED)
+        generator = ShadowGenerator(dx=5000, dy=5000, dz=3000,
+                                    energy=lambda: 1e9)
+        particles = generator.create_particles(100)
+        assert isinstance(particles, ParticleBatch)
+        assert len(particles) == 100
+        assert particles.vertices.shape == (100, 3)
+        assert particles.directions.shape == (100, 3)
+        assert np.all(particles.energies == 1e9)
+        assert np.all(np.abs(particles.vertices[:, 0]) <= 2500)
+        assert np.all(np.abs(particles.vertices[:, 1]) <= 2500)
+        assert np.all(particles.vertices[:, 2] >= -3000)
+        assert np.all(particles.vertices[:, 2] <= 0)
+        assert np.allclose(np.linalg.norm(particles.directions, axis=1), 1)
+        assert generator.count >= 100
+
+    def test_state(self):
+        """Test that the generator count can be saved and restored"""
+        generator = ShadowGenerator(dx=5000, dy=5000, dz=3000,
+                                    energy=lambda: 1e9)
+        generator.count = 5
+        state = generator.get_state()
+        generator.count = 10
+        generator.set_state(state)
+        assert generator.count == 5
+
+    def test_slant_depth_table(self):
+        """Test that the generator can use a slant depth table for the
+        shadowing calculation"""
+        np.random.seed(SEED)
+        generator = ShadowGenerator(dx=5000, dy=5000, dz=3000,
+                                    energy=lambda: 1e10,
+                                    slant_depth=SlantDepthTable())
+        particle = generator.create_particle()
+        assert isinstance(particle, Particle)
+        generator.create_particles(1000)
+        assert (generator.count-1)/1000 == pytest.approx(2, rel=0.1)
+
+    def test_create_particles_shadowing(self):
+        """Test that create_particles shadows particles at about the same
+        rate as create_particle"""
+        np.random.seed(SEED)
+        generator = ShadowGenerator(dx=5000, dy=5000, dz=3000,
+                                    energy=lambda: 1e10)
+        generator.create_particles(1000)
+        # Only about half of particles (those going upward) survive
+        assert generator.count/1000 == pytest.approx(2, rel=0.1)
+
 
 
 class TestListGenerator:
@@ -158,6 +313,37 @@ class TestListGenerator:
         with pytest.raises(StopIteration):
             generator.create_particle()
 
+    def test_create_particles(self, particle):
+        """Test that create_particles method pulls batches from the list"""
+        particle2 = Particle(vertex=[0, 0, 0], direction=[0, 0, -1], energy=1e8)
+        generator = ListGenerator([particle, particle2])
+        batch = generator.create_particles(3)
+        assert isinstance(batch, ParticleBatch)
+        assert np.array_equal(batch.energies, [1e9, 1e8, 1e9])
+        assert generator.create_particle() == particle2
+        generator = ListGenerator([particle, particle2], loop=False)
+        assert len(generator.create_particles(3)) == 2
+        with pytest.raises(StopIteration):
+            generator.create_particles(1)
+
+    def test_state(self, particle):
+        """Test that the generator position can be saved and restored"""
+        particle2 = Particle(vertex=[0, 0, 0], direction=[0, 0, -1], energy=1e9)
+        generator = ListGenerator([particle, particle2])
+        generator.create_particle()
+        state = generator.get_state()
+        assert generator.create_particle() == particle2
+        generator = ListGenerator([particle, particle2])
+        generator.set_state(state)
+        assert generator.create_particle() == particle2
+
+    def test_particle_batch(self, particle_batch):
+        """Test that a ParticleBatch can be used as the list"""
+        generator = ListGenerator(particle_batch, loop=False)
+        assert generator.create_particle().energy == 1e9
+        batch = generator.create_particles(5)
+        assert np.array_equal(batch.energies, [1e8, 1e10])
+
 
 
 test_vertices = [(0, 0, 0), (0, 0, -100), (-100, -100, -300), (100, 200, -500)]
@@ -201,6 +387,33 @@ class TestFileGenerator:
         with pytest.raises(StopIteration):
             file_gen.create_particle()
 
+    def test_create_particles(self, file_gen, tmpdir):
+        """Test that create_particles method pulls batches across files"""
+        assert file_gen.create_particle().energy == test_energies[0]
+        batch = file_gen.create_particles(2)
+        assert isinstance(batch, ParticleBatch)
+        assert np.array_equal(batch.vertices, test_vertices[1:3])
+        batch = file_gen.create_particles(5)
+        assert np.array_equal(batch.vertices, test_vertices[3:])
+        with pytest.raises(StopIteration):
+            file_gen.create_particles(1)
+
+    def test_state(self, file_gen, tmpdir):
+        """Test that the generator position can be saved and restored across
+        files"""
+        states = []
+        for i in range(4):
+            states.append(file_gen.get_state())
+            file_gen.create_particle()
+        states.append(file_gen.get_state())
+        for i in [3, 1, 2, 0]:
+            file_gen.set_state(states[i])
+            batch = file_gen.create_particles(4)
+            assert np.array_equal(batch.vertices, test_vertices[i:])
+        file_gen.set_state(states[4])
+        with pytest.raises(StopIteration):
+            file_gen.create_particle()
+
     def test_bad_files(self, tmpdir):
         """Test that appropriate errors are raised when bad files are passed"""
         np.savez(str(tmpdir.join("bad_particles_1.npz")),
@@ -212,3 +425,112 @@ class TestFileGenerator:
                  [(0, 0, 0), (0, 0, -100)], [(0, 0, -1), (0, 0, 1)], [1e9])
         with pytest.raises(ValueError):
             gen = FileGenerator(str(tmpdir.join("bad_particles_2.npz")))
+
+
+
+@pytest.fixture
+def stream_files(tmpdir):
+    """Fixture for creating temporary uncompressed, compressed, and .npy
+    particle files (once per test)"""
+    np.savez(str(tmpdir.join("stream_particles_1.npz")),
+             vertices=test_vertices[:2], directions=test_directions[:2],
+             energies=test_energies[:2])
+    np.savez_compressed(str(tmpdir.join("stream_particles_2.npz")),
+                        test_vertices[2:3], test_directions[2:3],
+                        test_energies[2:3])
+    names = ["stream_vertices.npy", "stream_directions.npy",
+             "stream_energies.npy"]
+    for name, values in zip(names, [test_vertices[3:], test_directions[3:],
+                                    test_energies[3:]]):
+        np.save(str(tmpdir.join(name)), values)
+    return [str(tmpdir.join("stream_particles_1.npz")),
+            str(tmpdir.join("stream_particles_2.npz")),
+            tuple(str(tmpdir.join(name)) for name in names)]
+
+class TestStreamingFileGenerator:
+    """Tests for StreamingFileGenerator class"""
+    @pytest.mark.parametrize("prefetch", [True, False])
+    @pytest.mark.parametrize("chunk_size", [1, 3, 100])
+    def test_create_particle(self, stream_files, prefetch, chunk_size):
+        """Test that create_particle method loops over files correctly"""
+        generator = StreamingFileGenerator(stream_files, prefetch=prefetch,
+                                           chunk_size=chunk_size)
+        assert len(generator) == 4
+        for i in range(4):
+            particle = generator.create_particle()
+            expected = Particle(vertex=test_vertices[i],
+                                direction=test_directions[i],
+                                energy=test_energies[i])
+            assert np.array_equal(particle.vertex, expected.vertex)
+            assert np.array_equal(particle.direction, expected.direction)
+            assert particle.energy == expected.energy
+        with pytest.raises(StopIteration):
+            generator.create_particle()
+
+    @pytest.mark.parametrize("prefetch", [True, False])
+    def test_create_particles(self, stream_files, prefetch):
+        """Test that create_particles method pulls batches across files"""
+        generator = StreamingFileGenerator(stream_files, prefetch=prefetch,
+                                           chunk_size=2)
+        batch = generator.create_particles(3)
+        assert isinstance(batch, ParticleBatch)
+        assert np.array_equal(batch.vertices, test_vertices[:3])
+        batch = generator.create_particles(3)
+        assert np.array_equal(batch.vertices, test_vertices[3:])
+        with pytest.raises(StopIteration):
+            generator.create_particles(1)
+
+    @pytest.mark.parametrize("shards", [1, 2, 3, 4])
+    def test_shards(self, stream_files, shards):
+        """Test that the shards split the rows without overlap"""
+        vertices = []
+        for shard in range(shards):
+            generator = StreamingFileGenerator(stream_files, chunk_size=1,
+                                               shard=shard, shards=shards)
+            assert len(generator) in [4//shards, 4//shards+1]
+            for i in range(len(generator)):
+                vertices.append(generator.create_particle().vertex)
+            with pytest.raises(StopIteration):
+                generator.create_particle()
+        assert np.array_equal(vertices, test_vertices)
+        with pytest.raises(ValueError):
+            StreamingFileGenerator(stream_files, shard=shards, shards=shards)
+
+    @pytest.mark.parametrize("prefetch", [True, False])
+    def test_state(self, stream_files, prefetch):
+        """Test that the generator position can be saved and restored"""
+        generator = StreamingFileGenerator(stream_files, prefetch=prefetch,
+                                           chunk_size=3)
+        generator.create_particle()
+        state = generator.get_state()
+        generator.create_particles(2)
+        generator.set_state(state)
+        batch = generator.create_particles(3)
+        assert np.array_equal(batch.vertices, test_vertices[1:])
+        generator = StreamingFileGenerator(stream_files, prefetch=prefetch,
+                                           chunk_size=1, shard=1, shards=2)
+        generator.set_state(state)
+        assert np.array_equal(generator.create_particle().vertex,
+                              test_vertices[3])
+        generator.close()
+
+    def test_close(self, stream_files):
+        """Test that closing the generator stops prefetching"""
+        generator = StreamingFileGenerator(stream_files, chunk_size=1)
+        generator.create_particle()
+        generator.close()
+        with pytest.raises(StopIteration):
+            for _ in range(4):
+                generator.create_particle()
+
+    def test_bad_files(self, tmpdir):
+        """Test that appropriate errors are raised when bad files are passed"""
+        np.savez(str(tmpdir.join("bad_particles_1.npz")),
+                 some=[(0, 0, 0), (0, 0, -100)], bad=[(0, 0, -1), (0, 0, 1)],
+                 keys=[1e9]*2)
+        with pytest.raises(KeyError):
+            StreamingFileGenerator(str(tmpdir.join("bad_particles_1.npz")))
+        np.savez(str(tmpdir.join("bad_particles_2.npz")),
+                 [(0, 0, 0), (0, 0, -100)], [(0, 0, -1), (0, 0, 1)], [1e9])
+        with pytest.raises(ValueError):
+            StreamingFileGenerator(str(tmpdir.join("bad_particles_2.npz")))
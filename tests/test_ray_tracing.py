@@ -4,7 +4,10 @@ import pytest
 
 from pyrex.ray_tracing import (BasicRayTracer, BasicRayTracePath,
                                SpecializedRayTracer, SpecializedRayTracePath,
-                               PathFinder)
+                               BatchRayTracer, TabulatedRayTracer,
+                               TabulatedRayTracePath, RayTraceTable,
+                               RayTracerCache, UnreachableRayTracer,
+                               ShadowZoneTable, PathFinder)
 from pyrex.ice_model import AntarcticIce, IceModel
 
 import numpy as np
@@ -422,6 +425,19 @@ class TestSpecializedRayTracePath:
                                  +ray_tracer3.solutions):
             assert path.tof == pytest.approx(expected[i], rel=rel)
 
+    def test_coordinates(self, ray_tracer, ray_tracer2, ray_tracer3,
+                         absol=1e-6):
+        """Test that coordinates of paths from ray_tracer go from the
+        launching point to the receiving point"""
+        for path in (ray_tracer.solutions+ray_tracer2.solutions
+                     +ray_tracer3.solutions):
+            xs, ys, zs = path.coordinates
+            assert len(xs) == len(ys) == len(zs)
+            assert np.allclose([xs[0], ys[0], zs[0]], path.from_point,
+                               atol=absol)
+            assert np.allclose([xs[-1], ys[-1], zs[-1]], path.to_point,
+                               atol=absol)
+
     @pytest.mark.parametrize("frequency", [1e3, 1e4 ,1e5, 1e6, 1e7, 1e8, 1e9])
     def test_attenuation(self, frequency, ray_tracer, ray_tracer2, ray_tracer3,
                          rel=1e-6):
@@ -502,6 +518,13 @@ class TestBasicRayTracePath(TestSpecializedRayTracePath):
         super().test_tof(basic_ray_tracer, basic_ray_tracer2,
                          basic_ray_tracer3, rel=0.01)
 
+    def test_coordinates(self, basic_ray_tracer, basic_ray_tracer2,
+                         basic_ray_tracer3):
+        """Test that coordinates of paths from ray_tracer go from the
+        launching point to the receiving point"""
+        super().test_coordinates(basic_ray_tracer, basic_ray_tracer2,
+                                 basic_ray_tracer3, absol=10)
+
     @pytest.mark.parametrize("frequency", [1e3, 1e4 ,1e5, 1e6, 1e7, 1e8, 1e9])
     def test_attenuation(self, frequency, basic_ray_tracer, basic_ray_tracer2,
                          basic_ray_tracer3):
@@ -510,6 +533,336 @@ class TestBasicRayTracePath(TestSpecializedRayTracePath):
                                  basic_ray_tracer3, rel=0.075)
 
 
+class TestInterpolatedAttenuation:
+    """Tests for "interpolated" attenuation_mode of SpecializedRayTracePath"""
+    def test_matches_numerical(self, ray_tracer, ray_tracer2, ray_tracer3):
+        """Test that interpolated attenuation matches the numerical
+        attenuation"""
+        freqs = np.fft.fftfreq(n=200, d=1e-10)
+        for path in (ray_tracer.solutions+ray_tracer2.solutions
+                     +ray_tracer3.solutions):
+            expected = path.attenuation(freqs)
+            path.attenuation_mode = "interpolated"
+            assert np.allclose(path.attenuation(freqs), expected,
+                               rtol=1e-3, atol=1e-5)
+
+    def test_memoization(self, ray_tracer):
+        """Test that attenuation is memoized for each set of frequencies"""
+        path = ray_tracer.solutions[0]
+        path.attenuation_mode = "interpolated"
+        freqs = np.fft.fftfreq(n=200, d=1e-10)
+        attenuation = path.attenuation(freqs)
+        assert path.attenuation(freqs) is attenuation
+        assert path.attenuation(freqs[:100]) is not attenuation
+        with pytest.raises(ValueError):
+            attenuation[0] = 0
+
+    def test_zero_frequency(self, ray_tracer):
+        """Test that there is no attenuation at zero frequency"""
+        path = ray_tracer.solutions[0]
+        path.attenuation_mode = "interpolated"
+        assert path.attenuation(0)[0] == 1
+
+    def test_bad_mode(self, ray_tracer):
+        """Test that an invalid attenuation_mode raises an error"""
+        path = ray_tracer.solutions[0]
+        path.attenuation_mode = "bad"
+        with pytest.raises(ValueError):
+            path.attenuation(1e8)
+
+
+
+@pytest.fixture
+def batch_tracer():
+    """Fixture for forming basic BatchRayTracer object"""
+    return BatchRayTracer(from_points=[[100, 200, -500], [100, 1000, -200],
+                                       [0, 0, -1500], [500, 500, -100],
+                                       [100, 200, 100]],
+                          to_points=[[0, 0, -100], [-100, -100, -300]],
+                          ice_model=IceModel)
+
+class TestBatchRayTracer:
+    """Tests for BatchRayTracer class"""
+    def test_creation(self, batch_tracer):
+        """Test initialization of batch_tracer"""
+        assert batch_tracer.from_points.shape == (5, 3)
+        assert batch_tracer.to_points.shape == (2, 3)
+        assert batch_tracer.ice == IceModel
+        assert batch_tracer.dz == 1
+        assert batch_tracer.shape == (5, 2)
+        assert batch_tracer._static_attrs == ['from_points', 'to_points',
+                                              'ice', 'dz']
+
+    def test_result_shapes(self, batch_tracer):
+        """Test that the results have the expected shapes"""
+        assert batch_tracer.exists.shape == (5, 2)
+        assert batch_tracer.expected_solutions.shape == (5, 2, 3)
+        assert batch_tracer.solution_exists.shape == (5, 2, 3)
+        assert batch_tracer.launch_angles.shape == (5, 2, 3)
+        assert batch_tracer.tof.shape == (5, 2, 3)
+        assert batch_tracer.path_length.shape == (5, 2, 3)
+        assert batch_tracer.emitted_direction.shape == (5, 2, 3, 3)
+        assert batch_tracer.received_direction.shape == (5, 2, 3, 3)
+
+    def test_matches_ray_tracer(self, batch_tracer):
+        """Test that the batch results match the SpecializedRayTracer
+        results for each pair of points within 0.01% (limited by rounding
+        noise in the r distance functions near the roots)"""
+        for i, from_point in enumerate(batch_tracer.from_points):
+            for j, to_point in enumerate(batch_tracer.to_points):
+                rt = SpecializedRayTracer(from_point, to_point,
+                                          ice_model=IceModel)
+                assert (list(batch_tracer.expected_solutions[i, j])
+                        == rt.expected_solutions)
+                assert batch_tracer.exists[i, j] == rt.exists
+                indices = [k for k in range(3) if rt.expected_solutions[k]]
+                for k, path in zip(indices, rt.solutions):
+                    assert batch_tracer.solution_exists[i, j, k]
+                    assert (batch_tracer.launch_angles[i, j, k]
+                            == pytest.approx(path.theta0, rel=1e-4))
+                    assert (batch_tracer.tof[i, j, k]
+                            == pytest.approx(path.tof, rel=1e-4))
+                    assert (batch_tracer.path_length[i, j, k]
+                            == pytest.approx(path.path_length, rel=1e-4))
+                    assert np.allclose(batch_tracer.emitted_direction[i, j, k],
+                                       path.emitted_direction, atol=1e-4)
+                    assert np.allclose(batch_tracer.received_direction[i, j, k],
+                                       path.received_direction, atol=1e-4)
+
+    def test_missing_solutions(self, batch_tracer):
+        """Test that results are nan where solutions don't exist"""
+        assert not batch_tracer.exists[4, 0]
+        assert not np.any(batch_tracer.solution_exists[4, 0])
+        assert np.all(np.isnan(batch_tracer.tof[4, 0]))
+        assert np.all(np.isnan(batch_tracer.path_length[4, 0]))
+        assert np.all(np.isnan(batch_tracer.tof[0, 0, 1]))
+
+    def test_angle_search(self):
+        """Test that vectorized bisection finds roots and returns nan where
+        roots aren't bracketed"""
+        roots = BatchRayTracer.angle_search(np.array([0.25, 4]),
+                                            lambda x: x**2, 0, 1)
+        assert roots[0] == pytest.approx(0.5)
+        assert np.isnan(roots[1])
+
+
+
+@pytest.fixture(scope="module")
+def ray_trace_table():
+    """Fixture for forming a small RayTraceTable object"""
+    return RayTraceTable(antenna_depths=[-100],
+                         rhos=np.linspace(0, 1000, 11),
+                         depths=np.linspace(-1000, -200, 9),
+                         ice_model=IceModel, accuracy=1e-2)
+
+class TestRayTraceTable:
+    """Tests for RayTraceTable class"""
+    def test_creation(self, ray_trace_table):
+        """Test initialization of ray_trace_table"""
+        assert ray_trace_table.ice == IceModel
+        assert ray_trace_table.dz == 1
+        assert ray_trace_table.theta0.shape == (1, 11, 9, 3)
+        assert ray_trace_table.attenuation.shape == (1, 11, 9, 3, 51)
+        assert ray_trace_table.valid.shape == (1, 10, 8)
+        assert np.any(ray_trace_table.valid)
+
+    def test_bad_grid(self):
+        """Test that a grid which is not increasing raises an error"""
+        with pytest.raises(ValueError):
+            RayTraceTable([-100], [0, 100, 50], [-200, -100], build=False)
+
+    def test_tabulated_tracer(self, ray_trace_table):
+        """Test that the table returns a tabulated tracer within the grid,
+        and matches the exact ray tracer within the accuracy"""
+        rt = ray_trace_table([100, 200, -500], [0, 0, -100])
+        exact = SpecializedRayTracer([100, 200, -500], [0, 0, -100],
+                                     ice_model=IceModel)
+        assert isinstance(rt, TabulatedRayTracer)
+        assert rt.expected_solutions == exact.expected_solutions
+        assert len(rt.solutions) == len(exact.solutions)
+        for path, exact_path in zip(rt.solutions, exact.solutions):
+            assert isinstance(path, TabulatedRayTracePath)
+            assert path.theta0 == pytest.approx(exact_path.theta0, abs=1e-2)
+            assert (path.path_length ==
+                    pytest.approx(exact_path.path_length, rel=1e-2))
+            assert path.tof == pytest.approx(exact_path.tof, rel=1e-2)
+            assert (path.attenuation([1e8, 1e9]) ==
+                    pytest.approx(exact_path.attenuation([1e8, 1e9]),
+                                  abs=1e-2))
+            assert path.attenuation(1e8).shape == (1,)
+
+    def test_exact_fallback(self, ray_trace_table):
+        """Test that points outside of the table use the exact ray tracer"""
+        rt = ray_trace_table([100, 200, -1500], [0, 0, -100])
+        assert not isinstance(rt, TabulatedRayTracer)
+        rt = ray_trace_table([100, 200, -500], [0, 0, -150])
+        assert not isinstance(rt, TabulatedRayTracer)
+        rt = ray_trace_table([100, 200, -500], [0, 0, 100])
+        assert not rt.exists
+
+    def test_ice_model_mismatch(self, ray_trace_table):
+        """Test that a mismatched ice model raises an error"""
+        with pytest.raises(ValueError):
+            ray_trace_table([100, 200, -500], [0, 0, -100],
+                            ice_model=AntarcticIce())
+
+    def test_save_load(self, ray_trace_table, tmpdir):
+        """Test that a saved table can be loaded with the same values"""
+        filename = str(tmpdir.join("table.npz"))
+        ray_trace_table.save(filename)
+        loaded = RayTraceTable.load(filename, ice_model=IceModel)
+        assert np.array_equal(loaded.valid, ray_trace_table.valid)
+        assert np.array_equal(loaded.exists, ray_trace_table.exists)
+        assert np.allclose(loaded.tof, ray_trace_table.tof, equal_nan=True)
+        assert loaded.accuracy == ray_trace_table.accuracy
+
+    def test_load_bad_ice(self, ray_trace_table, tmpdir):
+        """Test that loading a table with a different ice model raises
+        an error"""
+        class OtherIce(IceModel):
+            n0 = 1.8
+        filename = str(tmpdir.join("table.npz"))
+        ray_trace_table.save(filename)
+        with pytest.raises(ValueError):
+            RayTraceTable.load(filename, ice_model=OtherIce)
+
+
+
+@pytest.fixture
+def ray_tracer_cache():
+    """Fixture for forming basic RayTracerCache object"""
+    return RayTracerCache(max_size=2, tolerance=0.1)
+
+class TestRayTracerCache:
+    """Tests for RayTracerCache class"""
+    def test_creation(self, ray_tracer_cache):
+        """Test initialization of ray_tracer_cache"""
+        assert ray_tracer_cache.ray_tracer == SpecializedRayTracer
+        assert ray_tracer_cache.max_size == 2
+        assert ray_tracer_cache.tolerance == 0.1
+        assert ray_tracer_cache.hits == 0
+        assert ray_tracer_cache.misses == 0
+        assert len(ray_tracer_cache) == 0
+
+    def test_hits_misses(self, ray_tracer_cache):
+        """Test that cache hits and misses are counted properly"""
+        rt = ray_tracer_cache([100, 200, -500], [0, 0, -100])
+        assert isinstance(rt, SpecializedRayTracer)
+        assert ray_tracer_cache.misses == 1
+        # Same rho and depths at a different azimuth
+        ray_tracer_cache([200, 100, -500], [0, 0, -100])
+        assert ray_tracer_cache.hits == 1
+        # Within tolerance
+        ray_tracer_cache([100, 200, -500.01], [0, 0, -100])
+        assert ray_tracer_cache.hits == 2
+        ray_tracer_cache([100, 200, -600], [0, 0, -100])
+        assert ray_tracer_cache.misses == 2
+        assert ray_tracer_cache.hit_rate == 0.5
+        ray_tracer_cache.clear()
+        assert ray_tracer_cache.hits == 0
+        assert len(ray_tracer_cache) == 0
+
+    def test_max_size(self, ray_tracer_cache):
+        """Test that the least-recently-used ray tracer is removed"""
+        ray_tracer_cache([100, 200, -500], [0, 0, -100])
+        ray_tracer_cache([100, 200, -600], [0, 0, -100])
+        ray_tracer_cache([100, 200, -500], [0, 0, -100])
+        ray_tracer_cache([100, 200, -700], [0, 0, -100])
+        assert len(ray_tracer_cache) == 2
+        ray_tracer_cache([100, 200, -500], [0, 0, -100])
+        assert ray_tracer_cache.hits == 2
+        ray_tracer_cache([100, 200, -600], [0, 0, -100])
+        assert ray_tracer_cache.misses == 4
+
+    def test_cached_solutions(self, ray_tracer_cache, ray_tracer):
+        """Test that ray tracers from the cache have the correct solutions
+        for their own points"""
+        rt_1 = ray_tracer_cache([-200, -100, -500], [0, 0, -100])
+        tofs = [path.tof for path in rt_1.solutions]
+        rt_2 = ray_tracer_cache(ray_tracer.from_point, ray_tracer.to_point)
+        assert ray_tracer_cache.hits == 1
+        assert np.array_equal(rt_2.from_point, ray_tracer.from_point)
+        assert rt_2.expected_solutions == ray_tracer.expected_solutions
+        for path, expected, tof in zip(rt_2.solutions, ray_tracer.solutions,
+                                       tofs):
+            assert path.tof == tof
+            assert path.theta0 == pytest.approx(expected.theta0)
+            assert np.allclose(path.emitted_direction,
+                               expected.emitted_direction)
+            assert np.allclose(path.received_direction,
+                               expected.received_direction)
+
+
+
+@pytest.fixture(scope="module")
+def shadow_zone_table():
+    """Fixture for forming basic ShadowZoneTable object"""
+    return ShadowZoneTable(antenna_depths=[-100, -200],
+                           depths=np.linspace(-1500, 0, 16),
+                           ice_model=IceModel)
+
+class TestShadowZoneTable:
+    """Tests for ShadowZoneTable class"""
+    def test_creation(self, shadow_zone_table):
+        """Test initialization of shadow_zone_table"""
+        assert shadow_zone_table.ice == IceModel
+        assert shadow_zone_table.ray_tracer == SpecializedRayTracer
+        assert shadow_zone_table.max_rho.shape == (2, 15)
+
+    def test_boundary(self, shadow_zone_table):
+        """Test that the shadow zone boundary is beyond the maximum radial
+        distance of the ray tracer in each cell"""
+        for i, z1 in enumerate(shadow_zone_table.antenna_depths):
+            for j, z0 in enumerate(shadow_zone_table.depths[:-1]):
+                rt = SpecializedRayTracer([0, 0, z0+50], [0, 0, z1],
+                                          ice_model=IceModel)
+                max_rho = max(rt.direct_r_max, rt.indirect_r_max)
+                assert shadow_zone_table.max_rho[i, j] >= max_rho
+
+    def test_unreachable(self, shadow_zone_table, bad_tracer):
+        """Test that unreachable points return a ray tracer with no
+        solutions"""
+        assert not shadow_zone_table.reachable([5000, 0, -500], [0, 0, -100])
+        rt = shadow_zone_table([5000, 0, -500], [0, 0, -100])
+        assert isinstance(rt, UnreachableRayTracer)
+        assert np.array_equal(rt.from_point, [5000, 0, -500])
+        assert rt.expected_solutions == [False, False, False]
+        assert not rt.exists
+        assert rt.solutions == []
+        rt = shadow_zone_table(bad_tracer.from_point, bad_tracer.to_point)
+        assert not rt.exists
+
+    def test_reachable(self, shadow_zone_table, ray_tracer):
+        """Test that reachable points return a normal ray tracer"""
+        assert shadow_zone_table.reachable(ray_tracer.from_point,
+                                           ray_tracer.to_point)
+        rt = shadow_zone_table(ray_tracer.from_point, ray_tracer.to_point)
+        assert rt.expected_solutions == ray_tracer.expected_solutions
+        assert len(rt.solutions) == len(ray_tracer.solutions)
+
+    def test_tabulated_ray_tracer(self, ray_trace_table):
+        """Test that unreachable points are screened out when the ray tracer
+        is a ray trace table"""
+        table = ShadowZoneTable(antenna_depths=[-100],
+                                depths=np.linspace(-1000, 0, 11),
+                                ice_model=IceModel,
+                                ray_tracer=ray_trace_table)
+        rt = table([900, 0, -200], [0, 0, -100])
+        assert isinstance(rt, UnreachableRayTracer)
+        assert not rt.exists
+        assert rt.solutions == []
+        rt = table([300, 0, -500], [0, 0, -100])
+        assert isinstance(rt, TabulatedRayTracer)
+        assert rt.exists
+
+    def test_outside_table(self, shadow_zone_table):
+        """Test that points outside of the table are not rejected"""
+        assert shadow_zone_table.max_distance([5000, 0, -2000],
+                                              [0, 0, -100]) == np.inf
+        assert shadow_zone_table.max_distance([5000, 0, -500],
+                                              [0, 0, -150]) == np.inf
+
+
 
 @pytest.fixture
 def path_finder():
@@ -5,8 +5,10 @@ import pytest
 from config import SEED
 
 from pyrex.signals import (Signal, EmptySignal, FunctionSignal,
-                           AskaryanSignal, GaussianNoise, ThermalNoise)
+                           UniformSignal, SpectralSignal, AskaryanSignal, AskaryanTemplateBank,
+                           GaussianNoise, ThermalNoise, NoiseBank)
 
+import pickle
 import numpy as np
 
 
@@ -36,6 +38,8 @@ class TestSignal:
         assert np.array_equal(signal.times, [0,1,2,3,4])
         assert np.array_equal(signal.values, [1,2,1,2,1])
         assert signal.value_type == Signal.ValueTypes.undefined
+        signal.label = "test"
+        assert signal.label == "test"
 
     def test_addition(self, signals):
         """Test that signal objects can be added"""
@@ -150,6 +154,29 @@ class TestSignal:
         assert np.array_equal(new.values, expected.values)
         assert new.value_type == signal.value_type
 
+    def test_with_times_whole_shift(self, signal):
+        """Test that with_times shifts values directly for times shifted by
+        a whole number of samples"""
+        for shift, expected in [(0, [1,2,1,2,1]), (2, [1,2,1,0,0]),
+                                (-3, [0,0,0,1,2]), (7, [0,0,0,0,0])]:
+            new = signal.with_times(signal.times+shift)
+            assert np.array_equal(new.values, expected)
+            assert new.value_type == signal.value_type
+
+    def test_with_times_fractional_shift(self):
+        """Test that with_times matches a band-limited signal for times
+        shifted by a fraction of a sample, with zeros outside the times"""
+        times = np.linspace(0, 100, 1001)
+        signal = Signal(times, np.sin(2*np.pi*0.5*times))
+        new_times = times + 0.3*0.1 - 10
+        new = signal.with_times(new_times)
+        inside = (new_times>=2) & (new_times<=98)
+        assert np.allclose(new.values[inside],
+                           np.sin(2*np.pi*0.5*new_times[inside]), atol=1e-3)
+        outside = (new_times<0) | (new_times>100)
+        assert np.all(new.values[outside]==0)
+        assert np.all(new.values[~outside]!=0)
+
     def test_spectrum(self, signal):
         """Test that spectrum attribute returns expected values"""
         expected = [7, -0.5, -0.5, -0.5, -0.5]
@@ -190,6 +217,239 @@ class TestSignal:
         for i in range(5):
             assert signal.values[i] == pytest.approx(expected.values[i])
 
+    def test_filter_frequencies_complex(self):
+        """Test that filter_frequencies keeps the real part of the signal
+        filtered with the full complex spectrum"""
+        np.random.seed(SEED)
+        times = np.linspace(0, 100e-9, 1001)
+        values = np.random.normal(size=1001)
+        resp = lambda f: (1 + 0.1j) / (1 + 1j*f/1e8)
+        padded = np.concatenate((values, np.zeros(1001)))
+        freqs = np.fft.fftfreq(2002, d=times[1]-times[0])
+        expected = np.fft.ifft(resp(freqs)*np.fft.fft(padded))[:1001]
+        signal = Signal(times, values)
+        signal.filter_frequencies(resp)
+        assert np.allclose(signal.values, np.real(expected))
+        signal = Signal(times, values)
+        signal.filter_frequencies(lambda f: 2)
+        assert np.allclose(signal.values, 2*values)
+
+    def test_filter_frequencies_grid(self, signal):
+        """Test that the frequencies passed to the frequency response are
+        only the non-negative frequencies when forcing real results"""
+        calls = []
+        def resp(f):
+            calls.append(np.array(f))
+            return np.ones(len(f))
+        signal.filter_frequencies(resp, force_real=True)
+        signal.filter_frequencies(resp, force_real=True)
+        assert np.allclose(calls[0], [0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        assert np.array_equal(calls[1], calls[0])
+        signal.filter_frequencies(resp)
+        assert np.allclose(calls[2], [0, 0.1, 0.2, 0.3, 0.4, -0.5,
+                                      0, -0.1, -0.2, -0.3, -0.4, -0.5])
+
+    def test_scaling(self, signals):
+        """Test that signals can be multiplied and divided by numbers"""
+        doubled = signals * 2
+        assert np.array_equal(doubled.times, signals.times)
+        assert np.array_equal(doubled.values, signals.values*2)
+        assert doubled.value_type == signals.value_type
+        assert np.array_equal((2 * signals).values, doubled.values)
+        assert np.array_equal((doubled / 2).values, signals.values)
+        expected = signals.values/4
+        signals /= 4
+        assert np.array_equal(signals.values, expected)
+        with pytest.raises(TypeError):
+            signals * signals
+
+    def test_copy(self, signal):
+        """Test that copies of a signal are independent"""
+        copy = signal.copy()
+        assert np.array_equal(copy.times, signal.times)
+        assert np.array_equal(copy.values, signal.values)
+        assert copy.value_type == signal.value_type
+        copy.times += 1
+        copy.values *= 2
+        assert np.array_equal(signal.times, [0,1,2,3,4])
+        assert np.array_equal(signal.values, [1,2,1,2,1])
+
+
+
+@pytest.fixture
+def uniform_signal():
+    """Fixture for forming basic UniformSignal object"""
+    return UniformSignal([0,1,2,3,4], [1,2,1,2,1])
+
+
+class TestUniformSignal:
+    """Tests for UniformSignal class"""
+    def test_creation(self, uniform_signal):
+        """Test initialization of uniform signal"""
+        assert np.array_equal(uniform_signal.times, [0,1,2,3,4])
+        assert np.array_equal(uniform_signal.values, [1,2,1,2,1])
+        assert uniform_signal.values.dtype == np.float64
+        assert uniform_signal.value_type == Signal.ValueTypes.undefined
+        assert uniform_signal.dt == 1
+
+    def test_creation_failure(self):
+        """Test that initialization fails for unevenly spaced times"""
+        with pytest.raises(ValueError):
+            UniformSignal([0,1,3], [1,2,1])
+
+    def test_single_precision(self, uniform_signal, monkeypatch):
+        """Test that values can be stored in single precision"""
+        signal = UniformSignal([0,1,2,3,4], [1,2,1,2,1], dtype=np.float32)
+        assert signal.values.dtype == np.float32
+        signal.filter_frequencies(lambda f: 2)
+        assert signal.values.dtype == np.float32
+        assert np.allclose(signal.values, [2,4,2,4,2])
+        monkeypatch.setattr(UniformSignal, "default_dtype", np.float32)
+        signal = UniformSignal([0,1,2,3,4], [1,2,1,2,1])
+        assert signal.values.dtype == np.float32
+
+    def test_times(self, uniform_signal):
+        """Test that the times can be shifted and replaced, but not modified
+        in place"""
+        with pytest.raises(ValueError):
+            uniform_signal.times += 2.5
+        uniform_signal.times = uniform_signal.times + 2.5
+        assert np.array_equal(uniform_signal.times, [2.5,3.5,4.5,5.5,6.5])
+        uniform_signal.times = np.linspace(0, 1, 5)
+        assert np.allclose(uniform_signal.times, [0,0.25,0.5,0.75,1])
+        assert uniform_signal.dt == 0.25
+        with pytest.raises(ValueError):
+            uniform_signal.times = [0,1,3,4,5]
+
+    def test_addition(self, uniform_signal, signal):
+        """Test that sums are uniform signals sharing the times array"""
+        uniform_signal.dtype = np.float32
+        total = uniform_signal + signal
+        assert isinstance(total, UniformSignal)
+        assert np.array_equal(total.times, [0,1,2,3,4])
+        assert np.array_equal(total.values, [2,4,2,4,2])
+        assert total.values.dtype == np.float32
+        assert total.times is uniform_signal.times
+
+    def test_addition_times(self):
+        """Test that the times given are kept exactly, so signals can be
+        added to plain signals with the same times"""
+        times = np.arange(0, 3e-7, 1e-10) + 1e-7
+        values = np.sin(times*1e9)
+        signal = UniformSignal(times, values)
+        assert np.array_equal(signal.times, times)
+        total = Signal(times, values) + signal
+        assert np.array_equal(total.times, times)
+        assert np.array_equal(total.values, 2*values)
+        total = signal + Signal(times, values)
+        assert np.array_equal(total.times, times)
+
+    def test_copy(self, uniform_signal):
+        """Test that copies of a uniform signal are independent"""
+        copy = uniform_signal.copy()
+        assert isinstance(copy, UniformSignal)
+        assert copy.times is uniform_signal.times
+        copy.times = copy.times + 1
+        copy.values *= 2
+        assert np.array_equal(uniform_signal.times, [0,1,2,3,4])
+        assert np.array_equal(uniform_signal.values, [1,2,1,2,1])
+
+    def test_pickle(self, uniform_signal):
+        """Test that uniform signals can be pickled"""
+        copy = pickle.loads(pickle.dumps(uniform_signal))
+        assert np.array_equal(copy.times, uniform_signal.times)
+        assert np.array_equal(copy.values, uniform_signal.values)
+        assert copy.dtype == uniform_signal.dtype
+        assert not copy.times.flags.writeable
+
+
+
+@pytest.fixture
+def spectral_signal():
+    """Fixture for forming a pulse SpectralSignal object"""
+    ts = np.linspace(0, 100, 101)
+    return SpectralSignal(ts, np.exp(-(ts-30)**2/8),
+                          value_type=Signal.ValueTypes.field)
+
+
+class TestSpectralSignal:
+    """Tests for SpectralSignal class"""
+    def test_creation(self, spectral_signal):
+        """Test initialization of spectral signal"""
+        ts = np.linspace(0, 100, 101)
+        assert np.array_equal(spectral_signal.times, ts)
+        assert np.array_equal(spectral_signal.values, np.exp(-(ts-30)**2/8))
+        assert spectral_signal.value_type == Signal.ValueTypes.field
+
+    def test_filter_frequencies(self, spectral_signal):
+        """Test that filtering matches filtering of a regular signal"""
+        resp = lambda f: np.exp(-np.abs(f)/0.1)
+        expected = Signal(spectral_signal.times, spectral_signal.values)
+        expected.filter_frequencies(resp)
+        spectral_signal.filter_frequencies(resp)
+        assert np.allclose(spectral_signal.values, expected.values)
+
+    def test_filter_frequencies_force_real(self, spectral_signal):
+        """Test that the filter_frequencies force_real option works"""
+        resp = lambda f: (f>0) / (1 + 1j*f/0.1)
+        expected = Signal(spectral_signal.times, spectral_signal.values)
+        expected.filter_frequencies(resp, force_real=True)
+        spectral_signal.filter_frequencies(resp, force_real=True)
+        assert np.allclose(spectral_signal.values, expected.values)
+
+    def test_filter_frequencies_warning(self, spectral_signal, caplog):
+        """Test that a warning is only issued for filters which would
+        produce a significant imaginary signal"""
+        spectral_signal.filter_frequencies(lambda f: 1 / (1 + 1j*f/0.1))
+        assert len(caplog.records) == 0
+        spectral_signal.filter_frequencies(lambda f: (f>0) / (1 + 1j*f/0.1))
+        assert len(caplog.records) == 1
+
+    def test_lazy_filters(self, spectral_signal, monkeypatch):
+        """Test that filters and scaling are accumulated and applied with a
+        single pair of FFTs once values are needed"""
+        resp_1 = lambda f: np.exp(-(f/0.1)**2)
+        resp_2 = lambda f: 1 / (1 + 1j*f/0.2)
+        expected = Signal(spectral_signal.times, spectral_signal.values)
+        expected.filter_frequencies(resp_1)
+        expected.filter_frequencies(resp_2, force_real=True)
+        expected.values *= 1.5
+        calls = []
+        def counted(transform):
+            def counted_transform(*args, **kwargs):
+                calls.append(transform)
+                return transform(*args, **kwargs)
+            return counted_transform
+        monkeypatch.setattr("numpy.fft.rfft", counted(np.fft.rfft))
+        monkeypatch.setattr("numpy.fft.irfft", counted(np.fft.irfft))
+        spectral_signal.filter_frequencies(resp_1)
+        spectral_signal.times = spectral_signal.times + 5
+        spectral_signal /= 2
+        spectral_signal.filter_frequencies(resp_2, force_real=True)
+        spectral_signal *= 3
+        assert len(calls) == 0
+        assert np.allclose(spectral_signal.values, expected.values)
+        assert len(calls) == 2
+        assert np.array_equal(spectral_signal.times, expected.times+5)
+
+    def test_copy(self, spectral_signal):
+        """Test that copies keep pending filters independently"""
+        resp = lambda f: np.exp(-(f/0.1)**2)
+        spectral_signal.filter_frequencies(resp)
+        copy = spectral_signal.copy()
+        assert isinstance(copy, SpectralSignal)
+        copy.filter_frequencies(resp)
+        copy *= 2
+        expected = Signal(spectral_signal.times, spectral_signal.values)
+        expected.filter_frequencies(resp)
+        assert np.allclose(copy.values, 2*expected.values)
+
+    def test_set_values(self, spectral_signal):
+        """Test that setting values discards pending filters"""
+        spectral_signal.filter_frequencies(lambda f: 0)
+        spectral_signal.values = np.ones(101)
+        assert np.array_equal(spectral_signal.values, np.ones(101))
+
 
 
 @pytest.fixture
@@ -241,13 +501,49 @@ class TestFunctionSignal:
             assert new.values[i] == function_signals.function(times[i])
         assert new.value_type == function_signals.value_type
 
+    def test_with_times_whole_shift(self, function_signals):
+        """Test that with_times reuses values and re-evaluates the function
+        for times shifted by a whole number of samples"""
+        times = np.arange(-3, 2)
+        new = function_signals.with_times(times)
+        assert isinstance(new, FunctionSignal)
+        assert np.array_equal(new.times, times)
+        for i in range(5):
+            assert new.values[i] == function_signals.function(times[i])
+        assert new.value_type == function_signals.value_type
 
-
-@pytest.fixture
-def arz_pulse():
-    """Example Askaryan pulse from https://arxiv.org/pdf/1106.6283v3.pdf"""
-    return AskaryanSignal(times=np.linspace(0, 3e-9, 301), energy=3e9,
-                          theta=np.radians(54.85), n=1.75, t0=1e-9)
+    def test_with_times_modified(self):
+        """Test that with_times re-evaluates the function rather than
+        reusing values which have been modified"""
+        times = np.linspace(0, 100, 1001)
+        expected = np.sin(2*np.pi*0.05*(times+1))
+        for modify in [lambda sig: sig.__imul__(2),
+                       lambda sig: sig.filter_frequencies(lambda f: 0.5),
+                       lambda sig: setattr(sig, 'values', sig.values*2)]:
+            signal = FunctionSignal(times,
+                                    lambda t: np.sin(2*np.pi*0.05*t))
+            modify(signal)
+            new = signal.with_times(times+1)
+            assert np.allclose(new.values, expected)
+            assert np.allclose(new.with_times(times+2).values,
+                               np.sin(2*np.pi*0.05*(times+2)))
+        signal = FunctionSignal(times, lambda t: np.sin(2*np.pi*0.05*t))
+        signal.values += 1
+        assert np.allclose(signal.with_times(times+1).values, expected)
+
+
+
+@pytest.fixture(params=["exact", "template"])
+def arz_pulse(request, monkeypatch):
+    """Example Askaryan pulse from https://arxiv.org/pdf/1106.6283v3.pdf,
+    calculated exactly and from a template bank"""
+    times = np.linspace(0, 3e-9, 301)
+    if request.param=="template":
+        bank = AskaryanTemplateBank(times, t0=1e-9, energies=[1e9, 1e10],
+                                    cone_offsets=-np.logspace(-2, -3, 7))
+        monkeypatch.setitem(AskaryanSignal.template_banks, bank.key, bank)
+    return AskaryanSignal(times=times, energy=3e9, theta=np.radians(54.85),
+                          n=1.75, t0=1e-9, mode=request.param)
 
 
 class TestAskaryanSignal:
@@ -263,7 +559,196 @@ class TestAskaryanSignal:
                              arz_pulse.times[np.argmax(arz_pulse.values)])
         assert peak_to_peak_time == pytest.approx(0.2e-9, abs=0.05e-9)
 
-    # TODO: Add tests for vector_potential, RAC, charge_profile, and max_length methods
+    @pytest.mark.parametrize("energy", [1e6, 1e8, 1e10])
+    @pytest.mark.parametrize("offset", [-20, -2, -0.1, 0.1, 2, 20])
+    def test_spectrum_bound(self, energy, offset):
+        """Test that spectrum_bound bounds the spectrum and so the peak of
+        the pulse"""
+        n = 1.78
+        theta = np.arccos(1/n) + np.radians(offset)
+        pulse = AskaryanSignal(times=np.linspace(-20e-9, 80e-9, 2000,
+                                                 endpoint=False),
+                               energy=energy, theta=theta, n=n)
+        freqs = np.fft.rfftfreq(len(pulse.times), pulse.dt)
+        bound = AskaryanSignal.spectrum_bound(energy, theta, freqs, n=n)
+        spectrum = np.abs(np.fft.rfft(pulse.values)) * pulse.dt
+        # The discretized pulse may exceed the bound slightly in sidelobes
+        assert np.all(spectrum <= bound*1.2 + np.max(bound)*1e-3)
+        assert np.max(np.abs(pulse.values)) <= 2*np.trapz(bound, freqs)
+        assert np.array_equal(
+            AskaryanSignal.spectrum_bound(0.01, theta, freqs, n=n),
+            np.zeros(len(freqs))
+        )
+
+    # TODO: Add tests for vector_potential and max_length methods
+
+    def test_RAC_array(self, arz_pulse):
+        """Test that RAC gives matching values for arrays and scalars"""
+        times = np.linspace(-1e-9, 1e-9, 21)
+        values = arz_pulse.RAC(times)
+        assert values.shape == (21,)
+        for t, value in zip(times, values):
+            assert arz_pulse.RAC(t) == pytest.approx(value, rel=1e-12)
+        assert np.argmin(values) == 10
+
+    def test_charge_profile_array(self, arz_pulse):
+        """Test that charge_profile gives matching values for arrays and
+        scalars, with no charge before the shower starts"""
+        zs = np.linspace(-1, 2*arz_pulse.max_length(), 21)
+        profile = arz_pulse.charge_profile(zs)
+        assert profile.shape == (21,)
+        for z, value in zip(zs, profile):
+            assert (arz_pulse.charge_profile(z) ==
+                    pytest.approx(value, rel=1e-12))
+        assert profile[0] == 0
+        assert np.all(profile[1:] > 0)
+
+    def test_fft_convolution(self, monkeypatch):
+        """Test that FFT convolution gives the same pulses"""
+        times = np.linspace(-20e-9, 80e-9, 2000, endpoint=False)
+        expected = [AskaryanSignal(times, energy=1e8, theta=theta)
+                    for theta in [0.97, 1, 1.2]]
+        monkeypatch.setattr(AskaryanSignal, "convolution_method", "fft")
+        for theta, pulse in zip([0.97, 1, 1.2], expected):
+            values = AskaryanSignal(times, energy=1e8, theta=theta).values
+            assert np.allclose(values, pulse.values,
+                               atol=1e-12*np.max(np.abs(pulse.values)))
+
+    def test_pulses(self):
+        """Test that pulses gives the values of the individual pulses"""
+        times = np.linspace(-20e-9, 80e-9, 2000, endpoint=False)
+        thetas = [0.9, 0.97, 1.2, 0.5]
+        ns = [1.78, 1.78, 1.5, 1.78]
+        pulses = AskaryanSignal.pulses(times, energy=1e8, theta=thetas, n=ns)
+        assert pulses.shape == (4, 2000)
+        for values, theta, n in zip(pulses, thetas, ns):
+            pulse = AskaryanSignal(times, energy=1e8, theta=theta, n=n)
+            assert np.array_equal(values, pulse.values)
+        pulses = AskaryanSignal.pulses(times, energy=[1e-3, 1e8], theta=0.9)
+        assert np.all(pulses[0] == 0)
+        assert np.array_equal(pulses[1],
+                              AskaryanSignal(times, 1e8, theta=0.9).values)
+        with pytest.raises(ValueError):
+            AskaryanSignal.pulses(times, energy=1e8, theta=[1, 4])
+
+    def test_pulses_shared_RAC(self, monkeypatch):
+        """Test that pulses of the same energy share their RAC values"""
+        times = np.linspace(-20e-9, 80e-9, 2000, endpoint=False)
+        thetas = [0.5, 0.9, 1.2]
+        expected = AskaryanSignal.pulses(times, energy=1e8, theta=thetas)
+        calls = []
+        RAC = AskaryanSignal.RAC
+        def counted_RAC(self, time):
+            calls.append(len(time))
+            return RAC(self, time)
+        monkeypatch.setattr(AskaryanSignal, "RAC", counted_RAC)
+        pulses = AskaryanSignal.pulses(times, energy=[1e8, 1e8, 1e8, 1e9],
+                                       theta=thetas+[0.9])
+        assert len(calls) < 4
+        assert np.array_equal(pulses[:3], expected)
+        assert np.array_equal(pulses[3],
+                              AskaryanSignal(times, 1e9, theta=0.9).values)
+
+    def test_invalid_mode(self):
+        """Test that an invalid mode raises an error"""
+        with pytest.raises(ValueError):
+            AskaryanSignal(times=np.linspace(0, 3e-9, 301), energy=3e9,
+                           theta=np.radians(54.85), mode="fast")
+
+
+
+@pytest.fixture
+def template_bank():
+    """Fixture for forming an AskaryanTemplateBank with a small part of the
+    default grid"""
+    offsets = AskaryanTemplateBank.cone_offsets
+    offsets = offsets[(np.abs(offsets)>0.008) & (np.abs(offsets)<0.025)]
+    return AskaryanTemplateBank(np.linspace(-20e-9, 80e-9, 2000,
+                                            endpoint=False),
+                                energies=[1e8, 1e9], cone_offsets=offsets)
+
+
+class TestAskaryanTemplateBank:
+    """Tests for AskaryanTemplateBank class"""
+    def test_creation(self, template_bank):
+        """Test initialization of the template bank"""
+        assert template_bank.templates.shape == (2, 18, 2000)
+        assert template_bank.key == (2000, 5e-11, -2e-8)
+        with pytest.raises(ValueError):
+            AskaryanTemplateBank(template_bank.times, cone_offsets=[0, 0.1],
+                                 build=False)
+
+    def test_templates(self, template_bank):
+        """Test that pulses on the grid match the exact pulses"""
+        for energy in [1e8, 1e9]:
+            for offset in template_bank.cone_offsets[[1, -2]]:
+                theta = np.arccos((1-offset)/1.78)
+                exact = AskaryanSignal(template_bank.times, energy, theta,
+                                       n=1.78)
+                values = template_bank(energy, theta, n=1.78)
+                assert np.allclose(values, exact.values,
+                                   atol=1e-6*np.max(np.abs(exact.values)))
+
+    @pytest.mark.parametrize("energy", [2e8, 5e8])
+    @pytest.mark.parametrize("offset", [-0.02, -0.012, 0.015])
+    @pytest.mark.parametrize("n", [1.5, 1.78])
+    def test_interpolation(self, template_bank, energy, offset, n):
+        """Test that pulses between grid points match the exact pulses"""
+        theta = np.arccos((1-offset)/n)
+        exact = AskaryanSignal(template_bank.times, energy, theta, n=n)
+        values = template_bank(energy, theta, n=n)
+        peak = np.max(np.abs(exact.values))
+        assert np.max(np.abs(values)) == pytest.approx(peak, rel=0.1)
+        assert np.max(np.abs(values-exact.values)) < 0.15*peak
+
+    def test_pulses(self, template_bank, monkeypatch):
+        """Test that pulses interpolates multiple pulses at once, calculating
+        those outside the bank exactly in template mode"""
+        energies = [2e8, 5e8, 1e-3, 5e8]
+        thetas = [np.arccos((1-offset)/1.78)
+                  for offset in [-0.012, 0.015, 0.015, 0.5]]
+        pulses = template_bank.pulses(energies, thetas, n=1.78)
+        assert pulses.shape == (4, 2000)
+        for k in range(2):
+            assert np.allclose(pulses[k], template_bank(energies[k],
+                                                        thetas[k], n=1.78))
+        assert np.all(pulses[2] == 0)
+        assert np.all(np.isnan(pulses[3]))
+        monkeypatch.setitem(AskaryanSignal.template_banks, template_bank.key,
+                            template_bank)
+        values = AskaryanSignal.pulses(template_bank.times, energies, thetas,
+                                       mode="template")
+        assert np.array_equal(values[:3], pulses[:3])
+        exact = AskaryanSignal(template_bank.times, energies[3], thetas[3])
+        assert np.array_equal(values[3], exact.values)
+
+    def test_outside_bank(self, template_bank, monkeypatch):
+        """Test that pulses outside the cone offsets of the bank are
+        calculated exactly in template mode"""
+        theta = np.arccos(0.9/1.78)
+        assert template_bank(1e9, theta, n=1.78) is None
+        monkeypatch.setitem(AskaryanSignal.template_banks, template_bank.key,
+                            template_bank)
+        pulse = AskaryanSignal(template_bank.times, 1e9, theta, n=1.78,
+                               mode="template")
+        exact = AskaryanSignal(template_bank.times, 1e9, theta, n=1.78)
+        assert np.array_equal(pulse.values, exact.values)
+
+    def test_cache(self, template_bank, tmpdir):
+        """Test that the bank is saved to and loaded from the cache file"""
+        cache_file = str(tmpdir.join("templates.npz"))
+        template_bank.save(cache_file)
+        loaded = AskaryanTemplateBank(template_bank.times,
+                                      energies=template_bank.energies,
+                                      cone_offsets=template_bank.cone_offsets,
+                                      cache_file=cache_file, build=False)
+        assert np.array_equal(loaded.templates, template_bank.templates)
+        other = AskaryanTemplateBank(template_bank.times, energies=[1e8],
+                                     cone_offsets=[0.001, 0.01],
+                                     cache_file=cache_file)
+        assert other.templates.shape == (1, 2, 2000)
+        loaded = AskaryanTemplateBank.load(cache_file)
+        assert np.array_equal(loaded.energies, [1e8])
 
 
 
@@ -331,3 +816,172 @@ class TestThermalNoise:
         """Test the rms value of the thermal noise signal"""
         assert (np.sqrt(np.mean(thermal_signal.values**2)) ==
                 pytest.approx(thermal_signal.rms, rel=1e-3))
+
+    def test_modes(self):
+        """Test that the fft mode gives the same noise as the sum mode,
+        including on shifted, overlapping, and unevenly spaced times"""
+        times = np.linspace(0, 100e-9, 1001)
+        np.random.seed(SEED)
+        summed = ThermalNoise(times, f_band=(300e6, 700e6), rms_voltage=1,
+                              n_freqs=200, mode="sum")
+        np.random.seed(SEED)
+        transformed = ThermalNoise(times, f_band=(300e6, 700e6),
+                                   rms_voltage=1, n_freqs=200, mode="fft")
+        assert transformed.mode == "fft"
+        assert np.allclose(transformed.values, summed.values,
+                           rtol=0, atol=1e-10)
+        for new_times in [times[300:700] + 3.3e-9,
+                          np.linspace(-50e-9, 50e-9, 777),
+                          np.sort(np.random.rand(100)) * 1e-7]:
+            assert np.allclose(transformed.with_times(new_times).values,
+                               summed.with_times(new_times).values,
+                               rtol=0, atol=1e-10)
+        overlap = transformed.with_times(times[250:750]).values
+        assert np.allclose(overlap, transformed.values[250:750],
+                           rtol=0, atol=1e-10)
+
+    @pytest.mark.parametrize("time_block,freq_block", [(1024, None),
+                                                       (100, 7), (1, 1000)])
+    def test_blocks(self, monkeypatch, time_block, freq_block):
+        """Test that the blocked sum matches the sum of the sinusoids"""
+        monkeypatch.setattr(ThermalNoise, "time_block", time_block)
+        monkeypatch.setattr(ThermalNoise, "freq_block", freq_block)
+        np.random.seed(SEED)
+        times = np.sort(np.random.rand(1001)) * 1e-7
+        noise = ThermalNoise(times, f_band=(300e6, 700e6), rms_voltage=1,
+                             n_freqs=200, mode="sum")
+        expected = sum(amp * np.cos(2*np.pi*freq * times + phase)
+                       for freq, amp, phase
+                       in zip(noise.freqs, noise.amps, noise.phases))
+        expected *= np.sqrt(2/len(noise.freqs))
+        assert np.allclose(noise.values, expected, rtol=0, atol=1e-10)
+
+    @pytest.mark.parametrize("mode", ["sum", "fft"])
+    def test_single_precision(self, monkeypatch, mode):
+        """Test that noise can be calculated in single precision"""
+        times = np.linspace(0, 100e-9, 1001)
+        np.random.seed(SEED)
+        expected = ThermalNoise(times, f_band=(300e6, 700e6), rms_voltage=1,
+                                n_freqs=200, mode=mode)
+        monkeypatch.setattr(ThermalNoise, "dtype", np.float32)
+        np.random.seed(SEED)
+        noise = ThermalNoise(times, f_band=(300e6, 700e6), rms_voltage=1,
+                             n_freqs=200, mode=mode)
+        assert noise.values.dtype == np.float32
+        assert np.allclose(noise.values, expected.values, rtol=0, atol=1e-5)
+
+    def test_invalid_mode(self):
+        """Test that an invalid mode raises an error"""
+        with pytest.raises(ValueError):
+            ThermalNoise(times=[0,1,2], f_band=(0, 100), rms_voltage=1,
+                         mode="bogus")
+
+
+
+@pytest.fixture
+def noise_bank():
+    """Fixture for forming a NoiseBank object"""
+    np.random.seed(SEED)
+    return NoiseBank(duration=2e-6, seed=SEED)
+
+
+class TestNoiseBank:
+    """Tests for NoiseBank class"""
+    def test_creation(self, noise_bank):
+        """Test initialization of noise bank"""
+        assert noise_bank.duration == 2e-6
+        assert noise_bank.refresh_interval is None
+        assert noise_bank.seed == SEED
+        assert noise_bank.generation == 0
+
+    def test_noise(self, noise_bank):
+        """Test that noise drawn from the bank has the expected rms"""
+        times = np.linspace(0, 1e-6, 10001)
+        noise = noise_bank.noise(times, f_band=(300e6, 700e6), rms_voltage=2)
+        assert np.array_equal(noise.times, times)
+        assert noise.value_type == Signal.ValueTypes.voltage
+        assert (np.sqrt(np.mean(noise.values**2)) ==
+                pytest.approx(2, rel=0.05))
+
+    def test_consistency(self, noise_bank):
+        """Test that the noise of a draw is the same on shifted, overlapping,
+        and unevenly spaced times"""
+        times = np.linspace(0, 100e-9, 1001)
+        noise = noise_bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        aligned = noise.with_times(times[300:] + 20e-9)
+        assert np.array_equal(aligned.values[:500], noise.values[500:1000])
+        shifted = noise.with_times(times + 1.234e-11)
+        assert np.allclose(shifted.values[::10],
+                           noise.with_times(times[::10] + 1.234e-11).values)
+        uneven = np.sort(np.random.rand(50)) * 1e-7
+        assert np.allclose(noise.with_times(uneven).values,
+                           [noise.with_times([t, t+1e-9]).values[0]
+                            for t in uneven])
+
+    def test_independent_draws(self, noise_bank):
+        """Test that separate draws give different noise"""
+        times = np.linspace(0, 100e-9, 1001)
+        noise_1 = noise_bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        noise_2 = noise_bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert not np.allclose(noise_1.values, noise_2.values)
+
+    def test_reproducibility(self):
+        """Test that banks with the same seed give the same noise regardless
+        of the order of their draws"""
+        times = np.linspace(0, 100e-9, 1001)
+        bank_1 = NoiseBank(duration=2e-6, seed=SEED)
+        bank_2 = NoiseBank(duration=2e-6, seed=SEED)
+        bank_1.noise(times, f_band=(100e6, 200e6), rms_voltage=1)
+        np.random.seed(SEED)
+        noise_1 = bank_1.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        np.random.seed(SEED)
+        noise_2 = bank_2.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert np.array_equal(noise_1.values, noise_2.values)
+        bank_3 = pickle.loads(pickle.dumps(bank_1))
+        np.random.seed(SEED)
+        noise_3 = bank_3.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert np.array_equal(noise_1.values, noise_3.values)
+
+    def test_refresh(self):
+        """Test that the bank is regenerated after refresh_interval draws"""
+        times = np.linspace(0, 100e-9, 1001)
+        bank = NoiseBank(duration=2e-6, refresh_interval=2, seed=SEED)
+        np.random.seed(SEED)
+        for i in range(2):
+            bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert bank.generation == 0
+        bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert bank.generation == 1
+
+    def test_slots(self):
+        """Test that the bank is regenerated once its slots run out, or when
+        a draw is longer than the slots"""
+        times = np.linspace(0, 100e-9, 1000, endpoint=False)
+        bank = NoiseBank(duration=1e-6, seed=SEED)
+        np.random.seed(SEED)
+        for i in range(10):
+            bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert bank.generation == 0
+        bank.noise(times, f_band=(300e6, 700e6), rms_voltage=1)
+        assert bank.generation == 1
+        bank.noise(np.linspace(0, 200e-9, 2001), f_band=(300e6, 700e6),
+                   rms_voltage=1)
+        assert bank.generation == 2
+
+    def test_uncorrelated_draws(self):
+        """Test that the noise of separate draws (e.g. different antennas)
+        isn't correlated at any time lag"""
+        times = np.linspace(0, 100e-9, 1001)
+        bank = NoiseBank(duration=1e-6, seed=SEED)
+        np.random.seed(SEED)
+        draws = [bank.noise(times, f_band=(300e6, 700e6),
+                            rms_voltage=1).values
+                 for _ in range(9)]
+        assert bank.generation == 0
+        for i, noise_1 in enumerate(draws):
+            for noise_2 in draws[i+1:]:
+                correlation = (np.correlate(noise_1, noise_2, mode='full')
+                               / np.sqrt(np.sum(noise_1**2)
+                                         * np.sum(noise_2**2)))
+                assert np.max(np.abs(correlation)) < 0.6
+